@@ -3,8 +3,7 @@ Utility functions specific to App Engine deployment.
 """
 import os
 import logging
-from google.cloud import storage
-from google.auth import default
+from app.gcs_client import get_client
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +19,9 @@ def init_app_engine_services():
             logger.warning("GCP_PROJECT_ID not set in environment variables")
             return None
             
-        # Use default credentials provided by App Engine
-        credentials, project = default()
-        storage_client = storage.Client(
-            project=project_id,
-            credentials=credentials
-        )
+        # Use default credentials provided by App Engine, through the
+        # process-wide pooled client
+        storage_client = get_client(project=project_id)
         
         logger.info(f"Successfully initialized App Engine services for project: {project_id}")
         return storage_client
@@ -0,0 +1,318 @@
+"""
+Audio decoding and rendering helpers for the Hippo Family Club language learning app.
+"""
+import struct
+import logging
+import subprocess
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+import sys
+from pydub import AudioSegment
+from pydub.exceptions import CouldntDecodeError
+from app.startup import lazy_import
+from app.mp3_seek import MPEG_SAMPLE_RATES
+from app.segments import adts_stream_info
+from app.timestretch import time_stretch
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import AUDIO_CONFIG
+
+# numpy is only needed to render audio; keep it off the cold-start path
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+# MP3 output without a Xing/LAME header or ID3 tag, so encoded clips can be
+# concatenated into one stream and players estimate its duration from the
+# constant bitrate instead of from the first clip's frame count
+MP3_EXPORT_PARAMETERS = ["-write_xing", "0", "-id3v2_version", "0"]
+
+# Output formats of rendered clips. Opus uses the same quality presets in
+# both containers. Only MP3 and ADTS AAC streams stay valid when encoded
+# clips are concatenated, which looped (repeat) responses rely on.
+OUTPUT_FORMATS = {
+    "mp3": {
+        "media_type": "audio/mpeg",
+        "accept": ("audio/mpeg", "audio/mp3"),
+        "extension": "mp3",
+        "codec": "libmp3lame",
+        "muxer": MP3_EXPORT_PARAMETERS + ["-f", "mp3"],
+        "preset": "mp3",
+        "concatenable": True,
+    },
+    "aac": {
+        "media_type": "audio/aac",
+        "accept": ("audio/aac", "audio/aacp", "audio/x-aac"),
+        "extension": "aac",
+        "codec": "aac",
+        "muxer": ["-f", "adts"],
+        "preset": "aac",
+        "concatenable": True,
+    },
+    "opus": {
+        "media_type": "audio/ogg; codecs=opus",
+        "accept": ("audio/ogg", "audio/opus", "application/ogg"),
+        "extension": "opus",
+        "codec": "libopus",
+        "muxer": ["-f", "ogg"],
+        "preset": "opus",
+        "concatenable": False,
+    },
+    "webm": {
+        "media_type": "audio/webm; codecs=opus",
+        "accept": ("audio/webm",),
+        "extension": "webm",
+        "codec": "libopus",
+        "muxer": ["-f", "webm"],
+        "preset": "opus",
+        "concatenable": False,
+    },
+}
+
+# Encoder settings of a rendered clip; hashable so it can key caches and
+# be sent to the process pool
+OutputFormat = namedtuple("OutputFormat", ["name", "quality", "bitrate", "channels", "sample_rate"])
+
+
+def output_format(name=None, quality=None):
+    """
+    Look up the encoder settings for a format and quality preset.
+
+    Args:
+        name: Key of OUTPUT_FORMATS (defaults to config)
+        quality: Quality preset in AUDIO_CONFIG["output"]["qualities"] (defaults to config)
+
+    Returns:
+        OutputFormat: Encoder settings
+
+    Raises:
+        ValueError: If the format or preset is unknown
+    """
+    config = AUDIO_CONFIG["output"]
+    name = name or config["default_format"]
+    quality = quality or config["default_quality"]
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {name!r}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    if quality not in config["qualities"]:
+        raise ValueError(f"Unknown quality {quality!r}, expected one of {', '.join(config['qualities'])}")
+    preset = config["qualities"][quality][OUTPUT_FORMATS[name]["preset"]]
+    return OutputFormat(name, quality, preset["bitrate"], preset["channels"], preset["sample_rate"])
+
+
+def output_key(output):
+    """Name an output format in clip cache keys, e.g. "mp3" or "opus-speech"."""
+    if output.quality == AUDIO_CONFIG["output"]["default_quality"]:
+        return output.name
+    return f"{output.name}-{output.quality}"
+
+
+def encoder_args(output):
+    """
+    Build the ffmpeg output options that encode to stdout in a format.
+
+    Args:
+        output: OutputFormat of the clip
+
+    Returns:
+        list: ffmpeg arguments following the input options
+    """
+    spec = OUTPUT_FORMATS[output.name]
+    args = ["-c:a", spec["codec"], "-b:a", output.bitrate]
+    if output.channels:
+        args += ["-ac", str(output.channels)]
+    if output.sample_rate:
+        args += ["-ar", str(output.sample_rate)]
+    if spec["codec"] == "libopus" and output.channels == 1:
+        # Speech presets: favour intelligibility at low bitrates
+        args += ["-application", "voip"]
+    return args + spec["muxer"] + ["pipe:1"]
+
+
+def decoder_command(source_path, start_ms=0, end_ms=None, preroll_ms=None, sample_rate=None, channels=None):
+    """
+    Build the ffmpeg command that decodes a time window to 16-bit WAV on stdout.
+
+    Args:
+        source_path: Path to the local audio file
+        start_ms: Start of the window in milliseconds
+        end_ms: End of the window in milliseconds, or None for the end of the file
+        preroll_ms: Extra audio decoded before the window (defaults to config)
+        sample_rate: Resample to this rate (defaults to the source's)
+        channels: Mix to this channel count (defaults to the source's)
+
+    Returns:
+        tuple: (command, seek_ms) where seek_ms is where decoding starts
+    """
+    if preroll_ms is None:
+        preroll_ms = AUDIO_CONFIG["decode_preroll_ms"]
+
+    seek_ms = max(0, start_ms - preroll_ms)
+    command = [AudioSegment.converter, "-nostdin", "-v", "error"]
+    if seek_ms > 0:
+        command += ["-ss", f"{seek_ms / 1000:.3f}"]
+    command += ["-i", str(source_path)]
+    if end_ms is not None:
+        command += ["-t", f"{max(end_ms - seek_ms, 0) / 1000:.3f}"]
+    command += ["-vn", "-c:a", "pcm_s16le"]
+    if sample_rate is not None:
+        command += ["-ar", str(sample_rate)]
+    if channels is not None:
+        command += ["-ac", str(channels)]
+    command += ["-f", "wav", "-"]
+    return command, seek_ms
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise CouldntDecodeError("Decoder output ended inside the WAV header")
+    return data
+
+
+def read_wav_header(stream):
+    """
+    Read a streamed WAV header up to the start of the sample data.
+
+    Args:
+        stream: Binary stream positioned at the start of a WAV file
+
+    Returns:
+        tuple: (sample_rate, channels, sample_width)
+    """
+    riff = _read_exact(stream, 12)
+    if riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise CouldntDecodeError("Decoder output is not WAV")
+
+    fmt = None
+    while True:
+        chunk_id, size = struct.unpack("<4sI", _read_exact(stream, 8))
+        if chunk_id == b"data":
+            break
+        body = _read_exact(stream, size + (size & 1))
+        if chunk_id == b"fmt ":
+            fmt = body
+    if fmt is None:
+        raise CouldntDecodeError("WAV header has no fmt chunk")
+
+    channels, sample_rate = struct.unpack("<HI", fmt[2:8])
+    bits = struct.unpack("<H", fmt[14:16])[0]
+    return sample_rate, channels, bits // 8
+
+
+def change_speed(segment, speed):
+    """
+    Change the tempo of an audio segment without changing its pitch.
+
+    Args:
+        segment: AudioSegment to stretch
+        speed: Playback speed within AUDIO_CONFIG["speed_range"]
+
+    Returns:
+        AudioSegment: Stretched audio in the same format as the input
+    """
+    if speed == 1.0 or len(segment) == 0:
+        return segment
+
+    # Work on 16-bit samples so the result round-trips through raw_data
+    segment = segment.set_sample_width(2)
+    stretched = time_stretch(
+        pcm_to_float(segment.raw_data, segment.channels),
+        segment.frame_rate,
+        speed,
+        frame_ms=AUDIO_CONFIG["time_stretch"]["frame_ms"],
+        search_ms=AUDIO_CONFIG["time_stretch"]["search_ms"]
+    )
+    return segment._spawn(float_to_pcm(stretched))
+
+
+def pcm_to_float(data, channels):
+    """Convert interleaved 16-bit PCM to float32 samples of shape (samples, channels)."""
+    return (np.frombuffer(data, dtype=np.int16).reshape(-1, channels) / 32768.0).astype(np.float32)
+
+
+def float_to_pcm(samples):
+    """Convert float samples back to interleaved 16-bit PCM bytes."""
+    return np.clip(np.round(samples * 32768.0), -32768, 32767).astype(np.int16).tobytes()
+
+
+def stream_info(data, audio_format):
+    """
+    Read the sample rate and channel count from the first frame header of
+    an encoded clip.
+
+    Args:
+        data: MP3 or ADTS AAC bytes starting on a frame boundary
+        audio_format: "mp3" or "aac"
+
+    Returns:
+        tuple: (sample_rate, channels), or None if no header is found
+    """
+    if audio_format == "aac":
+        return adts_stream_info(data)
+    if len(data) < 7 or data[0] != 0xFF:
+        return None
+
+    version = (data[1] >> 3) & 0x03
+    index = (data[2] >> 2) & 0x03
+    if (data[1] & 0xE0) != 0xE0 or version not in MPEG_SAMPLE_RATES or index == 3:
+        return None
+    channels = 1 if (data[3] >> 6) == 3 else 2
+    return MPEG_SAMPLE_RATES[version][index], channels
+
+
+@lru_cache(maxsize=64)
+def encoded_silence(duration_ms, output, sample_rate=44100, channels=2):
+    """
+    Encode a stretch of silence that can be spliced between encoded clips.
+
+    The silence is cached per output preset, so it is encoded with the
+    bitrate of the clips it is spliced between.
+
+    Args:
+        duration_ms: Length of the silence in milliseconds
+        output: OutputFormat of the clips (MP3 or ADTS AAC)
+        sample_rate: Sample rate of the clips
+        channels: Channel count of the clips
+
+    Returns:
+        bytes: Encoded silence
+    """
+    if duration_ms <= 0:
+        return b""
+
+    layout = "mono" if channels == 1 else "stereo"
+    command = [
+        AudioSegment.converter, "-nostdin", "-v", "error",
+        "-f", "lavfi", "-i", f"anullsrc=r={sample_rate}:cl={layout}",
+        "-t", f"{duration_ms / 1000:.3f}"
+    ] + encoder_args(output._replace(channels=channels, sample_rate=sample_rate))
+
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"Encoding silence failed with code {process.returncode}: "
+            f"{process.stderr.decode(errors='ignore')}"
+        )
+    return process.stdout
+
+
+def repeat_parts(data, repeat_count, gap=b""):
+    """
+    Lay out the body of a looped clip without copying it.
+
+    Args:
+        data: Encoded clip
+        repeat_count: Number of times the clip is played
+        gap: Encoded silence played between repetitions
+
+    Returns:
+        list: Body parts for http_utils.range_response
+    """
+    parts = [data]
+    for _ in range(repeat_count - 1):
+        if gap:
+            parts.append(gap)
+        parts.append(data)
+    return parts
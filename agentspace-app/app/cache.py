@@ -0,0 +1,481 @@
+"""
+Local caches for audio served by the Hippo Family Club language learning app.
+"""
+import os
+import time
+import heapq
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Temporary files younger than this may be a write in progress in another
+# server process sharing the cache directory
+STALE_PART_AGE_S = 3600
+
+
+def remove_stale_parts(directory, max_age_s=STALE_PART_AGE_S):
+    """Delete temporary ``.part`` files left behind by interrupted writes."""
+    cutoff = time.time() - max_age_s
+    for path in Path(directory).glob("*.part"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SourceCache:
+    """
+    Size-bounded, LRU on-disk cache of source audio downloaded from GCS.
+
+    Entries are keyed by blob name and generation. Files are named
+    ``<sha256(blob name)>.<generation><ext>`` so the index can be rebuilt
+    from a directory scan after a restart, and a new generation of a blob
+    replaces any older one on disk.
+
+    Server processes sharing the directory each keep their own index and
+    budget (see AUDIO_CONFIG), and may evict files another process has
+    just looked up; readers open the returned path at once and look it up
+    again if it is gone.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # file name -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        # name hash -> file name of the current generation
+        self._current = {}
+        self._total_bytes = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def _name_hash(blob_name):
+        return hashlib.sha256(blob_name.encode("utf-8")).hexdigest()
+
+    def _file_name(self, blob_name, generation, suffix=""):
+        return f"{self._name_hash(blob_name)}.{generation}{suffix}"
+
+    def _load_index(self):
+        """Rebuild the in-memory index from files already on disk."""
+        remove_stale_parts(self.directory)
+        files = []
+        for path in self.directory.iterdir():
+            if path.name.endswith(".part") or not path.is_file():
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            name_hash = name.split(".", 1)[0]
+            previous = self._current.get(name_hash)
+            if previous is not None:
+                # Keep only the most recently used generation of a blob
+                self._remove_entry(previous)
+            self._entries[name] = size
+            self._current[name_hash] = name
+            self._total_bytes += size
+
+        self._evict()
+        logger.info(f"Source cache loaded {len(self._entries)} files ({self._total_bytes} bytes) from {self.directory}")
+
+    def _remove_entry(self, name):
+        size = self._entries.pop(name, None)
+        if size is None:
+            return
+        self._total_bytes -= size
+        name_hash = name.split(".", 1)[0]
+        if self._current.get(name_hash) == name:
+            del self._current[name_hash]
+        try:
+            os.unlink(self.directory / name)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep=None):
+        """Drop least recently used files until the cache fits its budget."""
+        while self._total_bytes > self.max_bytes and self._entries:
+            name = next(iter(self._entries))
+            if name == keep:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(name)
+                continue
+            logger.info(f"Evicting {name} from source cache")
+            self._remove_entry(name)
+
+    def get(self, blob_name, generation, suffix=""):
+        """
+        Look up a cached source file.
+
+        Args:
+            blob_name: Name of the blob in the bucket
+            generation: Blob generation the caller expects
+            suffix: File extension used when the entry was stored
+
+        Returns:
+            str: Local path of the cached file, or None on a miss
+        """
+        name = self._file_name(blob_name, generation, suffix)
+        path = self.directory / name
+        with self._lock:
+            if name not in self._entries:
+                return None
+            if not path.exists():
+                self._remove_entry(name)
+                return None
+            self._entries.move_to_end(name)
+        try:
+            # Persist recency so LRU order survives a restart
+            os.utime(path)
+        except OSError:
+            pass
+        return str(path)
+
+    def put(self, blob_name, generation, fetch, suffix=""):
+        """
+        Store a source file in the cache.
+
+        The file is written to a temporary name in the cache directory and
+        atomically renamed into place, so readers never see partial files.
+
+        Args:
+            blob_name: Name of the blob in the bucket
+            generation: Generation of the blob being stored
+            fetch: Callable that writes the blob contents to the path it is given
+            suffix: File extension to keep so decoders can detect the format
+
+        Returns:
+            str: Local path of the cached file
+        """
+        name = self._file_name(blob_name, generation, suffix)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        try:
+            fetch(temp_path)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self.directory / name)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            name_hash = name.split(".", 1)[0]
+            previous = self._current.get(name_hash)
+            if previous is not None and previous != name:
+                logger.info(f"Invalidating cached generation {previous} of {blob_name}")
+                self._remove_entry(previous)
+            if name in self._entries:
+                self._total_bytes -= self._entries[name]
+            self._entries[name] = size
+            self._entries.move_to_end(name)
+            self._current[name_hash] = name
+            self._total_bytes += size
+            self._evict(keep=name)
+
+        return str(self.directory / name)
+
+    def get_or_fetch(self, blob_name, generation, fetch, suffix=""):
+        """
+        Return a local copy of a blob, downloading it on a cache miss.
+
+        Args:
+            blob_name: Name of the blob in the bucket
+            generation: Generation of the blob
+            fetch: Callable that writes the blob contents to the path it is given
+            suffix: File extension to keep so decoders can detect the format
+
+        Returns:
+            str: Local path of the cached file
+        """
+        path = self.get(blob_name, generation, suffix)
+        with self._lock:
+            if path is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if path is not None:
+            return path
+        return self.put(blob_name, generation, fetch, suffix)
+
+    def stats(self):
+        """Return cache occupancy and hit/miss counters."""
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def clip_key(blob_name, generation, params, audio_format="mp3"):
+    """
+    Build the content address of a rendered clip.
+
+    Repetition is not part of the key: a clip is encoded once and looped
+    at response time, so plain and repeated plays share the entry.
+
+    Args:
+        blob_name: Name of the source blob
+        generation: Generation of the source blob
+        params: Normalized playback parameters (see normalize_playback_params)
+        audio_format: Output container/codec of the rendered clip
+
+    Returns:
+        str: Hex digest identifying the clip
+    """
+    parts = [
+        blob_name,
+        str(generation),
+        str(params["start_ms"]),
+        "" if params["end_ms"] is None else str(params["end_ms"]),
+        f"{params['speed']:.3f}",
+        audio_format,
+    ]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def playlist_key(items, speed, gap_ms, audio_format="mp3"):
+    """
+    Build the content address of a rendered playlist.
+
+    Args:
+        items: (blob_name, generation, start_ms, end_ms) of every item, in order
+        speed: Normalized playback speed
+        gap_ms: Silence between items in milliseconds
+        audio_format: Output container/codec of the rendered playlist
+
+    Returns:
+        str: Hex digest identifying the playlist
+    """
+    parts = ["playlist", f"{speed:.3f}", str(gap_ms), audio_format]
+    for blob_name, generation, start_ms, end_ms in items:
+        parts += [blob_name, str(generation), str(start_ms), str(end_ms)]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class _GdsfTier:
+    """
+    Bookkeeping for one cache tier under Greedy-Dual-Size-Frequency.
+
+    Each entry has priority ``L + frequency / size``; the entry with the
+    lowest priority is evicted first and ``L`` is raised to its priority,
+    so small, frequently played clips stay while large one-off renders
+    age out.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._inflation = 0.0
+        # key -> [size, frequency, priority]
+        self._entries = {}
+        self._heap = []
+        self._counter = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def frequency(self, key):
+        entry = self._entries.get(key)
+        return entry[1] if entry else 0
+
+    def _push(self, key):
+        entry = self._entries[key]
+        entry[2] = self._inflation + entry[1] / max(entry[0], 1)
+        self._counter += 1
+        heapq.heappush(self._heap, (entry[2], self._counter, key))
+
+    def touch(self, key):
+        self._entries[key][1] += 1
+        self._push(key)
+
+    def add(self, key, size, frequency=1):
+        """
+        Add an entry and return the keys evicted to make room for it.
+        """
+        if key in self._entries:
+            self.remove(key)
+        self._entries[key] = [size, frequency, 0.0]
+        self.total_bytes += size
+        self._push(key)
+        return self._evict(keep=key)
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    def _evict(self, keep):
+        evicted = []
+        kept = None
+        while self.total_bytes > self.max_bytes and self._heap:
+            record = heapq.heappop(self._heap)
+            priority, _, key = record
+            entry = self._entries.get(key)
+            if entry is None or entry[2] != priority:
+                # Stale heap record from an earlier priority
+                continue
+            if key == keep:
+                # Never evict the entry that is being added
+                kept = record
+                continue
+            self._inflation = priority
+            self.remove(key)
+            evicted.append(key)
+        if kept is not None:
+            heapq.heappush(self._heap, kept)
+        if len(self._heap) > 4 * len(self._entries) + 64:
+            self._compact()
+        return evicted
+
+    def _compact(self):
+        self._heap = [(entry[2], i, key) for i, (key, entry) in enumerate(self._entries.items())]
+        self._counter = len(self._heap)
+        heapq.heapify(self._heap)
+
+
+class ClipCache:
+    """
+    Two-tier (memory and disk) cache of encoded playback clips.
+
+    Clips are content-addressed with clip_key. Both tiers evict using
+    Greedy-Dual-Size-Frequency; a disk hit promotes the clip back into
+    memory.
+    """
+
+    def __init__(self, directory, memory_max_bytes, disk_max_bytes):
+        self.directory = Path(directory)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._memory_tier = _GdsfTier(memory_max_bytes)
+        self._disk_tier = _GdsfTier(disk_max_bytes)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return self.directory / f"{key}.clip"
+
+    def _load_index(self):
+        """Register clips already on disk after a restart."""
+        remove_stale_parts(self.directory)
+        for path in self.directory.glob("*.clip"):
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            for key in self._disk_tier.add(path.stem, size):
+                self._path(key).unlink(missing_ok=True)
+
+    def __contains__(self, key):
+        """Check for a clip without counting a hit or touching its priority."""
+        with self._lock:
+            return key in self._memory or key in self._disk_tier
+
+    def get(self, key):
+        """
+        Look up an encoded clip.
+
+        Args:
+            key: Clip key from clip_key
+
+        Returns:
+            bytes: Encoded clip, or None on a miss
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory_tier.touch(key)
+                if key in self._disk_tier:
+                    self._disk_tier.touch(key)
+                self.memory_hits += 1
+                return data
+            on_disk = key in self._disk_tier
+
+        if on_disk:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = None
+            with self._lock:
+                if data is None:
+                    self._disk_tier.remove(key)
+                else:
+                    self._disk_tier.touch(key)
+                    self._store_in_memory(key, data, self._disk_tier.frequency(key))
+                    self.disk_hits += 1
+                    return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """
+        Store an encoded clip in both tiers.
+
+        Args:
+            key: Clip key from clip_key
+            data: Encoded clip bytes
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self._path(key))
+        except Exception as e:
+            logger.warning(f"Could not write clip {key} to disk cache: {str(e)}")
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            with self._lock:
+                self._store_in_memory(key, data)
+            return
+
+        with self._lock:
+            for evicted in self._disk_tier.add(key, len(data)):
+                self._path(evicted).unlink(missing_ok=True)
+            self._store_in_memory(key, data)
+
+    def _store_in_memory(self, key, data, frequency=1):
+        if len(data) > self._memory_tier.max_bytes:
+            return
+        self._memory[key] = data
+        for evicted in self._memory_tier.add(key, len(data), frequency):
+            self._memory.pop(evicted, None)
+
+    def stats(self):
+        """Return occupancy and hit/miss counters for both tiers."""
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory_tier),
+                "memory_bytes": self._memory_tier.total_bytes,
+                "disk_entries": len(self._disk_tier),
+                "disk_bytes": self._disk_tier.total_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
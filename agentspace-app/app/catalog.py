@@ -0,0 +1,230 @@
+"""
+In-process catalog of the audio bucket.
+
+Replaces per-request ``list_blobs`` calls with dictionary and sorted-array
+lookups. The catalog is persisted as a compact gzip snapshot so a restarted
+instance can serve lookups before its first refresh, and refreshes only
+touch entries whose generation changed.
+"""
+import os
+import gzip
+import json
+import time
+import bisect
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Blob attributes kept per entry, in snapshot column order
+FIELDS = ("name", "size", "generation", "updated", "content_type", "md5_hash", "metadata")
+
+SNAPSHOT_VERSION = 1
+
+
+class Catalog:
+    """
+    Index of blob metadata with exact and prefix lookup.
+
+    Entries are plain dicts with the keys in FIELDS. Names are also kept in
+    a sorted list so prefix lookups are a binary search, returning the same
+    (lexicographically first) blob that ``list_blobs(prefix=...)`` would.
+    """
+
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path
+        # Incremented on every change so derived indexes know to rebuild
+        self.version = 0
+        self.refreshed_at = None
+        self._entries = {}
+        self._names = []
+        self._lock = threading.RLock()
+        self._refresher = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def loaded(self):
+        return self.refreshed_at is not None
+
+    def get(self, name):
+        """Return the entry for an exact blob name, or None."""
+        return self._entries.get(name)
+
+    def find(self, prefix):
+        """
+        Return the first entry whose name starts with a prefix.
+
+        Args:
+            prefix: Blob name prefix (an exact name matches itself first)
+
+        Returns:
+            dict: Catalog entry, or None if nothing matches
+        """
+        entry = self._entries.get(prefix)
+        if entry is not None:
+            return entry
+        with self._lock:
+            index = bisect.bisect_left(self._names, prefix)
+            if index < len(self._names) and self._names[index].startswith(prefix):
+                return self._entries[self._names[index]]
+        return None
+
+    def list_prefix(self, prefix="", limit=None):
+        """
+        Return entries whose names start with a prefix, in name order.
+
+        Args:
+            prefix: Blob name prefix
+            limit: Maximum number of entries to return
+
+        Returns:
+            list: Catalog entries
+        """
+        with self._lock:
+            index = bisect.bisect_left(self._names, prefix)
+            entries = []
+            while index < len(self._names) and self._names[index].startswith(prefix):
+                entries.append(self._entries[self._names[index]])
+                if limit is not None and len(entries) >= limit:
+                    break
+                index += 1
+            return entries
+
+    def entries(self):
+        """Return all entries in name order."""
+        with self._lock:
+            return [self._entries[name] for name in self._names]
+
+    def upsert(self, entry):
+        """Add or replace a single entry."""
+        with self._lock:
+            name = entry["name"]
+            if name not in self._entries:
+                bisect.insort(self._names, name)
+            self._entries[name] = entry
+            self.version += 1
+
+    def remove(self, name):
+        """Remove a single entry if present."""
+        with self._lock:
+            if self._entries.pop(name, None) is not None:
+                index = bisect.bisect_left(self._names, name)
+                del self._names[index]
+                self.version += 1
+
+    def refresh(self, list_entries):
+        """
+        Reconcile the catalog with a listing of the bucket.
+
+        Only entries whose generation changed are replaced and deleted
+        blobs are dropped; unchanged entries (and the snapshot, if nothing
+        changed) are left alone.
+
+        Args:
+            list_entries: Callable returning an iterable of entry dicts
+
+        Returns:
+            int: Number of entries added, updated or removed
+        """
+        started = time.perf_counter()
+        listed = {entry["name"]: entry for entry in list_entries()}
+
+        with self._lock:
+            changed = 0
+            for name, entry in listed.items():
+                current = self._entries.get(name)
+                if current is None or current["generation"] != entry["generation"]:
+                    self._entries[name] = entry
+                    changed += 1
+            for name in [name for name in self._entries if name not in listed]:
+                del self._entries[name]
+                changed += 1
+            if changed:
+                self._names = sorted(self._entries)
+                self.version += 1
+            self.refreshed_at = time.time()
+
+        logger.info(
+            f"Catalog refreshed: {len(listed)} blobs, {changed} changes "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        if changed:
+            self.save_snapshot()
+        return changed
+
+    def load_snapshot(self):
+        """
+        Load the catalog from its snapshot file.
+
+        Returns:
+            bool: True if a usable snapshot was loaded
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with gzip.open(self.snapshot_path, "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("version") != SNAPSHOT_VERSION or tuple(snapshot["fields"]) != FIELDS:
+                logger.warning("Ignoring catalog snapshot with an incompatible format")
+                return False
+            entries = {row[0]: dict(zip(FIELDS, row)) for row in snapshot["rows"]}
+        except Exception as e:
+            logger.warning(f"Could not load catalog snapshot: {str(e)}")
+            return False
+
+        with self._lock:
+            self._entries = entries
+            self._names = sorted(entries)
+            self.refreshed_at = snapshot.get("refreshed_at")
+            self.version += 1
+        logger.info(f"Loaded {len(entries)} catalog entries from snapshot")
+        return True
+
+    def save_snapshot(self):
+        """Atomically write the catalog to its snapshot file."""
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "refreshed_at": self.refreshed_at,
+                "fields": FIELDS,
+                "rows": [[self._entries[name][field] for field in FIELDS] for name in self._names],
+            }
+        directory = os.path.dirname(self.snapshot_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+            os.replace(temp_path, self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"Could not write catalog snapshot: {str(e)}")
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def start_refresher(self, list_entries, interval):
+        """
+        Refresh the catalog now and then every ``interval`` seconds in a
+        background thread.
+
+        Args:
+            list_entries: Callable returning an iterable of entry dicts
+            interval: Seconds between refreshes
+        """
+        if self._refresher is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.refresh(list_entries)
+                except Exception as e:
+                    logger.error(f"Error refreshing catalog: {str(e)}")
+                time.sleep(interval)
+
+        self._refresher = threading.Thread(target=run, name="catalog-refresher", daemon=True)
+        self._refresher.start()
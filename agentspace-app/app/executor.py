@@ -0,0 +1,297 @@
+"""
+Worker pools that keep blocking GCS and audio work off the event loop.
+
+I/O-bound work (GCS metadata lookups, downloads, cache reads and writes)
+runs on a thread pool. CPU-bound work (decode, time-stretch, encode) runs
+on a process pool so it neither holds the GIL nor blocks the event loop.
+Streamed renders run on the process pool too and send their output back
+through a named pipe (see stream_cpu).
+"""
+import os
+import uuid
+import errno
+import asyncio
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import EXECUTOR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a pool already has its maximum number of queued jobs."""
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away while its job was pending."""
+
+
+class BoundedExecutor:
+    """
+    Executor wrapper with a queue-depth limit and disconnect cancellation.
+
+    At most ``max_workers`` jobs run at once and at most ``queue_limit``
+    more wait for a worker; further submissions fail fast with Overloaded
+    instead of piling up behind a slow transcode.
+    """
+
+    def __init__(self, name, executor_factory, max_workers, queue_limit):
+        self.name = name
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._executor_factory = executor_factory
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = self._executor_factory(self.max_workers)
+        return self._executor
+
+    async def run(self, fn, *args, request=None):
+        """
+        Run a blocking callable in the pool.
+
+        Args:
+            fn: Callable to run (must be picklable for process pools)
+            *args: Positional arguments for the callable
+            request: Optional request; the job is cancelled if its client disconnects
+
+        Returns:
+            The callable's return value
+
+        Raises:
+            Overloaded: If the pool's queue is full
+            ClientDisconnected: If the client disconnected before the job finished
+        """
+        if self.pending >= self.max_workers + self.queue_limit:
+            raise Overloaded(f"{self.name} pool is saturated ({self.pending} jobs pending)")
+
+        # pending is only touched from the event loop thread
+        self.pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+            waiter = asyncio.wrap_future(future)
+            if request is None:
+                return await waiter
+
+            poll_interval = EXECUTOR_CONFIG["disconnect_poll_interval"]
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=poll_interval)
+                if done:
+                    return waiter.result()
+                if await request.is_disconnected():
+                    # Queued jobs are dropped; a job that already started
+                    # runs to completion but its result is discarded.
+                    future.cancel()
+                    waiter.cancel()
+                    raise ClientDisconnected(f"Client disconnected during {fn.__name__}")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool
+            # for the next job instead of failing every later request.
+            logger.error(f"{self.name} pool broken, recreating it")
+            self._executor = None
+            raise
+        finally:
+            self.pending -= 1
+
+    def submit(self, fn, *args):
+        """
+        Start a blocking callable in the pool without waiting for it.
+
+        Must be called from the event loop thread.
+
+        Returns:
+            asyncio.Future: Resolves to the callable's return value
+
+        Raises:
+            Overloaded: If the pool's queue is full
+        """
+        if self.pending >= self.max_workers + self.queue_limit:
+            raise Overloaded(f"{self.name} pool is saturated ({self.pending} jobs pending)")
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            logger.error(f"{self.name} pool broken, recreating it")
+            self._executor = None
+            raise
+        self.pending += 1
+
+        def done(waiter):
+            self.pending -= 1
+            if not waiter.cancelled() and isinstance(waiter.exception(), BrokenProcessPool):
+                logger.error(f"{self.name} pool broken, recreating it")
+                self._executor = None
+
+        waiter = asyncio.wrap_future(future)
+        waiter.add_done_callback(done)
+        return waiter
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+io_pool = BoundedExecutor(
+    "io",
+    lambda workers: ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hippo-io"),
+    EXECUTOR_CONFIG["io_workers"],
+    EXECUTOR_CONFIG["io_queue_limit"],
+)
+
+# Worker processes are spawned rather than forked: forking a process that
+# already runs uvicorn and the I/O threads is not safe.
+cpu_pool = BoundedExecutor(
+    "cpu",
+    lambda workers: ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")),
+    EXECUTOR_CONFIG["cpu_workers"],
+    EXECUTOR_CONFIG["cpu_queue_limit"],
+)
+
+
+# Directory of the named pipes streamed renders are read through
+_pipe_dir = None
+_pipe_dir_lock = threading.Lock()
+
+
+def pipe_directory():
+    global _pipe_dir
+    with _pipe_dir_lock:
+        if _pipe_dir is None:
+            _pipe_dir = tempfile.mkdtemp(prefix="hippo-streams-")
+        return _pipe_dir
+
+
+def write_to_pipe(path, fn, *args):
+    """
+    Run ``fn(*args)`` in a pool worker and write the chunks it yields into
+    the named pipe at ``path``.
+
+    Returns quietly when the reader is gone, before or during the job;
+    the chunk iterator is closed either way, which aborts the render.
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as e:
+        # The pipe was removed, or nobody reads it any more
+        if e.errno in (errno.ENOENT, errno.ENXIO):
+            return
+        raise
+    os.set_blocking(fd, True)
+
+    with open(fd, "wb", buffering=0) as pipe:
+        chunks = iter(fn(*args))
+        try:
+            for chunk in chunks:
+                view = memoryview(chunk)
+                while view:
+                    view = view[pipe.write(view):]
+        except BrokenPipeError:
+            return
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+
+class PipedJob:
+    """
+    Output of a job streamed from the process pool through a named pipe.
+
+    The reading end is opened before the job is submitted, together with a
+    placeholder writer held until the job finishes. Reads therefore block
+    until the worker writes rather than seeing an early end of file, and
+    end once the job is done however it ended. ``close`` cancels a job
+    that has not started; one that is running stops at its next write.
+    """
+
+    def __init__(self, pool, fn, *args):
+        self.path = os.path.join(pipe_directory(), f"{uuid.uuid4().hex}.fifo")
+        os.mkfifo(self.path, 0o600)
+        try:
+            self._reader = open(os.open(self.path, os.O_RDONLY | os.O_NONBLOCK), "rb", buffering=0)
+            os.set_blocking(self._reader.fileno(), True)
+            self._placeholder = os.open(self.path, os.O_WRONLY)
+            self.job = pool.submit(write_to_pipe, self.path, fn, *args)
+        except BaseException:
+            self.close()
+            raise
+        self.job.add_done_callback(lambda _: self._release_placeholder())
+
+    def _release_placeholder(self):
+        # Only touched from the event loop thread
+        placeholder, self._placeholder = getattr(self, "_placeholder", None), None
+        if placeholder is not None:
+            os.close(placeholder)
+
+    def read(self, size):
+        """
+        Read the next chunk; blocks, so call it from a thread.
+
+        Returns:
+            bytes: Up to size bytes, or b"" once the job has finished
+        """
+        return self._reader.read(size)
+
+    async def result(self):
+        """Wait for the job and raise its error, if any."""
+        return await self.job
+
+    def close(self):
+        """Stop reading and remove the pipe; call from the event loop thread."""
+        job = getattr(self, "job", None)
+        if job is not None and not job.done():
+            job.cancel()
+        self._release_placeholder()
+        reader = getattr(self, "_reader", None)
+        if reader is not None:
+            reader.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def stream_cpu(fn, *args):
+    """
+    Start a streamed job on the process pool.
+
+    Args:
+        fn: Picklable callable returning an iterable of bytes chunks
+        *args: Picklable arguments for the callable
+
+    Returns:
+        PipedJob: Reader of the chunks as the worker produces them
+
+    Raises:
+        Overloaded: If the pool's queue is full
+    """
+    return PipedJob(cpu_pool, fn, *args)
+
+
+async def run_io(fn, *args, request=None):
+    """Run blocking I/O on the thread pool."""
+    return await io_pool.run(fn, *args, request=request)
+
+
+async def run_cpu(fn, *args, request=None):
+    """Run CPU-bound audio processing on the process pool."""
+    return await cpu_pool.run(fn, *args, request=request)
+
+
+def shutdown_pools():
+    """Shut down both worker pools."""
+    io_pool.shutdown()
+    cpu_pool.shutdown()
@@ -0,0 +1,171 @@
+"""
+Shared, tuned Google Cloud Storage clients.
+
+``storage.Client()`` with default settings talks to GCS through a requests
+session with a 10-connection pool, no TCP keep-alive probes, a separate
+unpooled session for token refreshes and the library's default timeout and
+retry policy. Creating a client per call (as the ingestion scripts did)
+also pays TLS and credential setup every time.
+
+``get_client`` returns one client per project and credentials per process,
+backed by an authorized session whose connection pool is sized to the
+number of threads using it, with TCP keep-alive so idle pooled connections
+survive between requests, and token refreshes going through their own
+pooled session. ``make_retry`` builds the retry policy and
+``pool_stats`` reports how the pools are used so they can be sized under
+load. Like storage_backends.py this module does not read the app config,
+so the ingestion scripts share it.
+"""
+import socket
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+import google.auth
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2 import service_account
+from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+
+logger = logging.getLogger(__name__)
+
+# Clients by (project, credentials path), one of each per process
+clients = {}
+clients_lock = threading.Lock()
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTP adapter with a fixed-size pool and TCP keep-alive probes.
+
+    Connections idle for ``keepalive_s`` seconds are probed by the kernel,
+    so load balancers between here and GCS do not silently drop them and
+    the next request on a pooled connection does not stall on a dead socket.
+    """
+
+    def __init__(self, pool_size, keepalive_s, block=False):
+        self.keepalive_s = keepalive_s
+        super().__init__(pool_connections=1, pool_maxsize=pool_size, pool_block=block, max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        options = list(HTTPConnection.default_socket_options)
+        if self.keepalive_s:
+            options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            probes = (
+                ("TCP_KEEPIDLE", self.keepalive_s),
+                ("TCP_KEEPINTVL", max(1, self.keepalive_s // 4)),
+                ("TCP_KEEPCNT", 4),
+            )
+            for name, value in probes:
+                # Not every platform has the per-socket tuning options
+                if hasattr(socket, name):
+                    options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+        kwargs["socket_options"] = options
+        super().init_poolmanager(*args, **kwargs)
+
+    def stats(self):
+        """Return connection counts summed over the adapter's host pools."""
+        pools = []
+        for key in self.poolmanager.pools.keys():
+            pool = self.poolmanager.pools.get(key)
+            if pool is not None:
+                pools.append(pool)
+        idle = sum(1 for pool in pools for conn in list(pool.pool.queue) if conn is not None)
+        return {
+            "hosts": len(pools),
+            "max_size": self._pool_maxsize,
+            "connections_opened": sum(pool.num_connections for pool in pools),
+            "requests": sum(pool.num_requests for pool in pools),
+            "idle": idle,
+            # Free slots that hold no connection yet are also in the queue
+            "in_use": sum(pool.pool.maxsize - pool.pool.qsize() for pool in pools),
+        }
+
+
+def load_credentials(credentials_path=None):
+    """
+    Load storage credentials from a key file or the environment.
+
+    Returns:
+        tuple: (credentials, project id or None)
+    """
+    if credentials_path:
+        credentials = service_account.Credentials.from_service_account_file(
+            credentials_path, scopes=storage.Client.SCOPE
+        )
+        return credentials, credentials.project_id
+    return google.auth.default(scopes=storage.Client.SCOPE)
+
+
+def make_retry(initial=1.0, maximum=30.0, multiplier=2.0, deadline=120.0):
+    """
+    Build the retry policy for storage calls.
+
+    Transient errors (429, 5xx, connection resets) are retried with
+    exponential backoff from ``initial`` to ``maximum`` seconds until
+    ``deadline`` seconds have passed.
+    """
+    return DEFAULT_RETRY.with_delay(initial=initial, maximum=maximum, multiplier=multiplier).with_timeout(deadline)
+
+
+def get_client(project=None, credentials_path=None, pool_size=16, keepalive_s=60, refresh_timeout=30):
+    """
+    Return the process-wide storage client for a project and credentials.
+
+    Args:
+        project: GCP project id, or None for the one of the credentials
+        credentials_path: Service account key file, or None for application
+            default credentials
+        pool_size: Maximum number of pooled connections to GCS; should be
+            at least the number of threads issuing storage calls
+        keepalive_s: Idle seconds before TCP keep-alive probes (0 disables)
+        refresh_timeout: Timeout in seconds for access token refreshes
+
+    Returns:
+        google.cloud.storage.Client: The shared client
+    """
+    key = (project, credentials_path)
+    with clients_lock:
+        client = clients.get(key)
+        if client is not None:
+            return client
+
+        credentials, default_project = load_credentials(credentials_path)
+
+        # Token refreshes reuse a pooled connection to the token endpoint
+        auth_session = requests.Session()
+        auth_session.mount("https://", KeepAliveAdapter(2, keepalive_s))
+        session = AuthorizedSession(
+            credentials,
+            refresh_timeout=refresh_timeout,
+            auth_request=Request(session=auth_session)
+        )
+        session.mount("https://", KeepAliveAdapter(pool_size, keepalive_s))
+
+        client = storage.Client(project=project or default_project, credentials=credentials, _http=session)
+        clients[key] = client
+        logger.info(f"Created storage client for project {client.project} with a {pool_size}-connection pool")
+        return client
+
+
+def pool_stats():
+    """
+    Report connection pool usage of the shared clients.
+
+    Returns:
+        dict: Totals over all clients: configured size, connections opened
+            so far, requests served, idle and in-use connections. Requests
+            per opened connection well above 1 means keep-alive is working;
+            connections_opened growing while in_use is at max_size means
+            the pool is too small and surplus connections are discarded.
+    """
+    totals = {"clients": 0, "max_size": 0, "connections_opened": 0, "requests": 0, "idle": 0, "in_use": 0}
+    with clients_lock:
+        sessions = [client._http for client in clients.values()]
+    for session in sessions:
+        totals["clients"] += 1
+        for name, value in session.get_adapter("https://storage.googleapis.com").stats().items():
+            if name in totals:
+                totals[name] += value
+    return totals
@@ -0,0 +1,411 @@
+"""
+HTTP helpers for serving audio with byte-range support and validators.
+"""
+import os
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi.responses import Response, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# Chunk size used when streaming response bodies
+CHUNK_SIZE = 64 * 1024
+
+# A slice of a local file that is part of a response body
+FilePart = namedtuple("FilePart", ["path", "offset", "length"])
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be satisfied for a body size."""
+
+
+def file_part(path):
+    """
+    Build a part covering a whole local file.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        FilePart: Part spanning the file
+    """
+    return FilePart(path, 0, os.path.getsize(path))
+
+
+def parts_length(parts):
+    """Return the total size in bytes of a list of body parts."""
+    return sum(part.length if isinstance(part, FilePart) else len(part) for part in parts)
+
+
+def iter_parts(parts, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the bytes of a list of body parts between two offsets.
+
+    Args:
+        parts: List of bytes objects and FilePart slices
+        start: First byte offset to yield
+        end: Offset one past the last byte to yield (defaults to the end)
+        chunk_size: Maximum size of each yielded chunk
+
+    Yields:
+        bytes: Consecutive chunks of the requested range
+    """
+    if end is None:
+        end = parts_length(parts)
+
+    position = 0
+    for part in parts:
+        size = part.length if isinstance(part, FilePart) else len(part)
+        part_start = max(start - position, 0)
+        part_end = min(end - position, size)
+        position += size
+        if part_start >= part_end:
+            if position >= end:
+                break
+            continue
+
+        if isinstance(part, FilePart):
+            with open(part.path, "rb") as f:
+                f.seek(part.offset + part_start)
+                remaining = part_end - part_start
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+        else:
+            view = memoryview(part)
+            for offset in range(part_start, part_end, chunk_size):
+                yield bytes(view[offset:min(offset + chunk_size, part_end)])
+
+        if position >= end:
+            break
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header.
+
+    Multiple ranges and malformed headers are ignored (the full body is
+    served), as RFC 9110 allows.
+
+    Args:
+        header: Value of the Range header, or None
+        size: Size of the full body in bytes
+
+    Returns:
+        tuple: (start, end) with end exclusive, or None to serve the full body
+
+    Raises:
+        RangeNotSatisfiable: If the range lies outside the body
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    first = first.strip()
+    last = last.strip()
+    if (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        if not last:
+            return None
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size
+
+    start = int(first)
+    end = int(last) + 1 if last else size
+    if last and end <= start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size)
+
+
+def whole_body_requested(request_headers):
+    """
+    Check whether a request asks for the whole body from its first byte.
+
+    Browsers' media elements open every source with ``Range: bytes=0-``.
+    That range is the whole body, so it can be answered like a request
+    without one: a 200 sent as the body is produced, before its length is
+    known. If-Range makes the range conditional on a validator, so such
+    requests are left to the range path.
+
+    Args:
+        request_headers: Headers of the incoming request, or None
+
+    Returns:
+        bool: True if there is no Range header or it is an open range from byte 0
+    """
+    if request_headers is None or "range" not in request_headers:
+        return True
+    if request_headers.get("if-range"):
+        return False
+    unit, _, spec = request_headers["range"].partition("=")
+    return unit.strip().lower() == "bytes" and spec.replace(" ", "") == "0-"
+
+
+def http_date(value):
+    """
+    Format a timestamp as an HTTP date.
+
+    Args:
+        value: datetime or ISO 8601 string
+
+    Returns:
+        str: RFC 7231 IMF-fixdate, or None if value is empty
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return format_datetime(value, usegmt=True)
+
+
+def parse_accept(header):
+    """
+    Parse an Accept header.
+
+    Args:
+        header: Accept header value
+
+    Returns:
+        dict: Quality value by lower-cased media range, parameters dropped
+    """
+    ranges = {}
+    for item in header.split(","):
+        media_range, *params = [part.strip() for part in item.split(";")]
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = max(0.0, min(1.0, float(value)))
+                except ValueError:
+                    q = 0.0
+        media_range = media_range.lower()
+        ranges[media_range] = max(q, ranges.get(media_range, 0.0))
+    return ranges
+
+
+def accept_quality(ranges, media_types):
+    """
+    Find the quality value a parsed Accept header gives a representation.
+
+    The most specific matching range counts: an exact type, then "type/*",
+    then "*/*".
+
+    Args:
+        ranges: Result of parse_accept
+        media_types: Media types the representation can be labelled with
+
+    Returns:
+        tuple: (quality, whether a type matched exactly)
+    """
+    exact = [ranges[media_type] for media_type in media_types if media_type in ranges]
+    if exact:
+        return max(exact), True
+    wildcards = [ranges[f"{media_type.split('/')[0]}/*"] for media_type in media_types
+                 if f"{media_type.split('/')[0]}/*" in ranges]
+    if wildcards:
+        return max(wildcards), False
+    return ranges.get("*/*", 0.0), False
+
+
+def negotiate(accept, offers, default):
+    """
+    Choose a representation for an Accept header.
+
+    Higher quality values win, then representations the client names
+    explicitly over ones it only accepts through a wildcard. Among
+    wildcard matches the default goes first; other ties follow the order
+    of ``offers``. Clients sending no Accept header, or accepting none of
+    the offers, get the default rather than a 406.
+
+    Args:
+        accept: Accept header value, or None
+        offers: (name, media types) pairs in order of server preference
+        default: Name of the default representation
+
+    Returns:
+        str: Name of the chosen representation
+    """
+    if not accept:
+        return default
+    ranges = parse_accept(accept)
+    best = None
+    for position, (name, media_types) in enumerate(offers):
+        q, explicit = accept_quality(ranges, media_types)
+        if q <= 0:
+            continue
+        rank = (q, explicit, not explicit and name == default, -position)
+        if best is None or rank > best[0]:
+            best = (rank, name)
+    return default if best is None else best[1]
+
+
+def accepts(accept, media_types):
+    """Check whether an Accept header allows a representation; no header allows anything."""
+    return not accept or accept_quality(parse_accept(accept), media_types)[0] > 0
+
+
+def make_etag(*parts):
+    """
+    Derive a strong ETag from the values that determine a representation.
+
+    Args:
+        *parts: Values such as blob generation and normalized parameters
+
+    Returns:
+        str: Quoted strong ETag
+    """
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def cache_control(max_age, immutable=False):
+    """Build a Cache-Control value for a public response."""
+    value = f"public, max-age={max_age}"
+    if immutable:
+        value += ", immutable"
+    return value
+
+
+def is_not_modified(request_headers, etag=None, last_modified=None):
+    """
+    Evaluate If-None-Match and If-Modified-Since for a GET request.
+
+    If-None-Match takes precedence and uses weak comparison; the date is
+    only consulted when If-None-Match is absent (RFC 9110, 13.2.2).
+
+    Args:
+        request_headers: Headers of the incoming request
+        etag: Current ETag of the representation
+        last_modified: Current Last-Modified HTTP date
+
+    Returns:
+        bool: True if a 304 Not Modified should be sent
+    """
+    if not request_headers:
+        return False
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        current = etag[2:] if etag.startswith("W/") else etag
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate == current:
+                return True
+        return False
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(etag=None, last_modified=None, headers=None):
+    """Build a 304 response carrying the validators and caching headers."""
+    response_headers = {}
+    if etag:
+        response_headers["ETag"] = etag
+    if last_modified:
+        response_headers["Last-Modified"] = last_modified
+    response_headers.update(headers or {})
+    return Response(status_code=304, headers=response_headers)
+
+
+def if_range_matches(if_range, etag=None, last_modified=None):
+    """
+    Check whether an ``If-Range`` precondition still holds.
+
+    Args:
+        if_range: Value of the If-Range header, or None
+        etag: Current strong ETag of the representation
+        last_modified: Current Last-Modified HTTP date
+
+    Returns:
+        bool: True if the Range header should be honored
+    """
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Weak validators never match for If-Range
+        return etag is not None and not if_range.startswith("W/") and if_range == etag
+    return last_modified is not None and if_range == last_modified
+
+
+def range_response(parts, media_type, request_headers=None, etag=None, last_modified=None, headers=None):
+    """
+    Build a response for a body that honors Range and If-Range.
+
+    Args:
+        parts: List of bytes objects and FilePart slices forming the body
+        media_type: Content type of the body
+        request_headers: Headers of the incoming request
+        etag: Strong ETag of the body, if known
+        last_modified: Last-Modified HTTP date of the body, if known
+        headers: Extra response headers
+
+    Returns:
+        Response: 200, 206 or 416 response
+    """
+    request_headers = request_headers or {}
+    size = parts_length(parts)
+
+    response_headers = {"Accept-Ranges": "bytes"}
+    if etag:
+        response_headers["ETag"] = etag
+    if last_modified:
+        response_headers["Last-Modified"] = last_modified
+    response_headers.update(headers or {})
+
+    byte_range = None
+    if if_range_matches(request_headers.get("if-range"), etag, last_modified):
+        try:
+            byte_range = parse_range(request_headers.get("range"), size)
+        except RangeNotSatisfiable:
+            response_headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=response_headers)
+
+    if byte_range is None:
+        start, end, status_code = 0, size, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        response_headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+
+    response_headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        iter_parts(parts, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=response_headers
+    )
@@ -0,0 +1,272 @@
+"""
+Faceted library index over the bucket catalog.
+
+Facets are precomputed as bitmaps (Python ints, one bit per item in name
+order) so a filtered query is a handful of big-integer ANDs rather than a
+scan of every item. Durations are kept as a sorted array with per-block
+bitmaps, so a duration range costs at most a few hundred bit operations.
+Name search checks a list of lowercased names built with the index and
+turns the hits into a bitmap in one linear pass.
+"""
+import os
+import json
+import base64
+import bisect
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Number of sorted durations covered by each precomputed block bitmap
+DURATION_BLOCK_SIZE = 256
+
+
+def popcount(bits):
+    """Count set bits (int.bit_count needs Python 3.10)."""
+    return bin(bits).count("1")
+
+
+def iter_bits(bits):
+    """Yield the positions of set bits in ascending order."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def bits_from_positions(positions, size):
+    """
+    Build the bitmap with the given positions set.
+
+    Setting bits one at a time copies the whole int for every bit; filling
+    a byte array first and converting it once stays linear.
+    """
+    bitmap = bytearray((size + 7) // 8)
+    for position in positions:
+        bitmap[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bitmap, "little")
+
+
+def encode_cursor(item_id):
+    return base64.urlsafe_b64encode(item_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    padding = "=" * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(cursor + padding).decode("utf-8")
+
+
+def _parse_languages(value, fallback):
+    if not value:
+        return [fallback]
+    if value.startswith("["):
+        try:
+            return [str(language) for language in json.loads(value)]
+        except ValueError:
+            pass
+    return [language.strip() for language in value.split(",") if language.strip()]
+
+
+def _parse_duration(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def _facet_counts(bitmaps, mask):
+    counts = {}
+    for value, bits in sorted(bitmaps.items()):
+        count = popcount(bits & mask)
+        if count:
+            counts[value] = count
+    return counts
+
+
+class LibraryIndex:
+    """
+    Immutable index of library items built from catalog entries.
+    """
+
+    def __init__(self, entries, prefix, formats, language_from_path):
+        self.items = []
+        for entry in entries:
+            name = entry["name"]
+            if not name.startswith(prefix) or os.path.splitext(name)[1].lstrip(".").lower() not in formats:
+                continue
+            custom = entry.get("metadata") or {}
+            self.items.append({
+                "id": name[len(prefix):],
+                "name": custom.get("title") or os.path.basename(name),
+                "content_type": custom.get("content_type") or "unknown",
+                "languages": _parse_languages(custom.get("languages"), language_from_path(name)),
+                "duration": _parse_duration(custom.get("duration")),
+                "size": entry["size"],
+                "updated": entry["updated"],
+                "generation": entry["generation"],
+            })
+        self.items.sort(key=lambda item: item["id"])
+        self.ids = [item["id"] for item in self.items]
+        self.all_bits = (1 << len(self.items)) - 1
+
+        self._search_names = [item["name"].lower() for item in self.items]
+
+        self.languages = {}
+        self.content_types = {}
+        durations = []
+        for position, item in enumerate(self.items):
+            bit = 1 << position
+            for language in item["languages"]:
+                self.languages[language] = self.languages.get(language, 0) | bit
+            content_type = item["content_type"]
+            self.content_types[content_type] = self.content_types.get(content_type, 0) | bit
+            if item["duration"] is not None:
+                durations.append((item["duration"], position))
+
+        durations.sort()
+        self._duration_values = [duration for duration, _ in durations]
+        self._duration_positions = [position for _, position in durations]
+        self._duration_blocks = []
+        for start in range(0, len(durations), DURATION_BLOCK_SIZE):
+            block = 0
+            for position in self._duration_positions[start:start + DURATION_BLOCK_SIZE]:
+                block |= 1 << position
+            self._duration_blocks.append(block)
+
+    def __len__(self):
+        return len(self.items)
+
+    def search_bits(self, search):
+        """Return the bitmap of items whose name contains a string, ignoring case."""
+        needle = search.lower()
+        positions = [position for position, name in enumerate(self._search_names) if needle in name]
+        return bits_from_positions(positions, len(self.items))
+
+    def duration_bits(self, min_duration=None, max_duration=None):
+        """Return the bitmap of items whose duration lies in a closed range."""
+        lo = 0 if min_duration is None else bisect.bisect_left(self._duration_values, min_duration)
+        hi = len(self._duration_values) if max_duration is None else bisect.bisect_right(self._duration_values, max_duration)
+        bits = 0
+        index = lo
+        while index < hi:
+            block, offset = divmod(index, DURATION_BLOCK_SIZE)
+            if offset == 0 and index + DURATION_BLOCK_SIZE <= hi:
+                bits |= self._duration_blocks[block]
+                index += DURATION_BLOCK_SIZE
+            else:
+                bits |= 1 << self._duration_positions[index]
+                index += 1
+        return bits
+
+    def query(self, language=None, content_type=None, min_duration=None, max_duration=None,
+              search=None, cursor=None, limit=50):
+        """
+        Filter, paginate and facet the library.
+
+        Facet counts for a field are computed with every other filter
+        applied, so the UI can show how many items each option would give.
+
+        Args:
+            language: Language code to filter on
+            content_type: Content type (song, story, ...) to filter on
+            min_duration: Minimum duration in seconds
+            max_duration: Maximum duration in seconds
+            search: Case-insensitive substring of the item name
+            cursor: Opaque cursor from a previous page
+            limit: Maximum number of items to return
+
+        Returns:
+            dict: items, next_cursor, total and facets
+        """
+        language_bits = self.languages.get(language, 0) if language else self.all_bits
+        content_bits = self.content_types.get(content_type, 0) if content_type else self.all_bits
+        duration_bits = self.all_bits
+        if min_duration is not None or max_duration is not None:
+            duration_bits = self.duration_bits(min_duration, max_duration)
+
+        base = duration_bits
+        if search:
+            base &= self.search_bits(search)
+
+        matches = base & language_bits & content_bits
+        facets = {
+            "language": _facet_counts(self.languages, base & content_bits),
+            "content_type": _facet_counts(self.content_types, base & language_bits),
+        }
+
+        start = 0
+        if cursor:
+            start = bisect.bisect_right(self.ids, decode_cursor(cursor))
+        page = []
+        next_cursor = None
+        for position in iter_bits(matches >> start << start):
+            if len(page) == limit:
+                next_cursor = encode_cursor(page[-1]["id"])
+                break
+            page.append(self.items[position])
+
+        return {
+            "items": page,
+            "next_cursor": next_cursor,
+            "total": popcount(matches),
+            "facets": facets,
+        }
+
+
+class Library:
+    """
+    Keeps a LibraryIndex in sync with a catalog, rebuilding it lazily when
+    the catalog version changes.
+
+    Every catalog change bumps the version, including single upserts after
+    a catalog miss, and a rebuild takes a while on large catalogs. So the
+    index is rebuilt at most once per ``min_rebuild_s``, by one thread
+    while the others keep querying the previous index.
+    """
+
+    def __init__(self, catalog, prefix, formats, language_from_path, min_rebuild_s=0):
+        self.catalog = catalog
+        self.prefix = prefix
+        self.formats = set(formats)
+        self.language_from_path = language_from_path
+        self.min_rebuild_s = min_rebuild_s
+        self._index = None
+        self._version = None
+        self._built_at = 0.0
+        self._building = False
+        self._lock = threading.Lock()
+
+    def _build(self):
+        version = self.catalog.version
+        index = LibraryIndex(self.catalog.entries(), self.prefix, self.formats, self.language_from_path)
+        logger.info(f"Library index rebuilt with {len(index)} items")
+        return version, index
+
+    def _install(self, version, index):
+        self._index = index
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def index(self):
+        with self._lock:
+            current = self._index
+            if current is None:
+                # Nothing to serve yet, so concurrent first queries wait for one build
+                self._install(*self._build())
+                return self._index
+            if (self._building
+                    or self._version == self.catalog.version
+                    or time.monotonic() - self._built_at < self.min_rebuild_s):
+                return current
+            self._building = True
+        try:
+            version, index = self._build()
+            with self._lock:
+                self._install(version, index)
+            return index
+        finally:
+            self._building = False
+
+    def query(self, **filters):
+        return self.index().query(**filters)
@@ -2,20 +2,35 @@
 Main application entry point for the Hippo Family Club language learning app.
 """
 import os
+import json
 import logging
-from typing import Optional
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-import uvicorn
+from functools import lru_cache
+from typing import List, Optional
 from pathlib import Path
 import sys
 
+# Time the imports below when STARTUP_PROFILE is set
+from app.startup import profile, ENABLED as STARTUP_PROFILE
+if STARTUP_PROFILE:
+    profile.begin()
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+from fastapi.staticfiles import StaticFiles
+
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from config import APP_CONFIG, GCS_CONFIG, AUDIO_CONFIG, LANGUAGE_CONFIG
-from app.utils import setup_gcp_services, get_audio_file, process_audio_playback
+from config import APP_CONFIG, GCS_CONFIG, AUDIO_CONFIG, LANGUAGE_CONFIG, HTTP_CACHE_CONFIG, PROFILE_CONFIG
+from app.utils import (
+    start_storage_init, ensure_storage, storage_ready, lookup_audio_file, lookup_audio_files, get_library,
+    get_sentence_table, process_audio_playback, process_playlist_playback, audio_cache_headers, get_service_stats
+)
+from app.http_utils import (
+    http_date, make_etag, cache_control, is_not_modified, not_modified_response
+)
+from app.audio import output_format
+from app.executor import run_io, shutdown_pools, Overloaded, ClientDisconnected
+from app.metrics import registry, ServedBytesMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -32,89 +47,412 @@ app = FastAPI(
 templates_dir = Path(__file__).parent / "templates"
 static_dir = Path(__file__).parent / "static"
 
-templates = Jinja2Templates(directory=str(templates_dir))
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
+def served_route_kind(path):
+    """Group request paths for the served bytes counter."""
+    if path.startswith("/api/playlist/play") or (path.startswith("/api/audio/") and path.endswith("/play")):
+        return "audio"
+    if path.startswith("/static/"):
+        return "static"
+    return "api"
+
+app.add_middleware(ServedBytesMiddleware, route_kind=served_route_kind)
+
+if PROFILE_CONFIG["token"] or PROFILE_CONFIG["sample_rate"] > 0:
+    from app.profiler import ProfileMiddleware
+    app.add_middleware(
+        ProfileMiddleware,
+        directory=PROFILE_CONFIG["directory"],
+        token=PROFILE_CONFIG["token"],
+        sample_rate=PROFILE_CONFIG["sample_rate"],
+        interval_s=PROFILE_CONFIG["interval_ms"] / 1000,
+        max_duration_s=PROFILE_CONFIG["max_duration_s"],
+        max_concurrent=PROFILE_CONFIG["max_concurrent"]
+    )
+
 # Create cache directory if it doesn't exist
-cache_dir = "/tmp/hippoapp-cache"
+cache_dir = AUDIO_CONFIG["cache_directory"]
 os.makedirs(cache_dir, exist_ok=True)
 
+@lru_cache(maxsize=1)
+def get_templates():
+    """Load the page templates on first use; Jinja is not needed to serve audio."""
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory=str(templates_dir))
+
+if STARTUP_PROFILE:
+    profile.mark("app_imported")
+
+    @app.middleware("http")
+    async def profile_first_request(request: Request, call_next):
+        profile.request_started()
+        response = await call_next(request)
+        profile.request_finished()
+        return response
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize services on startup."""
-    try:
-        # Set up GCP services
-        setup_gcp_services()
-        logger.info("Application started successfully")
-    except Exception as e:
-        logger.error(f"Error during startup: {str(e)}")
+    """
+    Start initializing services without blocking startup.
+    
+    Storage clients and the bucket catalog are set up on a background
+    thread, so the instance accepts requests right away; requests that
+    need storage wait for it (see ensure_storage) and /api/ready reports
+    when it is done.
+    """
+    start_storage_init()
+    if STARTUP_PROFILE:
+        profile.mark("startup_event")
+    logger.info("Application started, initializing storage in the background")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the worker pools."""
+    shutdown_pools()
+
+def overloaded_response(e):
+    """Build the 503 response returned when a worker pool is saturated."""
+    logger.warning(str(e))
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"}
+    )
 
 @app.get("/")
 async def home(request: Request):
     """Render the home page."""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse("index.html", {"request": request})
+
+# Registered before the metadata route: file IDs may contain slashes, so
+# "/api/audio/{file_id:path}" would otherwise also match ".../play".
+@app.get("/api/audio/{file_id:path}/play")
+async def play_audio(
+    file_id: str, 
+    request: Request,
+    start_time: float = 0, 
+    end_time: Optional[float] = None, 
+    speed: float = 1.0,
+    repeat: bool = False,
+    generation: Optional[int] = None,
+    repeat_count: Optional[int] = None,
+    gap: Optional[float] = None,
+    audio_format: Optional[str] = Query(None, alias="format"),
+    quality: Optional[str] = None
+):
+    """
+    Stream audio file for playback.
+    
+    Clips are encoded in the requested format, or else in the best format
+    the Accept header allows (Opus, AAC or MP3).
+    
+    Args:
+        file_id: ID of the audio file
+        start_time: Start time in seconds
+        end_time: End time in seconds
+        speed: Playback speed
+        repeat: Whether to repeat the audio
+        generation: Blob generation to pin the URL to (makes it cacheable as immutable)
+        repeat_count: Number of plays when repeating (defaults to config)
+        gap: Seconds of silence between repetitions
+        audio_format: Output format ("mp3", "aac", "opus" or "webm")
+        quality: Quality preset ("standard", "speech" or "low")
+        
+    Returns:
+        Streaming response with audio data, honoring Range and conditional requests
+    """
+    try:
+        output_format(audio_format, quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid output format: {str(e)}")
+    
+    try:
+        return await process_audio_playback(
+            file_id, start_time, end_time, speed, repeat, request, generation, repeat_count, gap,
+            audio_format, quality
+        )
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except Exception as e:
+        logger.error(f"Error playing audio file {file_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error playing audio: {str(e)}")
+
+@app.get("/api/audio/{file_id:path}/sentences")
+async def get_sentences(
+    file_id: str,
+    request: Request,
+    lang: Optional[str] = None,
+    t: Optional[float] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None
+):
+    """
+    Get the time-indexed sentences of an audio file.
+    
+    Args:
+        file_id: ID of the audio file
+        lang: Transcript language (defaults to the language of the file)
+        t: Also return the index of the sentence playing at this time
+            (null between sentences) and of the next one to start
+        start: Only return sentences overlapping [start, end), in seconds
+        end: End of that range; open-ended if omitted
+        
+    Returns:
+        JSON response with the sentences in time order
+    """
+    try:
+        audio_info = await lookup_audio_file(file_id, request=request)
+        language = lang or audio_info.get("language") or LANGUAGE_CONFIG["default"]
+        found = None
+        if "generation" in audio_info:
+            found = await run_io(get_sentence_table, audio_info, language, request=request)
+        if found is None:
+            raise HTTPException(status_code=404, detail=f"No sentences for {file_id} in {language}")
+        table, entry = found
+        
+        etag = make_etag("sentences", entry["name"], entry["generation"], t, start, end)
+        last_modified = http_date(entry.get("updated"))
+        headers = {"Cache-Control": cache_control(HTTP_CACHE_CONFIG["metadata_max_age"])}
+        if is_not_modified(request.headers, etag, last_modified):
+            return not_modified_response(etag, last_modified, headers)
+        
+        content = {"id": file_id, "language": table.language, "count": len(table)}
+        if t is not None:
+            content["index"] = table.index_at(int(round(t * 1000)))
+            content["next"] = table.next_index(int(round(t * 1000)))
+        if start is None and end is None:
+            indexes = range(len(table))
+        else:
+            indexes = table.window(
+                int(round((start or 0) * 1000)), None if end is None else int(round(end * 1000))
+            )
+        content["sentences"] = [table.sentence(i) for i in indexes]
+        
+        headers["ETag"] = etag
+        if last_modified:
+            headers["Last-Modified"] = last_modified
+        return JSONResponse(content=content, headers=headers)
+    except HTTPException:
+        raise
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except Exception as e:
+        logger.error(f"Error getting sentences of {file_id}: {str(e)}")
+        raise HTTPException(status_code=404, detail=f"Audio file not found: {str(e)}")
 
-@app.get("/api/audio/{file_id}")
-async def get_audio(file_id: str):
+@app.get("/api/audio/{file_id:path}")
+async def get_audio(file_id: str, request: Request, generation: Optional[int] = None):
     """
     Get audio file metadata.
     
     Args:
         file_id: ID of the audio file
+        generation: Blob generation to pin the URL to
         
     Returns:
         JSON response with audio metadata
     """
     try:
-        audio_info = get_audio_file(file_id)
-        return JSONResponse(content=audio_info)
+        audio_info = await lookup_audio_file(file_id, request=request)
+        if "generation" not in audio_info:
+            # Mock metadata in debug mode has no validators
+            return JSONResponse(content=audio_info)
+        
+        etag = make_etag("metadata", file_id, audio_info["name"], audio_info["generation"])
+        last_modified = http_date(audio_info.get("updated"))
+        headers = audio_cache_headers(audio_info, generation)
+        if generation is None:
+            headers["Cache-Control"] = cache_control(HTTP_CACHE_CONFIG["metadata_max_age"])
+        if is_not_modified(request.headers, etag, last_modified):
+            return not_modified_response(etag, last_modified, headers)
+        
+        headers["ETag"] = etag
+        if last_modified:
+            headers["Last-Modified"] = last_modified
+        return JSONResponse(content=audio_info, headers=headers)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as e:
         logger.error(f"Error getting audio file {file_id}: {str(e)}")
         raise HTTPException(status_code=404, detail=f"Audio file not found: {str(e)}")
 
-@app.get("/api/audio/{file_id}/play")
-async def play_audio(
-    file_id: str, 
-    start_time: float = 0, 
-    end_time: Optional[float] = None, 
+@app.get("/api/playlist/play")
+async def play_playlist(
+    request: Request,
+    item: List[str] = Query(...),
     speed: float = 1.0,
-    repeat: bool = False
+    gap: Optional[float] = None
 ):
     """
-    Stream audio file for playback.
+    Stream several clips back to back as one audio stream.
     
     Args:
-        file_id: ID of the audio file
-        start_time: Start time in seconds
-        end_time: End time in seconds
-        speed: Playback speed
-        repeat: Whether to repeat the audio
+        item: Clips in play order, each "<file_id>@<start>-<end>" in seconds;
+            items may come from different files and languages
+        speed: Playback speed of every clip
+        gap: Seconds of silence between clips
         
     Returns:
-        Streaming response with audio data
+        Streaming response with audio data, honoring Range and conditional requests
     """
     try:
-        return process_audio_playback(file_id, int(start_time), int(end_time) if end_time is not None else None, speed, repeat)
+        return await process_playlist_playback(item, speed, gap, request)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid playlist: {str(e)}")
     except Exception as e:
-        logger.error(f"Error playing audio file {file_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error playing audio: {str(e)}")
+        logger.error(f"Error playing playlist: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error playing playlist: {str(e)}")
+
+@app.get("/api/playlist/metadata")
+async def get_playlist_metadata(request: Request, id: List[str] = Query(...)):
+    """
+    Get the metadata of several audio files in one request.
+    
+    Args:
+        id: IDs of the audio files
+        
+    Returns:
+        JSON response with one entry per ID, in request order; files that
+        were not found have an "error" instead of metadata
+    """
+    if len(id) > AUDIO_CONFIG["playlist"]["max_items"]:
+        raise HTTPException(status_code=400, detail=f"At most {AUDIO_CONFIG['playlist']['max_items']} IDs per request")
+    
+    try:
+        found = await lookup_audio_files(id, request=request)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    
+    items = []
+    for file_id in id:
+        metadata = found[file_id]
+        if isinstance(metadata, Exception):
+            items.append({"id": file_id, "error": f"Audio file not found: {str(metadata)}"})
+        else:
+            items.append(metadata)
+    
+    etag = make_etag("playlist-metadata", *(
+        f"{item['id']}:{item.get('name')}:{item.get('generation')}" for item in items
+    ))
+    headers = {"Cache-Control": cache_control(HTTP_CACHE_CONFIG["metadata_max_age"])}
+    if is_not_modified(request.headers, etag):
+        return not_modified_response(etag, None, headers)
+    headers["ETag"] = etag
+    return JSONResponse(content={"items": items}, headers=headers)
+
+@app.get("/api/library")
+async def get_library_page(
+    request: Request,
+    language: Optional[str] = None,
+    content_type: Optional[str] = None,
+    min_duration: Optional[float] = None,
+    max_duration: Optional[float] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50
+):
+    """
+    List the audio library with filtering, cursor pagination and facet counts.
+    
+    Args:
+        language: Language code to filter on
+        content_type: Content type (song, story, conversation) to filter on
+        min_duration: Minimum duration in seconds
+        max_duration: Maximum duration in seconds
+        q: Case-insensitive search in item names
+        cursor: Cursor returned as next_cursor by the previous page
+        limit: Page size (1 to 200)
+        
+    Returns:
+        JSON response with items, next_cursor, total and facets
+    """
+    limit = max(1, min(limit, 200))
+    
+    def query():
+        ensure_storage()
+        return get_library().query(
+            language=language,
+            content_type=content_type,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            search=q,
+            cursor=cursor,
+            limit=limit
+        )
+    
+    try:
+        result = await run_io(query, request=request)
+        return JSONResponse(content=result)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid library query: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error querying library: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error querying library: {str(e)}")
+
+# Languages only change with a deployment
+LANGUAGES_ETAG = make_etag(json.dumps(LANGUAGE_CONFIG["supported"], sort_keys=True))
 
 @app.get("/api/languages")
-async def get_languages():
+async def get_languages(request: Request):
     """
     Get supported languages.
     
     Returns:
         JSON response with supported languages
     """
-    return JSONResponse(content=LANGUAGE_CONFIG["supported"])
+    headers = {
+        "ETag": LANGUAGES_ETAG,
+        "Cache-Control": cache_control(HTTP_CACHE_CONFIG["languages_max_age"])
+    }
+    if is_not_modified(request.headers, LANGUAGES_ETAG):
+        return not_modified_response(headers=headers)
+    return JSONResponse(content=LANGUAGE_CONFIG["supported"], headers=headers)
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness check: 503 until storage initialization has finished."""
+    if not storage_ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting"}, headers={"Retry-After": "1"})
+    return {"status": "ready"}
+
+@app.get("/api/stats")
+async def service_stats():
+    """Cache, worker pool and storage connection pool usage of this instance."""
+    stats = await run_io(get_service_stats)
+    if STARTUP_PROFILE:
+        stats["startup"] = profile.report()
+    return JSONResponse(content=stats, headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics")
+async def metrics():
+    """Playback latency histograms and service counters in the Prometheus text format."""
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE, headers={"Cache-Control": "no-store"})
+
 if __name__ == "__main__":
+    import uvicorn
+    
     port = int(os.environ.get("PORT", 8080))
     host = os.environ.get("HOST", "0.0.0.0")
     
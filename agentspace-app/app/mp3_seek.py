@@ -0,0 +1,104 @@
+"""
+Stream-copy clip extraction from MP3 files with an ingest-time seek table.
+
+See data-ingestion/scripts/seektable.py for the ``<blob>.seek`` format: the
+byte offset of every audio frame of the original MP3. A time range maps to
+a run of whole frames, which is read from the original blob with a single
+ranged read and returned unchanged. Nothing is decoded or re-encoded.
+"""
+import struct
+import logging
+from app.startup import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HSEK"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHIHHIIQ")
+
+# Sample rates by MPEG audio version (MPEG-1, MPEG-2, MPEG-2.5) and index
+MPEG_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+# Frames kept before the requested start: Layer III frames may borrow bits
+# from earlier frames (the bit reservoir), so the first frame of a cut can
+# decode as a short glitch; one MPEG-1 frame is about 26 ms at 44.1 kHz
+PREROLL_FRAMES = 1
+
+
+def seek_table_blob_name(blob_name):
+    return f"{blob_name}.seek"
+
+
+class SeekTable:
+    """
+    Parsed MP3 seek table.
+    """
+
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise ValueError("Truncated seek table")
+        (magic, version, self.channels, self.sample_rate, self.samples_per_frame,
+         _, self.priming_samples, self.frame_count, self.source_generation) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Unsupported seek table format")
+        self.offsets = np.frombuffer(data, dtype="<u4", count=self.frame_count + 1, offset=HEADER.size)
+
+    @property
+    def duration_ms(self):
+        return self.frame_count * self.samples_per_frame * 1000 / self.sample_rate
+
+    def frame_window(self, start_ms, end_ms=None):
+        """
+        Map a time window to the range of frames that covers it.
+
+        Args:
+            start_ms: Start of the window in milliseconds
+            end_ms: End of the window in milliseconds, or None for the end
+
+        Returns:
+            tuple: (first_frame, end_frame) with end_frame exclusive
+        """
+        first = (start_ms * self.sample_rate // 1000 + self.priming_samples) // self.samples_per_frame
+        first = max(0, min(first - PREROLL_FRAMES, self.frame_count))
+        if end_ms is None:
+            end = self.frame_count
+        else:
+            # Round up so the last partial frame is included
+            end = -(-(end_ms * self.sample_rate // 1000 + self.priming_samples) // self.samples_per_frame)
+            end = max(first, min(end, self.frame_count))
+        return first, end
+
+    def byte_range(self, start_ms, end_ms=None):
+        """
+        Map a time window to the bytes of the frames covering it.
+
+        Returns:
+            tuple: (start, end) byte offsets with end exclusive
+        """
+        first, end = self.frame_window(start_ms, end_ms)
+        return int(self.offsets[first]), int(self.offsets[end])
+
+
+def extract_window(table, read_range, start_ms, end_ms=None):
+    """
+    Copy the frames covering a time window out of the original MP3.
+
+    Args:
+        table: SeekTable of the file
+        read_range: Callable (start, end) -> bytes reading the original blob
+        start_ms: Start of the window in milliseconds
+        end_ms: End of the window in milliseconds, or None for the end
+
+    Returns:
+        bytes: Frame-aligned MP3 data
+    """
+    start, end = table.byte_range(start_ms, end_ms)
+    if start >= end:
+        return b""
+    return read_range(start, end)
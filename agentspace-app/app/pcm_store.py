@@ -0,0 +1,292 @@
+"""
+Memory-mapped store of decoded PCM for frequently played audio.
+
+Titles that are played often (typically sentence by sentence) are decoded
+once in full to raw 16-bit PCM files with a small header. Playback of any
+window of such a title maps the file with ``numpy.memmap`` and slices it:
+no decoder runs, and the pages are shared through the OS page cache by
+every worker process on the instance.
+
+File layout (little endian)::
+
+    magic "HPCM" | version u16 | sample width u16 | channels u16 | reserved u16
+    | sample rate u32 | frames u64 | 8 reserved bytes | interleaved samples
+"""
+import os
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from app.startup import lazy_import
+
+from app.audio import decoder_command, read_wav_header
+from app.cache import _GdsfTier, remove_stale_parts
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HPCM"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHHHIQ8x")
+
+# Bytes copied per read while a file is being decoded into the store
+COPY_CHUNK = 1024 * 1024
+
+
+class PcmFile:
+    """
+    A decoded PCM file mapped read-only into memory.
+
+    The file is opened once and the mapping stays valid if the store evicts
+    the file afterwards. Opening a file that is already gone raises
+    FileNotFoundError.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError(f"Truncated PCM header in {self.path}")
+            magic, version, sample_width, channels, _, sample_rate, frames = HEADER.unpack(header)
+            if magic != MAGIC or version != FORMAT_VERSION or sample_width != 2:
+                raise ValueError(f"Unsupported PCM file {self.path}")
+
+            self.sample_rate = sample_rate
+            self.channels = channels
+            self.frames = frames
+            if frames:
+                self.samples = np.memmap(f, dtype=np.int16, mode="r", offset=HEADER.size, shape=(frames, channels))
+            else:
+                self.samples = np.zeros((0, channels), dtype=np.int16)
+
+    @property
+    def duration_ms(self):
+        return self.frames * 1000 / self.sample_rate
+
+    def slice(self, start_ms=0, end_ms=None):
+        """
+        Return a time window as a view of the mapped samples (no copy).
+
+        Args:
+            start_ms: Start of the window in milliseconds
+            end_ms: End of the window in milliseconds, or None for the end
+
+        Returns:
+            numpy.ndarray: int16 array of shape (frames, channels)
+        """
+        first = min(int(start_ms * self.sample_rate // 1000), self.frames)
+        last = self.frames if end_ms is None else min(int(end_ms * self.sample_rate // 1000), self.frames)
+        return self.samples[first:max(first, last)]
+
+
+def write_pcm_file(source_path, path):
+    """
+    Decode a whole audio file into a PCM store file.
+
+    Args:
+        source_path: Path to the local audio file
+        path: Path of the PCM file to write
+
+    Returns:
+        int: Size of the written file in bytes
+    """
+    command, _ = decoder_command(source_path, 0, None, preroll_ms=0)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        sample_rate, channels, sample_width = read_wav_header(process.stdout)
+        data_bytes = 0
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sample_width, channels, 0, sample_rate, 0))
+            while True:
+                chunk = process.stdout.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                f.write(chunk)
+                data_bytes += len(chunk)
+            frames = data_bytes // (channels * sample_width)
+            f.truncate(HEADER.size + frames * channels * sample_width)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sample_width, channels, 0, sample_rate, frames))
+        if process.wait() != 0:
+            raise RuntimeError(
+                f"Decoding {source_path} failed with code {process.returncode}: "
+                f"{process.stderr.read().decode(errors='ignore')}"
+            )
+        return os.path.getsize(path)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+class PcmStore:
+    """
+    Disk-budgeted store of decoded PCM files.
+
+    Plays are counted per blob generation; a title is decoded into the
+    store in the background once it has been played ``promote_after``
+    times. Files are named ``<sha256(blob name)>.<generation>.pcm`` so
+    workers sharing the directory find each other's files, and eviction
+    uses Greedy-Dual-Size-Frequency with the play count as frequency.
+
+    Each worker evicts by its own index, so a file may disappear at any
+    time: lookups check that it is still there, and renders that find it
+    gone look the title up again (see PcmFile). A ``max_bytes`` of 0
+    disables the store.
+    """
+
+    def __init__(self, directory, max_bytes, promote_after=3):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.promote_after = promote_after
+        self.hits = 0
+        self.misses = 0
+        self.promotions = 0
+        self._lock = threading.Lock()
+        self._tier = _GdsfTier(max_bytes)
+        self._plays = {}
+        self._promoting = set()
+        self._files = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hippo-pcm")
+
+        if max_bytes:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    def _file_name(self, blob_name, generation):
+        return f"{hashlib.sha256(blob_name.encode('utf-8')).hexdigest()}.{generation}.pcm"
+
+    def _load_index(self):
+        remove_stale_parts(self.directory)
+        for path in self.directory.glob("*.pcm"):
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            self._adopt(path.name, size)
+
+    def _adopt(self, name, size, frequency=1):
+        """Register a file on disk; the caller holds the lock or is initialising."""
+        for evicted in self._tier.add(name, size, frequency):
+            self._files.pop(evicted, None)
+            (self.directory / evicted).unlink(missing_ok=True)
+
+    def record_play(self, blob_name, generation):
+        """
+        Count a play of a blob.
+
+        Returns:
+            bool: True if the blob is due for promotion into the store
+        """
+        if not self.max_bytes:
+            return False
+        name = self._file_name(blob_name, generation)
+        with self._lock:
+            plays = self._plays.get(name, 0) + 1
+            self._plays[name] = plays
+            if name in self._tier:
+                self._tier.touch(name)
+                return False
+            return plays >= self.promote_after and name not in self._promoting
+
+    def get(self, blob_name, generation):
+        """
+        Look up the mapped PCM of a blob generation.
+
+        Files written by other workers sharing the directory are picked up
+        on first use, and files they evicted are dropped.
+
+        Returns:
+            PcmFile: Mapped file, or None on a miss
+        """
+        if not self.max_bytes:
+            return None
+        name = self._file_name(blob_name, generation)
+        path = self.directory / name
+        with self._lock:
+            if not path.exists():
+                self._tier.remove(name)
+                self._files.pop(name, None)
+                self.misses += 1
+                return None
+            pcm = self._files.get(name)
+            if pcm is not None and name in self._tier:
+                self.hits += 1
+                return pcm
+
+        try:
+            pcm = PcmFile(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable PCM file {name}: {str(e)}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if name not in self._tier:
+                self._adopt(name, os.path.getsize(path), self._plays.get(name, 1))
+            self._files[name] = pcm
+            self.hits += 1
+        return pcm
+
+    def promote(self, blob_name, generation, source_path):
+        """
+        Decode a blob into the store in the background.
+
+        Args:
+            blob_name: Name of the blob in the bucket
+            generation: Generation of the blob
+            source_path: Local copy of the blob (e.g. from the source cache)
+        """
+        name = self._file_name(blob_name, generation)
+        with self._lock:
+            if name in self._promoting or name in self._tier:
+                return
+            self._promoting.add(name)
+        self._executor.submit(self._promote, blob_name, name, source_path)
+
+    def _promote(self, blob_name, name, source_path):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        try:
+            size = write_pcm_file(source_path, temp_path)
+            if size > self.max_bytes:
+                logger.info(f"Not storing PCM of {blob_name}: {size} bytes exceeds the store budget")
+                os.unlink(temp_path)
+                return
+            os.replace(temp_path, self.directory / name)
+            with self._lock:
+                # Drop other generations of the same blob
+                for stale in self.directory.glob(name.split(".", 1)[0] + ".*.pcm"):
+                    if stale.name != name:
+                        self._files.pop(stale.name, None)
+                        self._tier.remove(stale.name)
+                        stale.unlink(missing_ok=True)
+                self._adopt(name, size, self._plays.get(name, 1))
+                self.promotions += 1
+            logger.info(f"Stored decoded PCM of {blob_name} ({size} bytes)")
+        except Exception as e:
+            logger.error(f"Error storing decoded PCM of {blob_name}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        finally:
+            with self._lock:
+                self._promoting.discard(name)
+
+    def stats(self):
+        """Return store occupancy and counters."""
+        with self._lock:
+            return {
+                "files": len(self._tier),
+                "bytes": self._tier.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "promotions": self.promotions,
+            }
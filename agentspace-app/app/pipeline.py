@@ -0,0 +1,423 @@
+"""
+Streaming render pipeline for playback clips.
+
+A clip is rendered by three stages connected with pipes:
+
+    ffmpeg decoder (WAV) -> pre-roll trim + time stretch -> ffmpeg encoder (MP3, AAC or Opus)
+
+The middle stage runs in a feeder thread and works on fixed-size blocks,
+and encoded output is handed out as soon as the encoder produces it. Memory
+use is bounded by the block size and the OS pipe buffers rather than by the
+clip length, and the first bytes are available after a few frames instead
+of after the whole clip has been rendered. Closing the stream kills both
+ffmpeg processes, which unblocks every stage.
+
+For titles in the PCM store (see pcm_store.py) the decoder is replaced by
+a slice of the memory-mapped samples.
+
+Streams run inside CPU pool workers (see executor.stream_cpu), so the API
+process only forwards encoded bytes.
+"""
+import logging
+import threading
+import subprocess
+from pathlib import Path
+import sys
+from pydub import AudioSegment
+from pydub.exceptions import CouldntDecodeError
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import AUDIO_CONFIG
+
+from app.audio import decoder_command, read_wav_header, pcm_to_float, float_to_pcm, output_format, encoder_args
+from app.timestretch import WsolaStretcher
+from app.pcm_store import PcmFile
+
+logger = logging.getLogger(__name__)
+
+# Sample frames processed per block by the feeder thread
+BLOCK_FRAMES = 8192
+
+
+def start_decoder(source, start_ms, end_ms, **kwargs):
+    """
+    Start ffmpeg decoding a window of an open local file (see decoder_command).
+
+    ffmpeg reads the file through the inherited descriptor rather than by
+    path. Renders open their inputs up front, so a cache eviction after
+    that cannot pull a file away mid-render; a file that is already gone
+    raises FileNotFoundError, which callers treat as a stale cache lookup.
+
+    Returns:
+        tuple: (decoder process, seek_ms)
+    """
+    command, seek_ms = decoder_command(f"/dev/fd/{source.fileno()}", start_ms, end_ms, **kwargs)
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(source.fileno(),)
+    )
+    return process, seek_ms
+
+
+class ClipStream:
+    """
+    Incrementally rendered clip, encoded as ``output`` (an OutputFormat,
+    MP3 at the default quality if not given).
+
+    Construction starts the pipeline and blocks only until the decoder has
+    written its header. ``read`` returns the next encoded chunk (b"" at the
+    end) and ``close`` may be called from any thread to abort the render.
+    When ``pcm_path`` names a PCM store file, samples are sliced from it
+    and ``source_path`` is not decoded.
+    """
+
+    output = None
+
+    def __init__(self, source_path, params, chunk_size=None, pcm_path=None, output=None):
+        self.chunk_size = chunk_size or AUDIO_CONFIG["stream_chunk_bytes"]
+        self.output = output
+        self.closed = False
+        self._error = None
+        self._decoder = None
+        self._encoder = None
+        self._pcm = None
+        self._skip_bytes = 0
+
+        try:
+            if pcm_path is not None:
+                pcm = PcmFile(pcm_path)
+                self._pcm = pcm.slice(params["start_ms"], params["end_ms"])
+                self.sample_rate, self.channels = pcm.sample_rate, pcm.channels
+            else:
+                with open(source_path, "rb") as source:
+                    self._decoder, seek_ms = start_decoder(source, params["start_ms"], params["end_ms"])
+                self.sample_rate, self.channels, sample_width = read_wav_header(self._decoder.stdout)
+                if sample_width != 2:
+                    raise CouldntDecodeError(f"Unexpected decoder sample width: {sample_width}")
+
+                # Decoding started early to prime the decoder; drop the pre-roll
+                self._skip_bytes = int((params["start_ms"] - seek_ms) * self.sample_rate / 1000) * self.channels * 2
+
+            self._stretcher = None
+            if params["speed"] != 1.0:
+                self._stretcher = WsolaStretcher(
+                    self.sample_rate,
+                    self.channels,
+                    params["speed"],
+                    frame_ms=AUDIO_CONFIG["time_stretch"]["frame_ms"],
+                    search_ms=AUDIO_CONFIG["time_stretch"]["search_ms"]
+                )
+
+            self._start_encoder()
+        except Exception:
+            self.close()
+            raise
+
+        self._feeder = threading.Thread(target=self._feed, name="clip-feeder", daemon=True)
+        self._feeder.start()
+
+    def _start_encoder(self):
+        self._encoder = subprocess.Popen(
+            [
+                AudioSegment.converter, "-nostdin", "-v", "error",
+                "-f", "s16le", "-ar", str(self.sample_rate), "-ac", str(self.channels), "-i", "pipe:0",
+            ] + encoder_args(self.output or output_format()),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    def _blocks(self):
+        """Yield PCM blocks of whole frames, with the pre-roll removed."""
+        if self._pcm is not None:
+            for first in range(0, len(self._pcm), BLOCK_FRAMES):
+                if self.closed:
+                    return
+                yield self._pcm[first:first + BLOCK_FRAMES].tobytes()
+            return
+
+        frame_bytes = self.channels * 2
+        skip = self._skip_bytes
+        remainder = b""
+        while True:
+            block = self._decoder.stdout.read(BLOCK_FRAMES * frame_bytes)
+            if not block:
+                return
+            if skip:
+                dropped = min(skip, len(block))
+                block = block[dropped:]
+                skip -= dropped
+            block = remainder + block
+            usable = len(block) - len(block) % frame_bytes
+            remainder = block[usable:]
+            if usable:
+                yield block[:usable]
+
+    def _feed(self):
+        """Move decoded PCM through trimming and stretching into the encoder."""
+        try:
+            for block in self._blocks():
+                self._encode(block)
+            if self._stretcher is not None:
+                self._encoder.stdin.write(float_to_pcm(self._stretcher.flush()))
+
+            if self._decoder is not None and self._decoder.wait() != 0 and not self.closed:
+                raise CouldntDecodeError(
+                    f"Decoding failed with code {self._decoder.returncode}: "
+                    f"{self._decoder.stderr.read().decode(errors='ignore')}"
+                )
+        except Exception as e:
+            if not self.closed:
+                self._error = e
+        finally:
+            try:
+                self._encoder.stdin.close()
+            except OSError:
+                pass
+
+    def _encode(self, pcm):
+        if self._stretcher is not None:
+            pcm = float_to_pcm(self._stretcher.process(pcm_to_float(pcm, self.channels)))
+        if pcm:
+            self._encoder.stdin.write(pcm)
+
+    def read(self):
+        """
+        Return the next chunk of encoded audio.
+
+        Returns:
+            bytes: Up to chunk_size bytes, or b"" once the clip is complete
+
+        Raises:
+            CouldntDecodeError: If decoding failed
+            RuntimeError: If encoding failed
+        """
+        data = self._encoder.stdout.read1(self.chunk_size)
+        if data:
+            return data
+
+        self._feeder.join()
+        returncode = self._encoder.wait()
+        if self.closed:
+            return b""
+        if self._error is not None:
+            raise self._error
+        if returncode != 0:
+            raise RuntimeError(
+                f"Encoding failed with code {returncode}: "
+                f"{self._encoder.stderr.read().decode(errors='ignore')}"
+            )
+        return b""
+
+    def close(self):
+        """Abort the render; safe to call more than once and from any thread."""
+        self.closed = True
+        for process in (self._decoder, self._encoder):
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self.read()
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            self.close()
+
+
+def render_clip(source_path, params, pcm_path=None, output=None):
+    """
+    Render a playback clip from a local source file in one piece.
+
+    This runs the same pipeline as a streamed response, so a clip rendered
+    here is byte-identical to the streamed one and shares its ETag. It is
+    used where the full body is needed up front (range requests).
+
+    Args:
+        source_path: Path to the local audio file
+        params: Normalized playback parameters
+        pcm_path: PCM store file to slice instead of decoding the source
+        output: OutputFormat to encode to (defaults to MP3)
+
+    Returns:
+        bytes: Encoded clip
+    """
+    return b"".join(ClipStream(source_path, params, pcm_path=pcm_path, output=output))
+
+
+def render_playlist(sources, items, speed, gap_ms):
+    """
+    Render a playlist in one piece on the process pool (see PlaylistStream).
+
+    Returns:
+        bytes: MP3-encoded playlist
+    """
+    return b"".join(make_playlist_stream(sources, items, speed, gap_ms))
+
+
+def make_playlist_stream(sources, items, speed, gap_ms):
+    """Start a PlaylistStream with the configured output format and clustering."""
+    playlist = AUDIO_CONFIG["playlist"]
+    return PlaylistStream(
+        sources,
+        items,
+        speed=speed,
+        gap_ms=gap_ms,
+        sample_rate=playlist["sample_rate"],
+        channels=playlist["channels"],
+        merge_gap_ms=playlist["merge_gap_ms"],
+        max_cluster_ms=playlist["max_cluster_s"] * 1000
+    )
+
+
+class PlaylistStream(ClipStream):
+    """
+    Incrementally rendered MP3 of several clips played back to back.
+
+    Each item is ``(source, start_ms, end_ms)`` and ``sources`` maps a
+    source to its ``(source_path, pcm_path)``. All items go through one
+    encoder, resampled to one format and separated by ``gap_ms`` of
+    silence, so the output is a single continuous MP3 stream.
+
+    A source is decoded once per cluster of nearby item ranges rather than
+    once per item: ranges less than ``merge_gap_ms`` apart are decoded in
+    one pass (up to ``max_cluster_ms`` at a time), and a cluster is freed
+    after its last item has been played. PCM store files are sliced
+    instead of decoded and must already be in the output format.
+    """
+
+    def __init__(self, sources, items, speed=1.0, gap_ms=0, sample_rate=44100, channels=2,
+                 merge_gap_ms=5000, max_cluster_ms=120000, chunk_size=None):
+        self.chunk_size = chunk_size or AUDIO_CONFIG["stream_chunk_bytes"]
+        self.closed = False
+        self._error = None
+        self._decoder = None
+        self._encoder = None
+        self._stretcher = None
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.speed = speed
+        self.gap_ms = gap_ms
+        self._items = items
+        self._decoded = {}
+        self._inputs = {}
+        self._plan_clusters(merge_gap_ms, max_cluster_ms)
+
+        try:
+            # Open every input before the first byte is produced, so an
+            # evicted cache file fails the render while it can be retried
+            for source, (source_path, pcm_path) in sources.items():
+                self._inputs[source] = PcmFile(pcm_path) if pcm_path is not None else open(source_path, "rb")
+            self._start_encoder()
+        except Exception:
+            self.close()
+            raise
+
+        self._feeder = threading.Thread(target=self._feed, name="playlist-feeder", daemon=True)
+        self._feeder.start()
+
+    def _plan_clusters(self, merge_gap_ms, max_cluster_ms):
+        """Group the item ranges of each source into clusters decoded in one pass."""
+        by_source = {}
+        for position, (source, start_ms, end_ms) in enumerate(self._items):
+            by_source.setdefault(source, []).append((start_ms, end_ms, position))
+
+        # (source, index) -> [start_ms, end_ms, items not played yet]
+        self._clusters = {}
+        self._cluster_of = [None] * len(self._items)
+        for source, ranges in by_source.items():
+            clusters = []
+            for start_ms, end_ms, position in sorted(ranges):
+                last = clusters[-1] if clusters else None
+                if (last is not None and start_ms <= last[1] + merge_gap_ms
+                        and max(last[1], end_ms) - last[0] <= max_cluster_ms):
+                    last[1] = max(last[1], end_ms)
+                    last[2] += 1
+                else:
+                    clusters.append([start_ms, end_ms, 1])
+                self._cluster_of[position] = (source, len(clusters) - 1)
+            for index, cluster in enumerate(clusters):
+                self._clusters[(source, index)] = cluster
+
+    def _cluster_pcm(self, key):
+        """Return the PCM of a cluster, decoding it on first use."""
+        data = self._decoded.get(key)
+        if data is not None:
+            return data
+
+        source = self._inputs[key[0]]
+        start_ms, end_ms, _ = self._clusters[key]
+        if isinstance(source, PcmFile):
+            data = source.slice(start_ms, end_ms).tobytes()
+        else:
+            self._decoder, seek_ms = start_decoder(
+                source, start_ms, end_ms, sample_rate=self.sample_rate, channels=self.channels
+            )
+            read_wav_header(self._decoder.stdout)
+            data = self._decoder.stdout.read()
+            if self._decoder.wait() != 0 and not self.closed:
+                raise CouldntDecodeError(
+                    f"Decoding {source.name} failed with code {self._decoder.returncode}: "
+                    f"{self._decoder.stderr.read().decode(errors='ignore')}"
+                )
+            # Decoding started early to prime the decoder; drop the pre-roll
+            frame_bytes = self.channels * 2
+            skip = int((start_ms - seek_ms) * self.sample_rate / 1000) * frame_bytes
+            data = data[skip:len(data) - len(data) % frame_bytes]
+        self._decoded[key] = data
+        return data
+
+    def close(self):
+        super().close()
+        for source in self._inputs.values():
+            if not isinstance(source, PcmFile):
+                source.close()
+
+    def _feed(self):
+        """Decode, stretch and space out every item into the shared encoder."""
+        frame_bytes = self.channels * 2
+        try:
+            for position, (source, start_ms, end_ms) in enumerate(self._items):
+                if self.closed:
+                    return
+                if position and self.gap_ms:
+                    silence = int(self.gap_ms * self.sample_rate / 1000) * frame_bytes
+                    for offset in range(0, silence, BLOCK_FRAMES * frame_bytes):
+                        self._encoder.stdin.write(bytes(min(BLOCK_FRAMES * frame_bytes, silence - offset)))
+
+                key = self._cluster_of[position]
+                cluster = self._clusters[key]
+                data = memoryview(self._cluster_pcm(key))
+                first = min(int((start_ms - cluster[0]) * self.sample_rate // 1000) * frame_bytes, len(data))
+                last = min(int((end_ms - cluster[0]) * self.sample_rate // 1000) * frame_bytes, len(data))
+
+                self._stretcher = None
+                if self.speed != 1.0:
+                    self._stretcher = WsolaStretcher(
+                        self.sample_rate,
+                        self.channels,
+                        self.speed,
+                        frame_ms=AUDIO_CONFIG["time_stretch"]["frame_ms"],
+                        search_ms=AUDIO_CONFIG["time_stretch"]["search_ms"]
+                    )
+                for offset in range(first, last, BLOCK_FRAMES * frame_bytes):
+                    if self.closed:
+                        return
+                    self._encode(data[offset:min(offset + BLOCK_FRAMES * frame_bytes, last)])
+                if self._stretcher is not None:
+                    self._encoder.stdin.write(float_to_pcm(self._stretcher.flush()))
+
+                cluster[2] -= 1
+                if not cluster[2]:
+                    del self._decoded[key]
+        except Exception as e:
+            if not self.closed:
+                self._error = e
+        finally:
+            try:
+                self._encoder.stdin.close()
+            except OSError:
+                pass
@@ -0,0 +1,209 @@
+"""
+Background prefetch of the clips a listener is likely to play next.
+
+The player walks through a title sentence by sentence, so once clip n has
+been served, clips n+1 … n+k at the same speed are the next requests. The
+Prefetcher renders them into the clip cache ahead of time, so moving on to
+the next sentence is a cache hit.
+
+Prefetching only uses spare capacity: jobs wait while the worker pools are
+busy, waiting jobs that go stale are dropped, and each listener session and
+the instance as a whole have a budget of prefetched clips per minute.
+"""
+import asyncio
+import time
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Sessions whose budgets are remembered, least recently seen dropped first
+MAX_SESSIONS = 10000
+
+# Recently prefetched clip keys that are not scheduled again
+RECENT_KEYS = 4096
+
+
+def upcoming_windows(params, count, max_length_ms, sentences=None):
+    """
+    Predict the windows played after a clip.
+
+    With the file's sentence table these are the sentences that start
+    where the clip ends. Without one, the next sentences are assumed to
+    follow the clip directly and to be as long as it is.
+
+    Args:
+        params: Normalized playback parameters of the clip just served
+        count: Number of windows to predict
+        max_length_ms: Longest window treated as a sentence
+        sentences: SentenceTable of the file, if loaded
+
+    Returns:
+        list: Normalized playback parameters of the next windows, played
+            once at the same speed (empty for open-ended or long windows)
+    """
+    if params["end_ms"] is None:
+        return []
+    length = params["end_ms"] - params["start_ms"]
+    if length <= 0 or length > max_length_ms:
+        return []
+    if sentences is not None:
+        first = sentences.next_index(params["end_ms"])
+        bounds = [
+            (sentences.starts[i], sentences.ends[i])
+            for i in range(first, min(first + count, len(sentences)))
+        ]
+    else:
+        bounds = [
+            (params["end_ms"] + i * length, params["end_ms"] + (i + 1) * length)
+            for i in range(count)
+        ]
+    return [
+        {"start_ms": start, "end_ms": end, "speed": params["speed"], "repeat_count": 1, "gap_ms": 0}
+        for start, end in bounds
+    ]
+
+
+class RateBudget:
+    """
+    Allowance of events per sliding minute.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self._times = deque()
+
+    def available(self, now):
+        while self._times and now - self._times[0] >= 60:
+            self._times.popleft()
+        return self.per_minute - len(self._times)
+
+    def take(self, now):
+        self._times.append(now)
+
+
+class Prefetcher:
+    """
+    Queue of clips to render in the background, with budgets and back-off.
+
+    All methods must be called on the event loop.
+    """
+
+    def __init__(self, prefetch, idle, session_budget, instance_budget,
+                 max_concurrent=1, max_queued=32, max_age_s=30, backoff_s=0.5):
+        """
+        Args:
+            prefetch: Coroutine function rendering one clip into the cache;
+                called with the arguments given to ``schedule``
+            idle: Callable returning True while the instance has spare capacity
+            session_budget: Clips per minute prefetched for one session
+            instance_budget: Clips per minute prefetched by this instance
+            max_concurrent: Prefetch jobs running at once
+            max_queued: Waiting jobs; further jobs are dropped
+            max_age_s: Waiting jobs older than this are dropped as stale
+            backoff_s: Seconds to wait before rechecking a busy instance
+        """
+        self._prefetch = prefetch
+        self._idle = idle
+        self.session_budget = session_budget
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_age_s = max_age_s
+        self.backoff_s = backoff_s
+        self._instance = RateBudget(instance_budget)
+        self._sessions = OrderedDict()
+        self._queue = deque()
+        self._pending = set()  # Keys queued or running
+        self._recent = OrderedDict()
+        self._workers = 0
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.over_budget = 0
+        self.dropped = 0
+        self.backoffs = 0
+
+    def _session_budget(self, session):
+        budget = self._sessions.get(session)
+        if budget is None:
+            budget = self._sessions[session] = RateBudget(self.session_budget)
+            if len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session)
+        return budget
+
+    def schedule(self, session, key, *args):
+        """
+        Queue a clip for prefetching, if budgets allow.
+
+        Args:
+            session: Key of the listener session the clip is predicted for
+            key: Clip cache key, used to skip clips already scheduled
+            *args: Arguments for the prefetch function
+
+        Returns:
+            bool: Whether the clip was queued
+        """
+        if key in self._pending or key in self._recent:
+            return False
+        now = time.monotonic()
+        budget = self._session_budget(session)
+        if (budget.available(now) <= 0 or self._instance.available(now) <= 0
+                or len(self._queue) >= self.max_queued):
+            self.over_budget += 1
+            return False
+        budget.take(now)
+        self._instance.take(now)
+        self._pending.add(key)
+        self._queue.append((now, key, args))
+        self.scheduled += 1
+        if self._workers < self.max_concurrent:
+            self._workers += 1
+            asyncio.get_running_loop().create_task(self._work())
+        return True
+
+    async def _work(self):
+        try:
+            while True:
+                self._drop_stale()
+                if not self._queue:
+                    break
+                if not self._idle():
+                    self.backoffs += 1
+                    await asyncio.sleep(self.backoff_s)
+                    continue
+                _, key, args = self._queue.popleft()
+                try:
+                    await self._prefetch(*args)
+                    self.completed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning(f"Prefetch of clip {key} failed: {str(e)}")
+                finally:
+                    self._pending.discard(key)
+                    self._recent[key] = True
+                    if len(self._recent) > RECENT_KEYS:
+                        self._recent.popitem(last=False)
+        finally:
+            self._workers -= 1
+
+    def _drop_stale(self):
+        cutoff = time.monotonic() - self.max_age_s
+        while self._queue and self._queue[0][0] < cutoff:
+            _, key, _ = self._queue.popleft()
+            self._pending.discard(key)
+            self.dropped += 1
+
+    def stats(self):
+        """Return prefetch counters and the queue length."""
+        return {
+            "queued": len(self._queue),
+            "workers": self._workers,
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "over_budget": self.over_budget,
+            "dropped": self.dropped,
+            "backoffs": self.backoffs,
+        }
@@ -0,0 +1,240 @@
+"""
+Opt-in sampling profiler for single requests.
+
+When a request is selected, either because it carries the admin
+``X-Profile`` header with the configured token or by random sampling, a
+background thread records the Python stack of every thread in the process
+every few milliseconds until the response has been sent. The samples are
+written to the profile directory in the folded format read by
+flamegraph.pl, speedscope and inferno, one line per distinct stack::
+
+    GET /api/audio/en/lesson1.mp3/play speed=0.75;MainThread;run (...);... 12
+
+The first frame names the request, so profiles of several requests can
+be concatenated and compared in one flame graph. A ``.json`` file with the
+same name records the file ID, query parameters, status and timing.
+
+Threads are shared between requests (the event loop, the request thread
+pool), so a sample cannot be attributed to one request by its thread.
+Stacks sampled while other requests were in flight get a
+``[concurrent requests]`` frame after the request frame, which separates
+them from the samples that can only belong to this request, and the
+``.json`` records the most requests in flight at once and how many
+sampling rounds overlapped with others.
+
+Work done on the CPU process pool and in ffmpeg runs in other processes
+and is not sampled; in the profile it shows as threads waiting on it.
+Unselected requests pay a counter update and one random draw (none
+without sampling) and, when neither a token nor a sample rate is
+configured, the middleware is not installed at all.
+"""
+import os
+import sys
+import json
+import time
+import hmac
+import random
+import logging
+import threading
+from collections import Counter
+from urllib.parse import parse_qsl
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+# Frame added to stacks sampled while other requests were in flight
+CONCURRENT_FRAME = "[concurrent requests]"
+
+
+def frame_label(frame):
+    """Name a stack frame as "function (path:line)", without folded-format separators."""
+    code = frame.f_code
+    filename = code.co_filename
+    for path in sorted(sys.path, key=len, reverse=True):
+        if len(path) > 1 and filename.startswith(path):
+            filename = filename[len(path):].lstrip(os.sep)
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Thread that samples the stacks of all other threads at a fixed interval.
+    """
+
+    def __init__(self, interval_s, max_duration_s, active_requests=None):
+        """
+        Args:
+            interval_s: Seconds between stack samples
+            max_duration_s: Sampling stops after this long
+            active_requests: Callable returning the number of requests in
+                flight, including the profiled one, or None to not track them
+        """
+        self.interval_s = interval_s
+        self.max_duration_s = max_duration_s
+        self.active_requests = active_requests
+        self.samples = Counter()
+        self.sample_count = 0
+        self.overlapped_count = 0
+        self.max_concurrent = 1
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the sampled stacks with their counts."""
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.max_duration_s
+        labels = {}
+        while not self._stop.wait(self.interval_s) and time.monotonic() < deadline:
+            concurrent = self.active_requests() if self.active_requests else 1
+            self.max_concurrent = max(self.max_concurrent, concurrent)
+            if concurrent > 1:
+                self.overlapped_count += 1
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = frame_label(frame)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                if concurrent > 1:
+                    stack.append(CONCURRENT_FRAME)
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+
+class ProfileMiddleware:
+    """
+    ASGI middleware profiling selected requests.
+    """
+
+    def __init__(self, app, directory, token=None, sample_rate=0.0, interval_s=0.005,
+                 max_duration_s=120, max_concurrent=1):
+        """
+        Args:
+            app: ASGI application
+            directory: Directory the profiles are written to
+            token: Value of the X-Profile header that selects a request, or
+                None to disable header-selected profiles
+            sample_rate: Fraction of requests profiled at random
+            interval_s: Seconds between stack samples
+            max_duration_s: Sampling stops after this long
+            max_concurrent: Profiles taken at once; further selected
+                requests are served without one
+        """
+        self.app = app
+        self.directory = directory
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.interval_s = interval_s
+        self.max_duration_s = max_duration_s
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        # HTTP requests in flight; only changed on the event loop thread
+        self._active = 0
+
+    def _selected(self, scope):
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self._active += 1
+        try:
+            if self._selected(scope) and self._slots.acquire(blocking=False):
+                await self._profile(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            self._active -= 1
+
+    async def _profile(self, scope, receive, send):
+
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{random.getrandbits(32):08x}"
+        status = None
+
+        async def tagged_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", name.encode())]
+            await send(message)
+
+        profiler = SamplingProfiler(self.interval_s, self.max_duration_s, lambda: self._active)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, tagged_send)
+        finally:
+            duration = time.perf_counter() - started
+            # Joining the sampler and writing the files block, so neither
+            # runs on the event loop
+            try:
+                await run_in_threadpool(profiler.stop)
+                await run_in_threadpool(self.write, name, scope, status, duration, profiler)
+            except Exception as e:
+                logger.error(f"Error writing profile {name}: {str(e)}")
+            finally:
+                self._slots.release()
+
+    def write(self, name, scope, status, duration, profiler):
+        """
+        Write a profile and its description to the profile directory.
+
+        Args:
+            name: Profile name, also sent in the X-Profile-Id response header
+            scope: ASGI scope of the request
+            status: Response status, or None if no response was started
+            duration: Seconds the request took
+            profiler: The stopped SamplingProfiler
+        """
+        path = scope["path"]
+        params = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        file_id = None
+        if path.startswith("/api/audio/"):
+            file_id = path[len("/api/audio/"):]
+            for suffix in ("/play", "/sentences"):
+                if file_id.endswith(suffix):
+                    file_id = file_id[:-len(suffix)]
+        tag = " ".join([scope["method"], path] + [f"{key}={value}" for key, value in sorted(params.items())])
+        tag = tag.replace(";", ":")
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{name}.folded"), "w", encoding="utf-8") as f:
+            for stack, count in profiler.samples.most_common():
+                f.write(f"{tag};{stack} {count}\n")
+        with open(os.path.join(self.directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "profile": name,
+                "method": scope["method"],
+                "path": path,
+                "file_id": file_id,
+                "params": params,
+                "status": status,
+                "duration_s": round(duration, 6),
+                "interval_s": self.interval_s,
+                "samples": profiler.sample_count,
+                "concurrent_requests": profiler.max_concurrent,
+                "overlapped_samples": profiler.overlapped_count,
+            }, f, indent=2)
+        logger.info(f"Wrote profile {name} of {tag} ({duration:.3f}s, {profiler.sample_count} samples)")
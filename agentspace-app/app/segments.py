@@ -0,0 +1,144 @@
+"""
+Stitched playback from pre-segmented AAC audio produced at ingest.
+
+See data-ingestion/scripts/segment.py for the format: an ADTS stream
+stored packed as ``<blob>.segments.aac`` plus a manifest
+``<blob>.segments.json`` giving the byte range of every fixed-duration
+segment. A time range is answered by reading the covering segments and
+dropping whole frames at the edges; nothing is decoded or re-encoded.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Frames kept before the requested start so the decoder's overlap-add is
+# primed; one AAC frame is about 23 ms at 44.1 kHz
+PREROLL_FRAMES = 1
+
+# ADTS sampling frequency index -> sample rate
+ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+
+
+def segments_blob_name(blob_name):
+    return f"{blob_name}.segments.aac"
+
+
+def manifest_blob_name(blob_name):
+    return f"{blob_name}.segments.json"
+
+
+def adts_frame_offsets(data):
+    """
+    Return the byte offset of every ADTS frame in a buffer.
+
+    Args:
+        data: Bytes starting on a frame boundary
+
+    Returns:
+        list: Frame offsets, followed by the offset one past the last frame
+    """
+    offsets = []
+    offset = 0
+    while offset + 7 <= len(data):
+        if data[offset] != 0xFF or (data[offset + 1] & 0xF6) != 0xF0:
+            raise ValueError(f"Lost ADTS sync at byte {offset}")
+        length = ((data[offset + 3] & 0x03) << 11) | (data[offset + 4] << 3) | (data[offset + 5] >> 5)
+        if length < 7:
+            raise ValueError(f"Invalid ADTS frame length at byte {offset}")
+        offsets.append(offset)
+        offset += length
+    offsets.append(offset)
+    return offsets
+
+
+def adts_stream_info(data):
+    """
+    Read the sample rate and channel count from an ADTS frame header.
+
+    Args:
+        data: Bytes starting on a frame boundary
+
+    Returns:
+        tuple: (sample_rate, channels), or None if no header is found
+    """
+    if len(data) < 7 or data[0] != 0xFF or (data[1] & 0xF6) != 0xF0:
+        return None
+    sample_rate = ADTS_SAMPLE_RATES[(data[2] >> 2) & 0x0F]
+    channels = ((data[2] & 0x01) << 2) | (data[3] >> 6)
+    return sample_rate, channels
+
+
+def frame_window(manifest, start_ms, end_ms=None):
+    """
+    Map a time window to the range of AAC frames that covers it.
+
+    Args:
+        manifest: Segment manifest
+        start_ms: Start of the window in milliseconds
+        end_ms: End of the window in milliseconds, or None for the end
+
+    Returns:
+        tuple: (first_frame, end_frame) with end_frame exclusive
+    """
+    rate = manifest["sample_rate"]
+    per_frame = manifest["samples_per_frame"]
+    priming = manifest.get("priming_samples", 0)
+    total = manifest["total_frames"]
+
+    first = (start_ms * rate // 1000 + priming) // per_frame
+    first = max(0, min(first - PREROLL_FRAMES, total))
+    if end_ms is None:
+        end = total
+    else:
+        # Round up so the last partial frame is included
+        end = -(-(end_ms * rate // 1000 + priming) // per_frame)
+        end = max(first, min(end, total))
+    return first, end
+
+
+def segment_byte_range(manifest, first_frame, end_frame):
+    """
+    Find the segments covering a frame range.
+
+    Args:
+        manifest: Segment manifest
+        first_frame: First frame needed
+        end_frame: One past the last frame needed
+
+    Returns:
+        tuple: (byte_start, byte_end, first frame of the first covering segment)
+    """
+    segment_frames = manifest["segment_frames"]
+    segments = manifest["segments"]
+    first_segment = first_frame // segment_frames
+    last_segment = max(first_segment, (end_frame - 1) // segment_frames)
+    last_segment = min(last_segment, len(segments) - 1)
+    byte_start = segments[first_segment][0]
+    byte_end = segments[last_segment][0] + segments[last_segment][1]
+    return byte_start, byte_end, first_segment * segment_frames
+
+
+def stitch_window(manifest, read_range, start_ms, end_ms=None):
+    """
+    Produce the ADTS audio for a time window from pre-encoded segments.
+
+    Args:
+        manifest: Segment manifest
+        read_range: Callable (start, end) -> bytes reading the packed segments blob
+        start_ms: Start of the window in milliseconds
+        end_ms: End of the window in milliseconds, or None for the end
+
+    Returns:
+        bytes: ADTS audio covering the window, trimmed to whole frames
+    """
+    first_frame, end_frame = frame_window(manifest, start_ms, end_ms)
+    if first_frame >= end_frame:
+        return b""
+
+    byte_start, byte_end, segment_first_frame = segment_byte_range(manifest, first_frame, end_frame)
+    data = read_range(byte_start, byte_end)
+
+    offsets = adts_frame_offsets(data)
+    first = first_frame - segment_first_frame
+    end = min(end_frame - segment_first_frame, len(offsets) - 1)
+    return data[offsets[first]:offsets[end]]
@@ -0,0 +1,97 @@
+"""
+Time-indexed sentence tables written at ingest.
+
+See data-ingestion/scripts/sentences.py for how they are built. A table is
+stored per audio file and language as ``<blob>.sentences.<lang>.json``::
+
+    {"version": 1, "language": "en", "source_generation": 1712345678901234,
+     "starts_ms": [...], "ends_ms": [...],
+     "text": "all sentences concatenated", "text_offsets": [...]}
+
+Sentence i covers [starts_ms[i], ends_ms[i]) and its text is
+text[text_offsets[i]:text_offsets[i + 1]]. Sentences are in time order and
+do not overlap, so both offset arrays are sorted and every lookup is a
+binary search.
+"""
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+
+FORMAT_VERSION = 1
+
+
+def sentences_blob_name(blob_name, language):
+    return f"{blob_name}.sentences.{language}.json"
+
+
+class SentenceTable:
+    """
+    Parsed sentence table.
+    """
+
+    def __init__(self, data):
+        table = json.loads(data)
+        if table.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported sentence table version {table.get('version')}")
+        self.language = table["language"]
+        self.source_generation = int(table.get("source_generation") or 0)
+        self.starts = array("q", table["starts_ms"])
+        self.ends = array("q", table["ends_ms"])
+        self.text_offsets = array("q", table["text_offsets"])
+        self._text = table["text"]
+        if not (len(self.starts) == len(self.ends) == len(self.text_offsets) - 1):
+            raise ValueError("Sentence table arrays differ in length")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def text(self, index):
+        return self._text[self.text_offsets[index]:self.text_offsets[index + 1]]
+
+    def sentence(self, index):
+        """
+        Return one sentence as a JSON-serializable dict.
+
+        Args:
+            index: Sentence index
+
+        Returns:
+            dict: index, start and end (seconds) and text
+        """
+        return {
+            "index": index,
+            "start": self.starts[index] / 1000,
+            "end": self.ends[index] / 1000,
+            "text": self.text(index),
+        }
+
+    def index_at(self, time_ms):
+        """
+        Find the sentence playing at a time.
+
+        Returns:
+            int: Sentence index, or None between sentences and outside the table
+        """
+        index = bisect_right(self.starts, time_ms) - 1
+        if index >= 0 and time_ms < self.ends[index]:
+            return index
+        return None
+
+    def next_index(self, time_ms):
+        """Return the index of the first sentence starting at or after a time."""
+        return bisect_left(self.starts, time_ms)
+
+    def window(self, start_ms, end_ms=None):
+        """
+        Find the sentences overlapping a time range.
+
+        Args:
+            start_ms: Start of the range
+            end_ms: End of the range, or None for the end of the table
+
+        Returns:
+            range: Indexes of the sentences
+        """
+        first = bisect_right(self.ends, start_ms)
+        last = len(self.starts) if end_ms is None else bisect_left(self.starts, end_ms)
+        return range(first, max(first, last))
@@ -0,0 +1,332 @@
+"""
+Coalescing of concurrent identical work.
+
+When many clients ask for the same thing at once (a class opening the
+same lesson), only the first caller for a key does the work; callers that
+arrive while it is in flight wait for the same result instead of repeating
+the download, metadata lookup or render.
+
+``SingleFlight.do`` coalesces blocking calls made on worker threads,
+``SingleFlight.do_async`` coroutine calls made on the event loop; both
+share one table of in-flight keys. ``SingleFlight.stream`` does the same
+for streamed renders: a ``SharedStream`` reads the render once and fans
+its chunks out to every subscriber, replaying what was already produced
+to subscribers that join late.
+
+If the leader fails because of its own client (it disconnected, or its
+task was cancelled), waiting callers do not inherit that error; the next
+one retries as the new leader. Other errors are shared, since retrying a
+failed download or decode for every waiter would only repeat the failure.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+from app.executor import ClientDisconnected
+
+logger = logging.getLogger(__name__)
+
+# Errors that belong to the leader's request rather than to the work
+LEADER_ERRORS = (ClientDisconnected, asyncio.CancelledError)
+
+# Bytes a SharedStream reads ahead of its slowest subscriber
+STREAM_HIGH_WATER = 1024 * 1024
+
+
+class _LeaderGone(Exception):
+    """Set on a flight whose leader gave up for reasons of its own."""
+
+
+class SingleFlight:
+    """
+    Table of in-flight calls keyed by the normalized request.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.collapsed = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._streams = {}
+
+    def _join(self, key):
+        """Return (future, is_leader) for a key, starting a flight if needed."""
+        with self._lock:
+            self.calls += 1
+            future = self._flights.get(key)
+            if future is not None:
+                self.collapsed += 1
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            return future, True
+
+    def _land(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(_LeaderGone() if isinstance(error, LEADER_ERRORS) else error)
+
+    def do(self, key, fn):
+        """
+        Call ``fn()`` on this thread, or wait for the in-flight call with the same key.
+
+        Returns:
+            The result of the (shared) call
+        """
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = fn()
+                except BaseException as e:
+                    self._land(key, future, error=e)
+                    raise
+                self._land(key, future, result)
+                return result
+            try:
+                return future.result()
+            except _LeaderGone:
+                continue
+
+    async def do_async(self, key, fn):
+        """
+        Await ``fn()``, or the in-flight call with the same key.
+
+        Args:
+            key: Hashable key of the normalized request
+            fn: Callable returning an awaitable
+
+        Returns:
+            The result of the (shared) call
+        """
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = await fn()
+                except BaseException as e:
+                    self._land(key, future, error=e)
+                    raise
+                self._land(key, future, result)
+                return result
+            try:
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderGone:
+                continue
+
+    async def stream(self, key, open_stream):
+        """
+        Subscribe to the in-flight stream for a key, opening it if needed.
+
+        Must be called on the event loop.
+
+        Args:
+            key: Hashable key of the normalized request
+            open_stream: Coroutine function returning a started SharedStream
+
+        Returns:
+            Subscription: Async iterator over the stream's chunks
+        """
+        with self._lock:
+            self.calls += 1
+        opening = self._streams.get(key)
+        if opening is not None:
+            try:
+                shared = await asyncio.shield(opening)
+            except Exception:
+                shared = None
+            if shared is not None and shared.joinable:
+                with self._lock:
+                    self.collapsed += 1
+                return shared.subscribe()
+
+        opening = asyncio.get_running_loop().create_future()
+        self._streams[key] = opening
+        try:
+            shared = await open_stream()
+        except BaseException as e:
+            if self._streams.get(key) is opening:
+                del self._streams[key]
+            opening.set_exception(e)
+            # Waiters get the error; mark it retrieved when there are none
+            opening.exception()
+            raise
+        opening.set_result(shared)
+
+        def forget():
+            if self._streams.get(key) is opening:
+                del self._streams[key]
+        shared.on_unjoinable(forget)
+        return shared.subscribe()
+
+    def in_flight(self, key):
+        """Check whether a ``do`` or ``do_async`` call for the key is in progress."""
+        with self._lock:
+            return key in self._flights
+
+    def streaming(self, key):
+        """Check whether a stream for the key is open to new subscribers."""
+        return key in self._streams
+
+    def stats(self):
+        """Return call counters and the number of flights in progress."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._flights) + len(self._streams),
+            }
+
+
+class SharedStream:
+    """
+    One producer read by any number of subscribers.
+
+    The producer task reads chunks with ``read`` until it returns b"" and
+    then calls ``close``. All chunks are kept while the total is within
+    ``replay_limit`` so late subscribers can start from the beginning and
+    ``on_complete`` receives the whole body; past that limit the stream
+    stops accepting subscribers and drops chunks every subscriber has
+    consumed. The producer stays at most STREAM_HIGH_WATER bytes ahead of
+    the slowest subscriber, and is cancelled when the last one leaves.
+    """
+
+    def __init__(self, read, close, replay_limit, on_complete=None):
+        self._read = read
+        self._close = close
+        self._on_complete = on_complete
+        self._unjoinable_callbacks = []
+        self.replay_limit = replay_limit
+        self.joinable = True
+        self.done = False
+        self.error = None
+        self.size = 0
+        self._chunks = []
+        self._base = 0  # Index of the first buffered chunk
+        self._starts = []  # Byte offset of each buffered chunk
+        self._positions = {}
+        self._produced = asyncio.Event()
+        self._consumed = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._produce())
+
+    def on_unjoinable(self, callback):
+        """Register a callback for when new subscribers are no longer accepted."""
+        if self.joinable:
+            self._unjoinable_callbacks.append(callback)
+        else:
+            callback()
+
+    def _close_to_joiners(self):
+        if self.joinable:
+            self.joinable = False
+            for callback in self._unjoinable_callbacks:
+                callback()
+
+    def _notify(self, event_name):
+        event = getattr(self, event_name)
+        event.set()
+        setattr(self, event_name, asyncio.Event())
+
+    def _unread_bytes(self):
+        """Bytes produced but not yet taken by the slowest subscriber."""
+        index = min(self._positions.values()) - self._base
+        return self.size - self._starts[index] if index < len(self._starts) else 0
+
+    def _trim(self):
+        """Drop chunks every subscriber has taken, once replay is off."""
+        if self.joinable or not self._positions:
+            return
+        drop = min(self._positions.values()) - self._base
+        if drop > 0:
+            del self._chunks[:drop]
+            del self._starts[:drop]
+            self._base += drop
+
+    async def _produce(self):
+        try:
+            while True:
+                while self._positions and self._unread_bytes() > STREAM_HIGH_WATER:
+                    await self._consumed.wait()
+                chunk = await self._read()
+                if not chunk:
+                    break
+                self._chunks.append(chunk)
+                self._starts.append(self.size)
+                self.size += len(chunk)
+                if self.size > self.replay_limit:
+                    self._close_to_joiners()
+                    self._trim()
+                self._notify("_produced")
+        except asyncio.CancelledError:
+            self.error = ClientDisconnected("All subscribers left")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._close()
+            self._notify("_produced")
+
+        complete = self.error is None and self._base == 0 and self.size <= self.replay_limit
+        self._close_to_joiners()
+        if complete and self._on_complete is not None:
+            try:
+                await self._on_complete(b"".join(self._chunks))
+            except Exception as e:
+                logger.error(f"Error completing shared stream: {str(e)}")
+
+    def subscribe(self):
+        """Return a new subscription starting at the first chunk."""
+        return Subscription(self)
+
+    def _leave(self, token):
+        self._positions.pop(token, None)
+        self._trim()
+        self._notify("_consumed")
+        if not self._positions and not self.done:
+            self._task.cancel()
+
+
+class Subscription:
+    """
+    Position of one consumer in a SharedStream, registered on creation so
+    the producer keeps every chunk it has not taken yet. Iterating to the
+    end leaves the stream; consumers that stop early must call ``close``.
+    """
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.closed = False
+        shared._positions[self] = 0
+
+    def close(self):
+        """Leave the stream, cancelling the producer if nobody else reads it."""
+        if not self.closed:
+            self.closed = True
+            self.shared._leave(self)
+
+    async def __aiter__(self):
+        shared = self.shared
+        try:
+            while True:
+                index = shared._positions[self]
+                if index < shared._base + len(shared._chunks):
+                    chunk = shared._chunks[index - shared._base]
+                    shared._positions[self] = index + 1
+                    if not shared.joinable:
+                        shared._trim()
+                    shared._notify("_consumed")
+                    yield chunk
+                    continue
+                if shared.done:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+                await shared._produced.wait()
+        finally:
+            self.close()
@@ -0,0 +1,178 @@
+"""
+Cold-start helpers: lazy imports and the startup profile.
+
+``lazy_import`` returns a module whose code only runs on first attribute
+access, so heavy dependencies that are only needed to render audio (numpy)
+stay off the import path of a freshly started instance.
+
+With ``STARTUP_PROFILE=1`` the app times every module imported while it
+starts, records when startup steps finish (``mark``) and when the first
+request is answered, and logs one JSON report after the first response::
+
+    {"process_age_at_import_s": ..., "marks": {"app_imported": ..., ...},
+     "first_request_s": ..., "first_response_s": ...,
+     "imports": [{"module": ..., "cumulative_ms": ..., "self_ms": ...}, ...]}
+
+Times are seconds since the process started (when the platform reports it,
+otherwise since this module was imported), so the report covers the
+interpreter and uvicorn start as well as the app itself.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import types
+import builtins
+import threading
+import importlib
+import importlib.util
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("STARTUP_PROFILE", "False").lower() in ("true", "1", "t")
+
+# Imports listed in the report, slowest first
+REPORT_IMPORTS = 30
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that imports it on first attribute access.
+
+    importlib.util.LazyLoader runs the module body inside attribute access
+    without a lock before Python 3.12, so a second thread could see a
+    half-initialized module. Here the import goes through the regular
+    import system, whose module locks make other threads wait for it.
+    """
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # Later lookups find the module's attributes without this hook
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """
+    Import a module lazily.
+
+    Args:
+        name: Absolute module name
+
+    Returns:
+        module: The module, loaded on first attribute access (or the
+            already loaded module)
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    return _LazyModule(name)
+
+
+def _process_started():
+    """Return the process start time on the perf_counter clock, if known."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields follow the last ")"
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.perf_counter() - max(0.0, age)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """
+    Import timings and startup milestones of this process.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.process_age = None
+        self.marks = {}
+        self.imports = {}
+        self.first_request = None
+        self.first_response = None
+        self.reported = False
+        self._stack = threading.local()
+        self._original_import = None
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Start timing imports."""
+        started = _process_started()
+        if started is not None:
+            self.process_age = self.origin - started
+            self.origin = started
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def end_imports(self):
+        """Stop timing imports."""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import or builtins.__import__
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._stack, "frames", None)
+        if stack is None:
+            stack = self._stack.frames = []
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.imports[name] = (elapsed, elapsed - children)
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    def mark(self, name):
+        """Record that a startup step has finished."""
+        self.marks.setdefault(name, round(self.now(), 4))
+
+    def request_started(self):
+        if self.first_request is None:
+            self.first_request = self.now()
+
+    def request_finished(self):
+        """Record the first response and log the report once."""
+        with self._lock:
+            if self.reported:
+                return
+            self.reported = True
+            self.first_response = self.now()
+        self.end_imports()
+        logger.info(f"Startup profile: {json.dumps(self.report())}")
+
+    def report(self):
+        """Return the profile as a JSON-serializable dict."""
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            "process_age_at_import_s": None if self.process_age is None else round(self.process_age, 4),
+            "marks": dict(self.marks),
+            "first_request_s": None if self.first_request is None else round(self.first_request, 4),
+            "first_response_s": None if self.first_response is None else round(self.first_response, 4),
+            "imports": [
+                {"module": name, "cumulative_ms": round(total * 1000, 2), "self_ms": round(own * 1000, 2)}
+                for name, (total, own) in imports[:REPORT_IMPORTS]
+            ],
+        }
+
+
+profile = StartupProfile()
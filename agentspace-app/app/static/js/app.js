@@ -19,11 +19,13 @@ const prevLanguageBtn = document.getElementById('prev-language');
 const nextLanguageBtn = document.getElementById('next-language');
 const currentLanguageEl = document.getElementById('current-language');
 const sentenceContainer = document.getElementById('sentence-container');
+const shadowButton = document.getElementById('shadow-button');
 
 // Audio player functionality
 speedControl.addEventListener('input', function() {
     const speed = parseFloat(this.value);
-    audioElement.playbackRate = speed;
+    // A playlist is already stretched by the server, so only the difference is applied here
+    audioElement.playbackRate = playlist ? speed / playlist.speed : speed;
     speedValue.textContent = `${speed.toFixed(1)}x`;
 });
 
@@ -44,8 +46,21 @@ const LANGUAGES = [
 
 let currentLanguageIndex = 0;
 let currentSentenceIndex = 0;
+let activeSentenceEl = null; // Highlighted sentence element
+let audioInfoCache = {}; // Metadata of the library items shown, by audio ID
 let sentences = {}; // Will store sentences for each language
 let currentAudioId = null;
+let playlist = null; // Sentences being shadowed, null during normal playback
+
+// Pause after each sentence while shadowing, in seconds
+const SHADOW_GAP_SECONDS = 2;
+// Most clips the server accepts in one playlist
+const PLAYLIST_MAX_ITEMS = 200;
+
+// Wait after the last keystroke before searching the library, in milliseconds
+const SEARCH_DEBOUNCE_MS = 300;
+let searchTimer = null;
+let libraryRequest = null; // AbortController of the library fetch in flight
 
 // Play button functionality
 document.querySelectorAll('.play-button').forEach(button => {
@@ -55,6 +70,20 @@ document.querySelectorAll('.play-button').forEach(button => {
     });
 });
 
+/**
+ * Pick an output format for slow or metered connections
+ * @returns {Object} { format, quality }, empty to let the server negotiate
+ */
+function preferredOutput() {
+    const connection = navigator.connection;
+    if (!connection || !(connection.saveData || ['slow-2g', '2g', '3g'].includes(connection.effectiveType))) {
+        return {};
+    }
+    // Mono speech presets are a fraction of the size of the 128 kbps default
+    const canPlayOpus = audioElement.canPlayType('audio/ogg; codecs="opus"') !== '';
+    return { format: canPlayOpus ? 'opus' : 'aac', quality: 'speech' };
+}
+
 /**
  * Play audio file by ID
  * @param {string} audioId - ID of the audio file
@@ -65,7 +94,11 @@ function playAudio(audioId, options = {}) {
         startTime: 0,
         endTime: null,
         speed: 1.0,
-        repeat: false
+        repeat: false,
+        repeatCount: null,
+        repeatGap: null,
+        generation: null,
+        ...preferredOutput()
     };
     
     const playbackOptions = { ...defaultOptions, ...options };
@@ -79,9 +112,30 @@ function playAudio(audioId, options = {}) {
     
     if (playbackOptions.repeat) {
         url += '&repeat=true';
+        
+        // The server loops the encoded clip, so repeats cost no extra rendering
+        if (playbackOptions.repeatCount) {
+            url += `&repeat_count=${playbackOptions.repeatCount}`;
+        }
+        if (playbackOptions.repeatGap) {
+            url += `&gap=${playbackOptions.repeatGap}`;
+        }
+    }
+    
+    // Pinning the blob generation lets browsers and CDNs cache the clip as immutable
+    if (playbackOptions.generation) {
+        url += `&generation=${playbackOptions.generation}`;
+    }
+    
+    if (playbackOptions.format) {
+        url += `&format=${playbackOptions.format}`;
+    }
+    if (playbackOptions.quality) {
+        url += `&quality=${playbackOptions.quality}`;
     }
     
     // Set audio source and play
+    playlist = null;
     audioElement.src = url;
     audioElement.playbackRate = playbackOptions.speed;
     speedControl.value = playbackOptions.speed;
@@ -104,20 +158,83 @@ function playAudio(audioId, options = {}) {
     audioElement.play();
 }
 
+/**
+ * Play several clips back to back as one stream, e.g. for shadowing practice
+ * @param {Array} items - Clips in play order: { audioId, startTime, endTime }
+ * @param {Object} options - Shared playback options: speed and gap (seconds)
+ */
+function playPlaylist(items, options = {}) {
+    const speed = options.speed || 1.0;
+    const params = new URLSearchParams({ speed: speed });
+    items.forEach(item => {
+        params.append('item', `${item.audioId}@${item.startTime}-${item.endTime}`);
+    });
+    if (options.gap) {
+        params.set('gap', options.gap);
+    }
+    
+    // The server renders the clips at the requested speed; loading a new
+    // source resets playbackRate, so the stream is not sped up twice
+    audioElement.src = `/api/playlist/play?${params}`;
+    audioElement.play();
+}
+
+/**
+ * Shadow the sentences of the current audio: play them from one sentence
+ * on as a single playlist, pausing after each so the learner can repeat it
+ * @param {number} fromIndex - Index of the first sentence to play
+ */
+function startShadowing(fromIndex = currentSentenceIndex) {
+    const languageCode = LANGUAGES[currentLanguageIndex].code;
+    const sentenceList = sentences[languageCode];
+    if (!currentAudioId || !sentenceList || !sentenceList.length) {
+        return;
+    }
+    
+    const speed = parseFloat(speedControl.value);
+    const practice = sentenceList.slice(fromIndex, fromIndex + PLAYLIST_MAX_ITEMS);
+    
+    // Where each sentence starts in the playlist, for highlighting and seeking
+    let offset = 0;
+    const timeline = practice.map((sentence, position) => {
+        const duration = (sentence.endTime - sentence.startTime) / speed;
+        const entry = { startTime: offset, endTime: offset + duration, index: fromIndex + position };
+        offset += duration + SHADOW_GAP_SECONDS;
+        return entry;
+    });
+    
+    playPlaylist(practice.map(sentence => ({
+        audioId: currentAudioId,
+        startTime: sentence.startTime,
+        endTime: sentence.endTime
+    })), { speed: speed, gap: SHADOW_GAP_SECONDS });
+    playlist = { languageCode, speed, timeline };
+    
+    currentSentenceIndex = fromIndex;
+    highlightCurrentSentence();
+}
+
+shadowButton.addEventListener('click', () => {
+    startShadowing();
+});
+
 /**
  * Fetch audio file metadata
  * @param {string} audioId - ID of the audio file
  */
 async function fetchAudioInfo(audioId) {
     try {
-        const response = await fetch(`/api/audio/${audioId}`);
-        
-        if (!response.ok) {
-            throw new Error(`Failed to fetch audio info: ${response.status}`);
+        let data = audioInfoCache[audioId];
+        if (!data) {
+            const response = await fetch(`/api/audio/${audioId}`);
+            
+            if (!response.ok) {
+                throw new Error(`Failed to fetch audio info: ${response.status}`);
+            }
+            
+            data = await response.json();
         }
         
-        const data = await response.json();
-        
         // Update UI with audio info
         audioTitle.textContent = data.name || `Audio ${audioId}`;
         
@@ -148,77 +265,83 @@ async function fetchAudioInfo(audioId) {
 
 /**
  * Load audio library from API
+ * @param {string|null} cursor - Cursor of the next page, or null for the first page
  */
-async function loadAudioLibrary() {
-    // This would normally fetch from the API using the "language-learning-audio" bucket
-    // For now, we'll use placeholder data
-    const audioFiles = [
-        {
-            id: 'sample1',
-            name: 'Sing Along! - London Bridge',
-            content_type: 'song',
-            languages: ['en', 'ja', 'fr'],
-            duration: 225
-        },
-        {
-            id: 'sample2',
-            name: 'Multilingual Friends - Episode 1',
-            content_type: 'story',
-            languages: ['en', 'es', 'de'],
-            duration: 150
-        },
-        {
-            id: 'sample3',
-            name: 'Hippo Goes Overseas - Chapter 1',
-            content_type: 'story',
-            languages: ['en', 'ja', 'fr', 'es'],
-            duration: 320
-        },
-        {
-            id: 'sample4',
-            name: 'KABAJIN - Who Am I?',
-            content_type: 'story',
-            languages: ['ja', 'en', 'zh', 'ko'],
-            duration: 180
-        }
-    ];
+async function loadAudioLibrary(cursor = null) {
+    // This load includes the current search text, so a pending search is redundant
+    clearTimeout(searchTimer);
+    
+    const params = new URLSearchParams({ limit: 50 });
+    
+    const searchTerm = searchInput.value.trim();
+    if (searchTerm) {
+        params.set('q', searchTerm);
+    }
+    
+    if (languageFilter.value !== 'all') {
+        params.set('language', languageFilter.value);
+    }
+    
+    if (contentFilter.value !== 'all') {
+        params.set('content_type', contentFilter.value);
+    }
     
-    renderAudioLibrary(audioFiles);
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    
+    // Only the latest query may render; an older response would overwrite it
+    if (libraryRequest) {
+        libraryRequest.abort();
+    }
+    const request = new AbortController();
+    libraryRequest = request;
+    
+    try {
+        const response = await fetch(`/api/library?${params}`, { signal: request.signal });
+        
+        if (!response.ok) {
+            throw new Error(`Failed to load library: ${response.status}`);
+        }
+        
+        const data = await response.json();
+        renderAudioLibrary(data.items, data.next_cursor, Boolean(cursor));
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Error loading audio library:', error);
+        }
+    } finally {
+        if (libraryRequest === request) {
+            libraryRequest = null;
+        }
+    }
 }
 
 /**
  * Render audio library items
- * @param {Array} audioFiles - Array of audio file objects
+ * @param {Array} audioFiles - Array of audio file objects (already filtered by the server)
+ * @param {string|null} nextCursor - Cursor of the next page, if there is one
+ * @param {boolean} append - Whether to append to the items already shown
  */
-function renderAudioLibrary(audioFiles) {
-    // Clear existing items
-    audioList.innerHTML = '';
-    
-    // Filter audio files based on search and filters
-    const searchTerm = searchInput.value.toLowerCase();
-    const languageFilterValue = languageFilter.value;
-    const contentFilterValue = contentFilter.value;
-    
-    const filteredFiles = audioFiles.filter(file => {
-        // Search filter
-        const matchesSearch = file.name.toLowerCase().includes(searchTerm);
-        
-        // Language filter
-        const matchesLanguage = languageFilterValue === 'all' || 
-            (file.languages && file.languages.includes(languageFilterValue));
-        
-        // Content type filter
-        const matchesContent = contentFilterValue === 'all' || 
-            file.content_type === contentFilterValue;
-        
-        return matchesSearch && matchesLanguage && matchesContent;
-    });
+function renderAudioLibrary(audioFiles, nextCursor = null, append = false) {
+    if (!append) {
+        // Clear existing items
+        audioList.innerHTML = '';
+    }
     
-    // Render filtered files
-    filteredFiles.forEach(file => {
-        const minutes = Math.floor(file.duration / 60);
-        const seconds = Math.floor(file.duration % 60);
-        const durationStr = `${minutes}:${seconds.toString().padStart(2, '0')}`;
+    const loadMoreButton = audioList.querySelector('.load-more-button');
+    if (loadMoreButton) {
+        loadMoreButton.remove();
+    }
+    
+    // Render files
+    audioFiles.forEach(file => {
+        let durationStr = 'Unknown';
+        if (file.duration) {
+            const minutes = Math.floor(file.duration / 60);
+            const seconds = Math.floor(file.duration % 60);
+            durationStr = `${minutes}:${seconds.toString().padStart(2, '0')}`;
+        }
         
         const audioItem = document.createElement('div');
         audioItem.className = 'audio-item';
@@ -231,19 +354,32 @@ function renderAudioLibrary(audioFiles) {
             <button class="play-button" data-id="${file.id}">Play</button>
         `;
         
+        // The player shows this metadata without fetching it again
+        audioInfoCache[file.id] = file;
+        
         // Add event listener to play button
         const playButton = audioItem.querySelector('.play-button');
         playButton.addEventListener('click', function() {
-            playAudio(file.id);
+            playAudio(file.id, { generation: file.generation });
         });
         
         audioList.appendChild(audioItem);
     });
+    
+    // Offer the next page
+    if (nextCursor) {
+        const button = document.createElement('button');
+        button.className = 'load-more-button';
+        button.textContent = 'Load more';
+        button.addEventListener('click', () => loadAudioLibrary(nextCursor));
+        audioList.appendChild(button);
+    }
 }
 
 // Search and filter functionality
 searchInput.addEventListener('input', function() {
-    loadAudioLibrary();
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => loadAudioLibrary(), SEARCH_DEBOUNCE_MS);
 });
 
 languageFilter.addEventListener('change', function() {
@@ -326,22 +462,70 @@ function addMessageToChat(message, sender) {
  */
 async function loadSentences(audioId, languageCode) {
     try {
-        // This would normally fetch from the API
-        // For now, we'll use placeholder data
-        const mockSentences = generateMockSentences(audioId, languageCode);
-        sentences[languageCode] = mockSentences;
+        let sentenceList;
+        const response = await fetch(`/api/audio/${audioId}/sentences?lang=${languageCode}`);
+        if (response.ok) {
+            const data = await response.json();
+            sentenceList = data.sentences.map(sentence => ({
+                id: `${audioId}-${languageCode}-${sentence.index}`,
+                text: sentence.text,
+                startTime: sentence.start,
+                endTime: sentence.end,
+                languageCode: languageCode
+            }));
+        } else {
+            // Files without an ingested sentence table get placeholder data
+            sentenceList = generateMockSentences(audioId, languageCode);
+        }
+        sentences[languageCode] = sentenceList;
         
         if (languageCode === LANGUAGES[currentLanguageIndex].code) {
-            renderSentences(mockSentences);
+            renderSentences(sentenceList);
         }
         
-        return mockSentences;
+        return sentenceList;
     } catch (error) {
         console.error('Error loading sentences:', error);
         return [];
     }
 }
 
+/**
+ * Find the sentence playing at a time
+ * 
+ * Sentences are sorted by start time. During playback the answer is the
+ * current or the next sentence, so those are checked first; seeks fall
+ * back to a binary search.
+ * @param {Array} sentenceList - Sentences in time order
+ * @param {number} time - Playback position in seconds
+ * @param {number} hint - Index of the sentence playing before
+ * @returns {number} Index of the sentence, or -1 if none is playing
+ */
+function findSentenceIndex(sentenceList, time, hint) {
+    for (const index of [hint, hint + 1]) {
+        const sentence = sentenceList[index];
+        if (sentence && time >= sentence.startTime && time < sentence.endTime) {
+            return index;
+        }
+    }
+    
+    let low = 0;
+    let high = sentenceList.length;
+    while (low < high) {
+        const middle = (low + high) >> 1;
+        if (sentenceList[middle].startTime <= time) {
+            low = middle + 1;
+        } else {
+            high = middle;
+        }
+    }
+    const index = low - 1;
+    if (index >= 0 && time < sentenceList[index].endTime) {
+        return index;
+    }
+    return -1;
+}
+
 /**
  * Generate mock sentences for demo purposes
  * This would be replaced with actual API data in production
@@ -416,6 +600,7 @@ function generateMockSentences(audioId, languageCode) {
  */
 function renderSentences(sentenceList) {
     sentenceContainer.innerHTML = '';
+    activeSentenceEl = null;
     
     sentenceList.forEach((sentence, index) => {
         const sentenceEl = document.createElement('div');
@@ -451,6 +636,22 @@ function jumpToSentence(index) {
         return;
     }
     
+    if (playlist) {
+        // Seek within the playlist, or start shadowing again from an earlier sentence
+        const entry = playlist.timeline.find(item => item.index === index);
+        if (!entry || playlist.languageCode !== currentLanguage) {
+            startShadowing(index);
+            return;
+        }
+        currentSentenceIndex = index;
+        audioElement.currentTime = entry.startTime;
+        highlightCurrentSentence();
+        if (audioElement.paused) {
+            audioElement.play();
+        }
+        return;
+    }
+    
     currentSentenceIndex = index;
     const sentence = sentenceList[index];
     
@@ -470,13 +671,13 @@ function jumpToSentence(index) {
  * Highlight the current sentence
  */
 function highlightCurrentSentence() {
-    // Remove active class from all sentences
-    document.querySelectorAll('.sentence').forEach(el => {
-        el.classList.remove('active');
-    });
+    if (activeSentenceEl) {
+        activeSentenceEl.classList.remove('active');
+    }
     
-    // Add active class to current sentence
-    const sentenceEl = document.querySelector(`.sentence[data-index="${currentSentenceIndex}"]`);
+    // Sentence elements are rendered in index order
+    const sentenceEl = sentenceContainer.children[currentSentenceIndex];
+    activeSentenceEl = sentenceEl || null;
     if (sentenceEl) {
         sentenceEl.classList.add('active');
         
@@ -530,12 +731,18 @@ function syncSentencePosition(fromLang, toLang) {
         return;
     }
     
-    // Find the current sentence in the source language
-    const currentSentence = fromSentences[currentSentenceIndex];
+    // Playlist positions do not map to times in the file
+    if (playlist) {
+        renderSentences(toSentences);
+        highlightCurrentSentence();
+        return;
+    }
     
-    // Find the corresponding sentence in the target language
-    // For now, we'll use the same index, but in a real implementation
-    // this would match based on meaning or time position
+    // Find the sentence of the target language at the current position
+    const index = findSentenceIndex(toSentences, audioElement.currentTime, currentSentenceIndex);
+    if (index >= 0) {
+        currentSentenceIndex = index;
+    }
     renderSentences(toSentences);
     highlightCurrentSentence();
     
@@ -589,15 +796,19 @@ audioElement.addEventListener('timeupdate', () => {
     }
     
     // Find the current sentence based on time
-    for (let i = 0; i < sentenceList.length; i++) {
-        const sentence = sentenceList[i];
-        if (currentTime >= sentence.startTime && currentTime < sentence.endTime) {
-            if (currentSentenceIndex !== i) {
-                currentSentenceIndex = i;
-                highlightCurrentSentence();
-            }
-            break;
+    let index;
+    if (playlist) {
+        if (playlist.languageCode !== currentLanguage) {
+            return;
         }
+        const position = findSentenceIndex(playlist.timeline, currentTime, currentSentenceIndex - playlist.timeline[0].index);
+        index = position >= 0 ? playlist.timeline[position].index : -1;
+    } else {
+        index = findSentenceIndex(sentenceList, currentTime, currentSentenceIndex);
+    }
+    if (index >= 0 && currentSentenceIndex !== index) {
+        currentSentenceIndex = index;
+        highlightCurrentSentence();
     }
 });
 
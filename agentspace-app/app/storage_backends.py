@@ -0,0 +1,490 @@
+"""
+Storage backends for audio blobs.
+
+Playback and ingestion read and write blobs through one small interface
+so the same code runs against Google Cloud Storage in production and
+against a local directory or process memory on a laptop:
+
+    get(name)                      whole blob as bytes
+    get_range(name, start, end)    bytes [start, end) of a blob
+    download(name, path)           copy a blob to a local file
+    list(prefix)                   entries of the blobs under a prefix
+    stat(name)                     entry of one blob, or None
+    put(name, data)                store bytes, returning the new entry
+    put_file(name, path)           store a local file, returning the new entry
+
+Entries are plain dicts with the catalog fields (name, size, generation,
+updated, content_type, md5_hash, metadata). Reads pinned to a generation
+that is no longer current raise NotFound, as GCS does.
+
+ThrottledBackend wraps any backend with a fixed per-request latency and a
+bandwidth limit, so offline benchmarks see storage that behaves like a
+remote bucket rather than a warm local disk. This module deliberately does
+not import the app config so the ingestion scripts can use it as well.
+"""
+import os
+import time
+import base64
+import hashlib
+import logging
+import mimetypes
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Bytes per read when copying blobs to local files
+COPY_CHUNK = 1024 * 1024
+
+# Blob fields requested when listing a GCS bucket
+GCS_LIST_FIELDS = "items(name,size,generation,updated,contentType,md5Hash,metadata),nextPageToken"
+
+
+class NotFound(Exception):
+    """Raised when a blob, or the requested generation of it, does not exist."""
+
+
+def _md5_base64(data):
+    return base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+
+def _content_type(name, content_type=None):
+    return content_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+class StorageBackend:
+    """
+    Base class of the storage backends.
+
+    Subclasses implement get_range, list, stat and put; the remaining
+    methods have generic implementations in terms of those.
+    """
+
+    name = "base"
+
+    def get(self, name, generation=None):
+        """
+        Read a whole blob.
+
+        Args:
+            name: Blob name
+            generation: Generation to read, or None for the current one
+
+        Returns:
+            bytes: Blob contents
+        """
+        return self.get_range(name, 0, None, generation)
+
+    def get_range(self, name, start, end=None, generation=None):
+        """
+        Read a byte range of a blob.
+
+        Args:
+            name: Blob name
+            start: First byte offset
+            end: Offset one past the last byte, or None for the end
+            generation: Generation to read, or None for the current one
+
+        Returns:
+            bytes: The requested range
+        """
+        raise NotImplementedError
+
+    def download(self, name, path, generation=None):
+        """Copy a blob to a local file."""
+        data = self.get(name, generation)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def list(self, prefix=None, limit=None):
+        """
+        List blobs in name order.
+
+        Args:
+            prefix: Only list blobs whose names start with this
+            limit: Maximum number of entries to return
+
+        Returns:
+            Iterator of entry dicts
+        """
+        raise NotImplementedError
+
+    def stat(self, name):
+        """Return the entry of the current generation of a blob, or None."""
+        raise NotImplementedError
+
+    def put(self, name, data, content_type=None):
+        """
+        Store a blob, replacing any current generation.
+
+        Returns:
+            dict: Entry of the new generation
+        """
+        raise NotImplementedError
+
+    def put_file(self, name, path, content_type=None):
+        """Store a local file as a blob."""
+        with open(path, "rb") as f:
+            return self.put(name, f.read(), content_type)
+
+    def uri(self, name):
+        """Return a URI identifying a blob, for logs and metadata."""
+        return f"{self.name}://{name}"
+
+
+class GcsBackend(StorageBackend):
+    """
+    Blobs in a Google Cloud Storage bucket.
+    """
+
+    name = "gs"
+
+    def __init__(self, client, bucket_name, timeout=None, retry=None):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.bucket = client.bucket(bucket_name)
+        # Per-call options; None keeps the library defaults
+        self.options = {}
+        if timeout is not None:
+            self.options["timeout"] = timeout
+        if retry is not None:
+            self.options["retry"] = retry
+
+    @staticmethod
+    def _entry(blob):
+        return {
+            "name": blob.name,
+            "size": blob.size,
+            "generation": blob.generation,
+            "updated": blob.updated.isoformat() if blob.updated else None,
+            "content_type": blob.content_type,
+            "md5_hash": blob.md5_hash,
+            "metadata": blob.metadata
+        }
+
+    def get_range(self, name, start, end=None, generation=None):
+        from google.api_core.exceptions import NotFound as GcsNotFound
+
+        blob = self.bucket.blob(name, generation=generation)
+        try:
+            if start == 0 and end is None:
+                return blob.download_as_bytes(**self.options)
+            # GCS ranges are inclusive of the end byte
+            return blob.download_as_bytes(start=start, end=None if end is None else end - 1, **self.options)
+        except GcsNotFound as e:
+            raise NotFound(str(e)) from e
+
+    def download(self, name, path, generation=None):
+        from google.api_core.exceptions import NotFound as GcsNotFound
+
+        try:
+            self.bucket.blob(name, generation=generation).download_to_filename(path, **self.options)
+        except GcsNotFound as e:
+            raise NotFound(str(e)) from e
+
+    def list(self, prefix=None, limit=None):
+        blobs = self.bucket.list_blobs(prefix=prefix, max_results=limit, fields=GCS_LIST_FIELDS, **self.options)
+        return (self._entry(blob) for blob in blobs)
+
+    def stat(self, name):
+        blob = self.bucket.get_blob(name, **self.options)
+        return None if blob is None else self._entry(blob)
+
+    def put(self, name, data, content_type=None):
+        blob = self.bucket.blob(name)
+        blob.upload_from_string(data, content_type=_content_type(name, content_type), **self.options)
+        return self._entry(blob)
+
+    def put_file(self, name, path, content_type=None):
+        blob = self.bucket.blob(name)
+        blob.upload_from_filename(path, content_type=_content_type(name, content_type), **self.options)
+        return self._entry(blob)
+
+    def uri(self, name):
+        return f"gs://{self.bucket_name}/{name}"
+
+
+class LocalBackend(StorageBackend):
+    """
+    Blobs stored as files under a local directory.
+
+    The blob name is the path relative to the root. The generation is the
+    file's modification time in nanoseconds, so replacing a file changes
+    its generation the way re-uploading a blob does. MD5 hashes are not
+    computed for listings, which keeps listing large trees cheap.
+    """
+
+    name = "file"
+
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, name):
+        path = (self.root / name).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Blob name outside the storage root: {name}")
+        return path
+
+    def _entry(self, name, stat):
+        return {
+            "name": name,
+            "size": stat.st_size,
+            "generation": stat.st_mtime_ns,
+            "updated": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+            "content_type": _content_type(name),
+            "md5_hash": None,
+            "metadata": None
+        }
+
+    def _open(self, name, generation):
+        path = self._path(name)
+        try:
+            f = open(path, "rb")
+        except (FileNotFoundError, IsADirectoryError) as e:
+            raise NotFound(f"No such blob: {name}") from e
+        if generation is not None and os.fstat(f.fileno()).st_mtime_ns != int(generation):
+            f.close()
+            raise NotFound(f"No generation {generation} of blob {name}")
+        return f
+
+    def get_range(self, name, start, end=None, generation=None):
+        with self._open(name, generation) as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(max(0, end - start))
+
+    def download(self, name, path, generation=None):
+        with self._open(name, generation) as source, open(path, "wb") as target:
+            while True:
+                chunk = source.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                target.write(chunk)
+
+    def list(self, prefix=None, limit=None):
+        prefix = prefix or ""
+        # Only walk the directory the prefix points into
+        directory = self.root / os.path.dirname(prefix)
+        names = []
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                name = Path(dirpath, filename).relative_to(self.root).as_posix()
+                if name.startswith(prefix) and not filename.endswith(".part"):
+                    names.append(name)
+        names.sort()
+
+        count = 0
+        for name in names:
+            if limit is not None and count >= limit:
+                return
+            try:
+                stat = os.stat(self.root / name)
+            except FileNotFoundError:
+                continue
+            count += 1
+            yield self._entry(name, stat)
+
+    def stat(self, name):
+        try:
+            return self._entry(name, os.stat(self._path(name)))
+        except FileNotFoundError:
+            return None
+
+    def _replace(self, name, write):
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + ".part")
+        try:
+            with open(temp_path, "wb") as f:
+                write(f)
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        return self._entry(name, os.stat(path))
+
+    def put(self, name, data, content_type=None):
+        return self._replace(name, lambda f: f.write(data))
+
+    def put_file(self, name, path, content_type=None):
+        def copy(target):
+            with open(path, "rb") as source:
+                while True:
+                    chunk = source.read(COPY_CHUNK)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+        return self._replace(name, copy)
+
+    def uri(self, name):
+        return self._path(name).as_uri()
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Blobs held in process memory.
+
+    Generations count up from 1 on every put. Useful for benchmarks that
+    should measure the serve path without any disk I/O on the storage side;
+    ``load_directory`` seeds it from a local tree.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blobs = {}
+        self._generation = 0
+
+    def load_directory(self, root, prefix=""):
+        """Put every file under a local directory, named by relative path."""
+        root = Path(root)
+        for path in sorted(root.rglob("*")):
+            if path.is_file():
+                self.put_file(prefix + path.relative_to(root).as_posix(), path)
+
+    def _get(self, name, generation):
+        with self._lock:
+            blob = self._blobs.get(name)
+        if blob is None:
+            raise NotFound(f"No such blob: {name}")
+        data, entry = blob
+        if generation is not None and entry["generation"] != int(generation):
+            raise NotFound(f"No generation {generation} of blob {name}")
+        return data
+
+    def get_range(self, name, start, end=None, generation=None):
+        data = self._get(name, generation)
+        return bytes(data[start:end])
+
+    def list(self, prefix=None, limit=None):
+        prefix = prefix or ""
+        with self._lock:
+            entries = [dict(entry) for name, (_, entry) in self._blobs.items() if name.startswith(prefix)]
+        entries.sort(key=lambda entry: entry["name"])
+        return iter(entries if limit is None else entries[:limit])
+
+    def stat(self, name):
+        with self._lock:
+            blob = self._blobs.get(name)
+        return None if blob is None else dict(blob[1])
+
+    def put(self, name, data, content_type=None):
+        data = bytes(data)
+        with self._lock:
+            self._generation += 1
+            entry = {
+                "name": name,
+                "size": len(data),
+                "generation": self._generation,
+                "updated": datetime.now(timezone.utc).isoformat(),
+                "content_type": _content_type(name, content_type),
+                "md5_hash": _md5_base64(data),
+                "metadata": None
+            }
+            self._blobs[name] = (data, entry)
+        return dict(entry)
+
+
+class ThrottledBackend(StorageBackend):
+    """
+    Wrapper that makes a backend behave like remote storage.
+
+    Every request waits ``latency_ms`` before it starts, and transferred
+    bytes are paced to ``bandwidth`` bytes per second. Requests are paced
+    independently, like parallel connections to GCS each getting their
+    own throughput.
+    """
+
+    def __init__(self, backend, latency_ms=0, bandwidth=0):
+        self.backend = backend
+        self.latency_ms = latency_ms
+        self.bandwidth = bandwidth
+        self.name = backend.name
+
+    def _wait(self, started, size=0):
+        delay = self.latency_ms / 1000
+        if self.bandwidth:
+            delay += size / self.bandwidth
+        remaining = started + delay - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def get_range(self, name, start, end=None, generation=None):
+        started = time.monotonic()
+        data = self.backend.get_range(name, start, end, generation)
+        self._wait(started, len(data))
+        return data
+
+    def download(self, name, path, generation=None):
+        started = time.monotonic()
+        self.backend.download(name, path, generation)
+        self._wait(started, os.path.getsize(path))
+
+    def list(self, prefix=None, limit=None):
+        started = time.monotonic()
+        entries = list(self.backend.list(prefix, limit))
+        self._wait(started)
+        return iter(entries)
+
+    def stat(self, name):
+        started = time.monotonic()
+        entry = self.backend.stat(name)
+        self._wait(started)
+        return entry
+
+    def put(self, name, data, content_type=None):
+        started = time.monotonic()
+        entry = self.backend.put(name, data, content_type)
+        self._wait(started, len(data))
+        return entry
+
+    def put_file(self, name, path, content_type=None):
+        started = time.monotonic()
+        entry = self.backend.put_file(name, path, content_type)
+        self._wait(started, os.path.getsize(path))
+        return entry
+
+    def uri(self, name):
+        return self.backend.uri(name)
+
+
+def create_backend(kind, bucket_name=None, client=None, local_root=None, latency_ms=0, bandwidth=0,
+                   timeout=None, retry=None):
+    """
+    Build a storage backend.
+
+    Args:
+        kind: "gcs", "local" or "memory"
+        bucket_name: Bucket for the GCS backend
+        client: google.cloud.storage.Client for the GCS backend
+        local_root: Directory for the local backend; seeds the memory backend
+        latency_ms: Added latency per request (0 to disable)
+        bandwidth: Transfer limit in bytes per second (0 to disable)
+        timeout: Timeout of GCS calls in seconds, or a (connect, read) tuple
+        retry: google.api_core Retry policy of GCS calls
+
+    Returns:
+        StorageBackend: The backend, throttled if a limit is set
+    """
+    if kind == "gcs":
+        if client is None:
+            from google.cloud import storage
+            client = storage.Client()
+        backend = GcsBackend(client, bucket_name, timeout, retry)
+    elif kind == "local":
+        if not local_root:
+            raise ValueError("The local storage backend needs a root directory")
+        backend = LocalBackend(local_root)
+    elif kind == "memory":
+        backend = MemoryBackend()
+        if local_root:
+            backend.load_directory(local_root)
+    else:
+        raise ValueError(f"Unknown storage backend: {kind}")
+
+    if latency_ms or bandwidth:
+        logger.info(f"Throttling {kind} storage to {latency_ms} ms latency, {bandwidth or 'unlimited'} bytes/s")
+        backend = ThrottledBackend(backend, latency_ms, bandwidth)
+    return backend
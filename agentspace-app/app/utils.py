@@ -2,30 +2,128 @@
 Utility functions for the Hippo Family Club language learning app.
 """
 import os
+import json
+import time
+import asyncio
 import logging
-import tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
 import sys
-from google.cloud import storage
-from google.oauth2 import service_account
 from pydub import AudioSegment
-from fastapi.responses import StreamingResponse
 import io
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from config import GCS_CONFIG, AUDIO_CONFIG
+from config import GCS_CONFIG, GCS_CLIENT_CONFIG, STORAGE_CONFIG, AUDIO_CONFIG, HTTP_CACHE_CONFIG, PREFETCH_CONFIG
+from app.cache import SourceCache, ClipCache, clip_key, playlist_key
+from app.pcm_store import PcmStore, PcmFile
+from app.catalog import Catalog
+from app.library import Library
+from app.http_utils import (
+    range_response, file_part, http_date, make_etag, cache_control,
+    is_not_modified, not_modified_response, iter_parts, negotiate, accepts,
+    whole_body_requested
+)
+from app.audio import (
+    change_speed, stream_info, encoded_silence, repeat_parts, OUTPUT_FORMATS, output_format, output_key
+)
+from app.pipeline import ClipStream, render_clip, render_playlist, make_playlist_stream
+from app.segments import segments_blob_name, manifest_blob_name, stitch_window
+from app.mp3_seek import SeekTable, seek_table_blob_name, extract_window
+from app.sentences import SentenceTable, sentences_blob_name
+from app.executor import run_io, run_cpu, stream_cpu, io_pool, cpu_pool, Overloaded, ClientDisconnected
+from app.storage_backends import create_backend, NotFound
+from app.startup import profile
+from app.singleflight import SingleFlight, SharedStream
+from app.prefetch import Prefetcher, upcoming_windows
+from app.metrics import (
+    registry, Counter, Gauge, stage_seconds, playback_seconds, downloaded_bytes, transcodes_in_flight
+)
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Global clients
-storage_client = None
+storage_backend = None
+source_cache = None
+clip_cache = None
+pcm_store = None
+catalog = None
+library = None
+
+# Set once the background storage initialization has finished (successfully
+# or not); requests that need storage wait on it
+storage_ready = threading.Event()
+storage_init_started = False
+storage_init_lock = threading.Lock()
+
+# Concurrent identical lookups, downloads and renders are done once
+metadata_flight = SingleFlight("metadata")
+download_flight = SingleFlight("download")
+render_flight = SingleFlight("render")
+
+# Renders the clips after the one just played while the pools are idle
+prefetcher = Prefetcher(
+    lambda *args: prefetch_clip(*args),
+    lambda: io_pool.pending < io_pool.max_workers and cpu_pool.pending < cpu_pool.max_workers,
+    PREFETCH_CONFIG["session_budget"],
+    PREFETCH_CONFIG["instance_budget"],
+    max_concurrent=PREFETCH_CONFIG["max_concurrent"],
+    max_queued=PREFETCH_CONFIG["max_queued"],
+    max_age_s=PREFETCH_CONFIG["max_age_s"],
+    backoff_s=PREFETCH_CONFIG["backoff_s"]
+)
+
+# Parsed ingest-time indexes (segment manifests, seek tables) keyed by
+# (blob name, generation), least recently used first; io_pool threads share
+# it, so every access holds ingest_indexes_lock
+ingest_indexes = OrderedDict()
+ingest_indexes_lock = threading.Lock()
+INGEST_INDEX_CACHE_SIZE = 256
 
 def setup_gcp_services():
-    """Initialize GCP services with credentials."""
-    global storage_client
+    """Initialize the storage backend, with GCP credentials when it is GCS."""
+    global storage_backend
+    
+    def make_backend(credentials_path=None):
+        options = {}
+        if STORAGE_CONFIG["backend"] == "gcs":
+            # Imported here: the Google client libraries are the slowest
+            # imports of the app and the local backends do not need them
+            from app.gcs_client import get_client, make_retry
+            
+            options["client"] = get_client(
+                project=GCS_CONFIG["project_id"],
+                credentials_path=credentials_path,
+                pool_size=GCS_CLIENT_CONFIG["pool_size"],
+                keepalive_s=GCS_CLIENT_CONFIG["keepalive_s"],
+                refresh_timeout=GCS_CLIENT_CONFIG["refresh_timeout"]
+            )
+            options["timeout"] = (GCS_CLIENT_CONFIG["connect_timeout"], GCS_CLIENT_CONFIG["read_timeout"])
+            options["retry"] = make_retry(
+                GCS_CLIENT_CONFIG["retry_initial"],
+                GCS_CLIENT_CONFIG["retry_maximum"],
+                GCS_CLIENT_CONFIG["retry_multiplier"],
+                GCS_CLIENT_CONFIG["retry_deadline"]
+            )
+        return create_backend(
+            STORAGE_CONFIG["backend"],
+            bucket_name=GCS_CONFIG["bucket_name"],
+            local_root=STORAGE_CONFIG["local_root"],
+            latency_ms=STORAGE_CONFIG["latency_ms"],
+            bandwidth=STORAGE_CONFIG["bandwidth_bytes"],
+            **options
+        )
+    
+    # Local stand-ins need no credentials
+    if STORAGE_CONFIG["backend"] != "gcs":
+        storage_backend = make_backend()
+        logger.info(f"Using {STORAGE_CONFIG['backend']} storage backend rooted at {STORAGE_CONFIG['local_root']}")
+        return
     
     try:
         # Get credentials path from environment
@@ -38,38 +136,80 @@ def setup_gcp_services():
             logger.warning("Debug mode enabled, using mock credentials for local development")
             try:
                 # Try to use default credentials
-                storage_client = storage.Client(project=GCS_CONFIG["project_id"])
+                storage_backend = make_backend()
                 logger.info("Successfully initialized with default credentials")
             except Exception as e:
                 logger.warning(f"Could not initialize with default credentials: {str(e)}")
-                # Continue without a storage client for local development
-                storage_client = None
+                # Continue without storage for local development
+                storage_backend = None
             return
             
         # For production with real credentials
         if credentials_path and os.path.exists(credentials_path):
             logger.info(f"Using service account credentials from: {credentials_path}")
-            credentials = service_account.Credentials.from_service_account_file(credentials_path)
-            storage_client = storage.Client(
-                project=GCS_CONFIG["project_id"],
-                credentials=credentials
-            )
+            storage_backend = make_backend(credentials_path)
         else:
             logger.info("Using application default credentials")
-            storage_client = storage.Client(project=GCS_CONFIG["project_id"])
+            storage_backend = make_backend()
             
         logger.info("GCP services initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing GCP services: {str(e)}")
         if debug_mode:
             logger.warning("Continuing with mock services for local development")
-            storage_client = None
+            storage_backend = None
         else:
             raise
 
+class StorageNotReady(Overloaded):
+    """Raised when storage initialization takes longer than a request may wait."""
+
+
+def start_storage_init():
+    """
+    Set up storage and start the catalog refresher on a background thread.
+    
+    Safe to call more than once; only the first call starts the thread.
+    """
+    global storage_init_started
+    
+    with storage_init_lock:
+        if storage_init_started:
+            return
+        storage_init_started = True
+    
+    def init():
+        try:
+            setup_gcp_services()
+            start_catalog()
+        except Exception as e:
+            logger.error(f"Error initializing storage: {str(e)}")
+        finally:
+            storage_ready.set()
+            profile.mark("storage_ready")
+    
+    threading.Thread(target=init, name="storage-init", daemon=True).start()
+
+def ensure_storage():
+    """
+    Wait until storage initialization has finished, starting it if needed.
+    
+    Runs on worker threads; the event loop keeps serving requests that do
+    not need storage (static files, health and readiness checks) meanwhile.
+    
+    Raises:
+        StorageNotReady: If initialization is still running after the
+            configured timeout
+    """
+    if storage_ready.is_set():
+        return
+    start_storage_init()
+    if not storage_ready.wait(STORAGE_CONFIG["init_timeout"]):
+        raise StorageNotReady("Storage is still initializing")
+
 def list_audio_files(prefix=None, limit=100):
     """
-    List audio files in the GCS bucket.
+    List audio files in the storage bucket.
     
     Args:
         prefix: Optional prefix to filter files
@@ -78,24 +218,20 @@ def list_audio_files(prefix=None, limit=100):
     Returns:
         List of file metadata
     """
-    if storage_client is None:
-        setup_gcp_services()
+    ensure_storage()
         
     try:
-        bucket = storage_client.get_bucket(GCS_CONFIG["bucket_name"])
-        blobs = bucket.list_blobs(prefix=prefix, max_results=limit)
-        
         files = []
-        for blob in blobs:
+        for entry in storage_backend.list(prefix=prefix, limit=limit):
             # Only include audio files
-            if blob.name.endswith(('.mp3', '.wav', '.ogg')):
+            if entry["name"].endswith(('.mp3', '.wav', '.ogg')):
                 files.append({
-                    "id": blob.name,
-                    "name": os.path.basename(blob.name),
-                    "size": blob.size,
-                    "updated": blob.updated,
-                    "content_type": blob.content_type,
-                    "language": get_language_from_path(blob.name)
+                    "id": entry["name"],
+                    "name": os.path.basename(entry["name"]),
+                    "size": entry["size"],
+                    "updated": entry["updated"],
+                    "content_type": entry["content_type"],
+                    "language": get_language_from_path(entry["name"])
                 })
         
         return files
@@ -142,7 +278,7 @@ def get_language_from_path(path):
 
 def get_audio_file(file_id):
     """
-    Get audio file metadata from Google Cloud Storage.
+    Get audio file metadata from the storage bucket.
     
     Args:
         file_id: ID of the audio file
@@ -150,14 +286,11 @@ def get_audio_file(file_id):
     Returns:
         dict: Audio file metadata
     """
-    global storage_client
-    
-    if storage_client is None:
-        setup_gcp_services()
+    ensure_storage()
         
     # For local development with mock data
     debug_mode = os.environ.get("DEBUG", "False").lower() in ("true", "1", "t")
-    if debug_mode and storage_client is None:
+    if debug_mode and storage_backend is None:
         logger.warning(f"Using mock audio data for {file_id}")
         language = "en"
         if "/ja/" in file_id:
@@ -175,27 +308,31 @@ def get_audio_file(file_id):
         }
     
     try:
-        # Get bucket
-        bucket = storage_client.bucket(GCS_CONFIG["bucket_name"])
-        
-        # List blobs with prefix
-        blobs = list(bucket.list_blobs(prefix=f"audio/{file_id}"))
-        
-        if not blobs:
-            raise ValueError(f"Audio file {file_id} not found")
+        # Look the blob up in the catalog instead of listing the bucket
+        prefix = f"audio/{file_id}"
+        with stage_seconds.time("catalog_lookup"):
+            entry = get_catalog().find(prefix)
         
-        # Get the first matching blob
-        blob = blobs[0]
+        if entry is None:
+            # Blob may have been uploaded after the last catalog refresh
+            with stage_seconds.time("storage_list"):
+                entries = list(storage_backend.list(prefix=prefix, limit=1))
+            if not entries:
+                raise ValueError(f"Audio file {file_id} not found")
+            entry = entries[0]
+            get_catalog().upsert(entry)
         
         # Get metadata
         metadata = {
             "id": file_id,
-            "name": blob.name,
-            "size": blob.size,
-            "content_type": blob.content_type,
-            "updated": blob.updated.isoformat(),
-            "url": f"gs://{GCS_CONFIG['bucket_name']}/{blob.name}",
-            "language": get_language_from_path(blob.name)
+            "name": entry["name"],
+            "size": entry["size"],
+            "content_type": entry["content_type"],
+            "updated": entry["updated"],
+            "generation": entry["generation"],
+            "md5_hash": entry["md5_hash"],
+            "url": storage_backend.uri(entry["name"]),
+            "language": get_language_from_path(entry["name"])
         }
         
         return metadata
@@ -212,152 +349,1145 @@ def get_audio_file(file_id):
             }
         raise
 
-def extract_sentences(audio_file_path, language_code):
+async def lookup_audio_file(file_id, request=None):
+    """
+    Get audio file metadata on the I/O pool, sharing the lookup with
+    concurrent requests for the same file.
+    
+    Args:
+        file_id: ID of the audio file
+        request: Incoming request, used to cancel the lookup on disconnect
+        
+    Returns:
+        dict: Audio file metadata (shared between callers; do not modify)
+    """
+    return await metadata_flight.do_async(
+        file_id, lambda: run_io(get_audio_file, file_id, request=request)
+    )
+
+def list_catalog_entries():
+    """
+    List the audio prefix of the bucket as catalog entries.
+    
+    Returns:
+        Iterator of catalog entry dicts
+    """
+    return storage_backend.list(prefix=AUDIO_CONFIG["catalog_prefix"])
+
+def get_catalog():
+    """Return the process-wide bucket catalog, loading its snapshot on first use."""
+    global catalog
+    
+    if catalog is None:
+        catalog = Catalog(os.path.join(AUDIO_CONFIG["cache_directory"], "catalog.json.gz"))
+        catalog.load_snapshot()
+    return catalog
+
+def get_library():
+    """Return the faceted library index kept in sync with the catalog."""
+    global library
+    
+    if library is None:
+        library = Library(
+            get_catalog(),
+            AUDIO_CONFIG["catalog_prefix"],
+            AUDIO_CONFIG["formats"],
+            get_language_from_path,
+            AUDIO_CONFIG["library_rebuild_interval"]
+        )
+    return library
+
+def start_catalog():
+    """
+    Load the catalog snapshot and start refreshing it in the background.
+    
+    Lookups fall back to listing the blob's prefix until the first
+    refresh has run, so this never blocks startup on a full listing.
+    """
+    if storage_backend is None:
+        logger.warning("No storage backend, catalog refresh disabled")
+        return
+    get_catalog().start_refresher(list_catalog_entries, AUDIO_CONFIG["catalog_refresh_interval"])
+
+def get_source_cache():
+    """Return the process-wide cache of downloaded source audio."""
+    global source_cache
+
+    if source_cache is None:
+        source_cache = SourceCache(
+            os.path.join(AUDIO_CONFIG["cache_directory"], "sources"),
+            AUDIO_CONFIG["source_cache_max_bytes"]
+        )
+    return source_cache
+
+def get_clip_cache():
+    """Return the process-wide cache of rendered playback clips."""
+    global clip_cache
+
+    if clip_cache is None:
+        clip_cache = ClipCache(
+            os.path.join(AUDIO_CONFIG["cache_directory"], "clips"),
+            AUDIO_CONFIG["clip_cache_memory_bytes"],
+            AUDIO_CONFIG["clip_cache_disk_bytes"]
+        )
+    return clip_cache
+
+def get_pcm_store():
+    """Return the process-wide store of decoded PCM."""
+    global pcm_store
+
+    if pcm_store is None:
+        pcm_store = PcmStore(
+            os.path.join(AUDIO_CONFIG["cache_directory"], "pcm"),
+            AUDIO_CONFIG["pcm_store_max_bytes"],
+            AUDIO_CONFIG["pcm_promote_after_plays"]
+        )
+    return pcm_store
+
+def storage_pool_stats():
+    """Return GCS connection pool stats, without loading the client libraries if unused."""
+    if "app.gcs_client" not in sys.modules:
+        return None
+    from app.gcs_client import pool_stats
+    return pool_stats()
+
+def get_service_stats():
+    """
+    Collect occupancy and usage counters of the process-wide caches, worker
+    pools and storage connection pool, for sizing them under load.
+    
+    Returns:
+        dict: Stats by component
+    """
+    return {
+        "storage_pool": storage_pool_stats(),
+        "source_cache": get_source_cache().stats(),
+        "clip_cache": get_clip_cache().stats(),
+        "pcm_store": get_pcm_store().stats(),
+        "singleflight": {
+            flight.name: flight.stats()
+            for flight in (metadata_flight, download_flight, render_flight)
+        },
+        "prefetch": prefetcher.stats(),
+        "executors": {
+            pool.name: {"max_workers": pool.max_workers, "queue_limit": pool.queue_limit, "pending": pool.pending}
+            for pool in (io_pool, cpu_pool)
+        }
+    }
+
+@registry.collector
+def collect_service_metrics():
+    """
+    Build metrics from the counters the caches, pools and single-flight
+    tables keep anyway, when /metrics is scraped.
+    
+    Returns:
+        list: Counter and Gauge metrics
+    """
+    hits = Counter("hippo_cache_hits_total", "Cache lookups that found an entry", ("cache",))
+    misses = Counter("hippo_cache_misses_total", "Cache lookups that found no entry", ("cache",))
+    cache_bytes = Gauge("hippo_cache_bytes", "Bytes held by each cache", ("cache",))
+    if source_cache is not None:
+        stats = source_cache.stats()
+        hits.inc(stats["hits"], "source")
+        misses.inc(stats["misses"], "source")
+        cache_bytes.inc(stats["bytes"], "source")
+    if clip_cache is not None:
+        stats = clip_cache.stats()
+        hits.inc(stats["memory_hits"], "clip_memory")
+        hits.inc(stats["disk_hits"], "clip_disk")
+        misses.inc(stats["misses"], "clip")
+        cache_bytes.inc(stats["memory_bytes"], "clip_memory")
+        cache_bytes.inc(stats["disk_bytes"], "clip_disk")
+    if pcm_store is not None:
+        stats = pcm_store.stats()
+        hits.inc(stats["hits"], "pcm")
+        misses.inc(stats["misses"], "pcm")
+        cache_bytes.inc(stats["bytes"], "pcm")
+    
+    pending = Gauge("hippo_pool_pending_jobs", "Jobs running or queued on each worker pool", ("pool",))
+    for pool in (io_pool, cpu_pool):
+        pending.inc(pool.pending, pool.name)
+    
+    collapsed = Counter("hippo_singleflight_collapsed_total", "Calls that joined an identical call in flight", ("flight",))
+    for flight in (metadata_flight, download_flight, render_flight):
+        collapsed.inc(flight.collapsed, flight.name)
+    
+    prefetched = Counter("hippo_prefetch_completed_total", "Clips rendered ahead of time by the prefetcher")
+    prefetched.inc(prefetcher.completed)
+    return [hits, misses, cache_bytes, pending, collapsed, prefetched]
+
+def get_pcm_source(metadata, count_play=True):
+    """
+    Count a render of an audio file and find its decoded PCM, if stored.
+    
+    Titles that keep being rendered are promoted into the PCM store in the
+    background, so later windows are sliced from memory-mapped PCM instead
+    of being decoded.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        count_play: Whether the render counts towards promotion (prefetches do not)
+        
+    Returns:
+        tuple: (source_path, pcm_path); exactly one of them is set
+    """
+    store = get_pcm_store()
+    promote = count_play and store.record_play(metadata["name"], metadata["generation"])
+    pcm = store.get(metadata["name"], metadata["generation"])
+    if pcm is not None:
+        return None, pcm.path
+    
+    source_path = fetch_source_file(metadata)
+    if promote:
+        store.promote(metadata["name"], metadata["generation"], source_path)
+    return source_path, None
+
+def normalize_playback_params(start_time=0, end_time=None, speed=1.0, repeat=False, repeat_count=None, gap=None):
+    """
+    Normalize playback parameters so equivalent requests share a cache entry.
+    
+    Times are rounded to the millisecond and the speed is clamped to
+    AUDIO_CONFIG["speed_range"] and snapped to its step grid. Repeat
+    count and gap are clamped to AUDIO_CONFIG["repeat"].
+    
+    Args:
+        start_time: Start time in seconds
+        end_time: End time in seconds, or None for the end of the file
+        speed: Requested playback speed
+        repeat: Whether to repeat the audio
+        repeat_count: Number of plays when repeating (defaults to config)
+        gap: Silence between repetitions in seconds (defaults to config)
+        
+    Returns:
+        dict: start_ms, end_ms, speed, repeat_count and gap_ms
+    """
+    speed_range = AUDIO_CONFIG["speed_range"]
+    repeat_config = AUDIO_CONFIG["repeat"]
+    
+    start_ms = max(0, int(round((start_time or 0) * 1000)))
+    end_ms = None
+    if end_time is not None:
+        end_ms = max(start_ms, int(round(end_time * 1000)))
+    
+    speed = max(speed_range["min"], min(speed_range["max"], speed))
+    steps = round((speed - speed_range["min"]) / speed_range["step"])
+    speed = round(speed_range["min"] + steps * speed_range["step"], 3)
+    
+    count = 1
+    gap_ms = 0
+    if repeat:
+        count = repeat_config["count"] if repeat_count is None else repeat_count
+        count = max(1, min(repeat_config["max_count"], int(count)))
+        gap_ms = repeat_config["gap_ms"] if gap is None else int(round(gap * 1000))
+        gap_ms = max(0, min(repeat_config["max_gap_ms"], gap_ms)) if count > 1 else 0
+    
+    return {
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "speed": speed,
+        "repeat_count": count,
+        "gap_ms": gap_ms
+    }
+
+def fetch_source_file(metadata):
+    """
+    Get a local copy of an audio blob, downloading it only on a cache miss.
+    
+    Concurrent misses for the same blob generation share one download.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        
+    Returns:
+        str: Path to the local copy of the audio file
+    """
+    blob_name = metadata["name"]
+    generation = metadata["generation"]
+    
+    def download(path):
+        logger.info(f"Downloading {blob_name} (generation {generation}) to source cache")
+        with stage_seconds.time("download"):
+            storage_backend.download(blob_name, path, generation)
+        downloaded_bytes.inc(os.path.getsize(path))
+    
+    suffix = os.path.splitext(blob_name)[1]
+    cache = get_source_cache()
+    try:
+        return download_flight.do(
+            (blob_name, generation),
+            lambda: cache.get_or_fetch(blob_name, generation, download, suffix=suffix)
+        )
+    except NotFound:
+        # The catalog had a stale generation; update the entry so the
+        # next request downloads the current one
+        entry = storage_backend.stat(blob_name)
+        if entry is None:
+            get_catalog().remove(blob_name)
+        else:
+            get_catalog().upsert(entry)
+        raise
+
+def read_blob_range(entry, start, end):
     """
-    Extract sentences from audio file with time tags.
+    Read a byte range of a blob, from the source cache if it is there and
+    with a ranged storage read otherwise.
     
     Args:
-        audio_file_path: Path to the audio file
-        language_code: Language code for transcription
+        entry: Catalog entry or metadata with name and generation
+        start: First byte offset
+        end: Offset one past the last byte
         
     Returns:
-        List of sentences with time tags
+        bytes: The requested range
     """
-    # This is a placeholder function that would use the transcription API
-    # to extract sentences with time tags from the "language-learning-audio" bucket
-    # For now, we'll return an empty list
-    return []
+    suffix = os.path.splitext(entry["name"])[1]
+    path = get_source_cache().get(entry["name"], entry["generation"], suffix)
+    if path is not None:
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                return f.read(end - start)
+        except FileNotFoundError:
+            # Evicted by another process since the lookup
+            pass
+    
+    return storage_backend.get_range(entry["name"], start, end, entry["generation"])
 
-def process_audio_playback(file_id, start_time=0, end_time=None, speed=1.0, repeat=False):
+def load_ingest_index(entry, parse):
+    """
+    Load and parse a small index blob written at ingest, with caching.
+    
+    Args:
+        entry: Catalog entry of the index blob
+        parse: Callable turning the blob contents (bytes) into the index
+        
+    Returns:
+        The parsed index
+    """
+    key = (entry["name"], entry["generation"])
+    with ingest_indexes_lock:
+        index = ingest_indexes.get(key)
+        if index is not None:
+            ingest_indexes.move_to_end(key)
+            return index
+    
+    # Fetched and parsed without the lock; a concurrent load of the same key
+    # just replaces the entry with an equal index
+    with open(fetch_source_file(entry), "rb") as f:
+        index = parse(f.read())
+    with ingest_indexes_lock:
+        ingest_indexes[key] = index
+        ingest_indexes.move_to_end(key)
+        if len(ingest_indexes) > INGEST_INDEX_CACHE_SIZE:
+            ingest_indexes.popitem(last=False)
+    return index
+
+def get_seek_table(metadata):
+    """
+    Load the ingest-time MP3 seek table of an audio file, if it has one.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        
+    Returns:
+        SeekTable: The table, or None if the file has none or it was built
+            from another generation. A table without a source generation
+            (0) cannot be matched to the file and counts as stale.
+    """
+    entry = get_catalog().get(seek_table_blob_name(metadata["name"]))
+    if entry is None:
+        return None
+    table = load_ingest_index(entry, SeekTable)
+    if table.source_generation != int(metadata["generation"]):
+        return None
+    return table
+
+def render_copy_window(table, metadata, params):
+    """
+    Build a clip by copying whole MP3 frames out of the original file.
+    
+    Args:
+        table: SeekTable of the file
+        metadata: Audio metadata as returned by get_audio_file
+        params: Normalized playback parameters (speed must be 1.0)
+        
+    Returns:
+        bytes: Frame-aligned MP3 clip
+    """
+    return extract_window(
+        table,
+        lambda start, end: read_blob_range(metadata, start, end),
+        params["start_ms"],
+        params["end_ms"]
+    )
+
+def get_segment_manifest(metadata):
+    """
+    Load the ingest-time segment manifest of an audio file, if it has one.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        
+    Returns:
+        tuple: (manifest, segments catalog entry), or None if the file has
+            no segments or they were built from another generation. A
+            manifest without a source generation counts as stale.
+    """
+    manifest_entry = get_catalog().get(manifest_blob_name(metadata["name"]))
+    segments_entry = get_catalog().get(segments_blob_name(metadata["name"]))
+    if manifest_entry is None or segments_entry is None:
+        return None
+    
+    manifest = load_ingest_index(manifest_entry, json.loads)
+    if manifest.get("source_generation") != int(metadata["generation"]):
+        return None
+    return manifest, segments_entry
+
+def render_segment_window(manifest, segments_entry, params):
+    """
+    Build a clip by stitching pre-encoded segments, without re-encoding.
+    
+    Args:
+        manifest: Segment manifest
+        segments_entry: Catalog entry of the packed segments blob
+        params: Normalized playback parameters (speed must be 1.0)
+        
+    Returns:
+        bytes: ADTS AAC clip
+    """
+    return stitch_window(
+        manifest,
+        lambda start, end: read_blob_range(segments_entry, start, end),
+        params["start_ms"],
+        params["end_ms"]
+    )
+
+def get_sentence_table(metadata, language):
+    """
+    Load the ingest-time sentence table of an audio file in a language.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        language: Language code of the transcript
+        
+    Returns:
+        tuple: (SentenceTable, catalog entry of the table), or None if the
+            file has no table in the language or it was not built from
+            the current generation
+    """
+    entry = get_catalog().get(sentences_blob_name(metadata["name"], language))
+    if entry is None:
+        return None
+    table = load_ingest_index(entry, SentenceTable)
+    if table.source_generation != int(metadata["generation"]):
+        return None
+    return table, entry
+
+def loaded_sentence_table(metadata, language):
+    """Return a sentence table only if it is already loaded, without any I/O."""
+    entry = get_catalog().get(sentences_blob_name(metadata["name"], language))
+    if entry is None:
+        return None
+    with ingest_indexes_lock:
+        table = ingest_indexes.get((entry["name"], entry["generation"]))
+    if table is None or table.source_generation != int(metadata["generation"]):
+        return None
+    return table
+
+def render_mock_audio(file_id, speed=1.0, repeat_count=1):
+    """
+    Generate placeholder audio for local development without GCS.
+    
+    Args:
+        file_id: File ID (used to pick a tone per language)
+        speed: Playback speed (0.5 to 2.0)
+        repeat_count: Number of times the audio is played
+        
+    Returns:
+        bytes: MP3-encoded audio
+    """
+    # Create a simple audio segment for testing
+    # Different sounds for different languages
+    if "/ja/" in file_id:
+        # Japanese - higher pitch tone
+        audio = AudioSegment.silent(duration=500)
+        for i in range(10):
+            tone = AudioSegment.sine(440 + (i * 50), duration=500)
+            audio += tone
+    elif "/fr/" in file_id:
+        # French - lower pitch tone
+        audio = AudioSegment.silent(duration=500)
+        for i in range(10):
+            tone = AudioSegment.sine(330 + (i * 40), duration=500)
+            audio += tone
+    else:
+        # Default/English - medium pitch tone
+        audio = AudioSegment.silent(duration=500)
+        for i in range(10):
+            tone = AudioSegment.sine(380 + (i * 45), duration=500)
+            audio += tone
+    
+    # Apply speed change if needed
+    if speed != 1.0:
+        # Ensure speed is within reasonable bounds
+        speed = max(0.5, min(2.0, speed))
+        audio = change_speed(audio, speed)
+    
+    # Apply repeat if needed
+    if repeat_count > 1:
+        audio = audio * repeat_count
+    
+    # Export to buffer
+    buffer = io.BytesIO()
+    audio.export(buffer, format="mp3")
+    return buffer.getvalue()
+
+def render_silence(duration_ms=3000):
+    """Return MP3-encoded silence, used as a fallback in debug mode."""
+    buffer = io.BytesIO()
+    AudioSegment.silent(duration=duration_ms).export(buffer, format="mp3")
+    return buffer.getvalue()
+
+def audio_cache_headers(metadata, generation=None):
+    """
+    Build Cache-Control for an audio or metadata response.
+    
+    URLs pinned to the blob's current generation can never change and get
+    a long immutable lifetime; unpinned URLs get a short one.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        generation: Generation the request URL was pinned to, if any
+        
+    Returns:
+        dict: Cache-Control header
+    """
+    if generation is not None and str(generation) == str(metadata["generation"]):
+        return {"Cache-Control": cache_control(HTTP_CACHE_CONFIG["immutable_max_age"], immutable=True)}
+    return {"Cache-Control": cache_control(HTTP_CACHE_CONFIG["audio_max_age"])}
+
+async def clip_response(data, params, output, request, etag, last_modified, headers):
+    """
+    Build the response for an encoded clip, looping it if repeats were asked for.
+    
+    The clip is encoded once; repetitions reference the same bytes, with
+    encoded silence spliced in between when a gap is set.
+    
+    Args:
+        data: Encoded clip
+        params: Normalized playback parameters
+        output: OutputFormat the clip is encoded in (MP3 or AAC)
+        request: Incoming request
+        etag: Strong ETag of the full (looped) body
+        last_modified: Last-Modified HTTP date
+        headers: Extra response headers
+        
+    Returns:
+        Response: 200, 206 or 416 response
+    """
+    parts = [data]
+    if params["repeat_count"] > 1:
+        gap = b""
+        if params["gap_ms"]:
+            sample_rate, channels = stream_info(data, output.name) or (44100, 2)
+            gap = await run_io(encoded_silence, params["gap_ms"], output, sample_rate, channels, request=request)
+        parts = repeat_parts(data, params["repeat_count"], gap)
+    
+    return range_response(
+        parts,
+        OUTPUT_FORMATS[output.name]["media_type"],
+        request.headers if request is not None else None,
+        etag=etag,
+        last_modified=last_modified,
+        headers=headers
+    )
+
+async def render_cached_clip(metadata, params, key, seek_table=None, segmented=None, source=None, request=None, output=None):
+    """
+    Render a clip in one piece and store it in the clip cache.
+    
+    Concurrent renders of the same clip share one job.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        params: Normalized playback parameters
+        key: Clip cache key
+        seek_table: Seek table to copy MP3 frames with, if any
+        segmented: (manifest, segments_entry) to stitch AAC segments from, if any
+        source: (source_path, pcm_path) from get_pcm_source, looked up if not given
+        request: Incoming request, used to cancel work on disconnect
+        output: OutputFormat of rendered clips (defaults to MP3)
+        
+    Returns:
+        bytes: Encoded clip
+    """
+    async def render():
+        if seek_table is not None:
+            with stage_seconds.time("copy_window"):
+                data = await run_io(render_copy_window, seek_table, metadata, params, request=request)
+        elif segmented:
+            manifest, segments_entry = segmented
+            with stage_seconds.time("stitch_segments"):
+                data = await run_io(render_segment_window, manifest, segments_entry, params, request=request)
+        else:
+            source_path, pcm_path = source or await run_io(get_pcm_source, metadata, False, request=request)
+            # Decode, process and encode the clip on the CPU pool
+            transcodes_in_flight.inc()
+            try:
+                with stage_seconds.time("render"):
+                    try:
+                        data = await run_cpu(render_clip, source_path, params, pcm_path, output, request=request)
+                    except FileNotFoundError as e:
+                        logger.warning(f"Cached audio of {metadata['name']} was evicted, looking it up again: {str(e)}")
+                        source_path, pcm_path = await run_io(get_pcm_source, metadata, False, request=request)
+                        data = await run_cpu(render_clip, source_path, params, pcm_path, output, request=request)
+            finally:
+                transcodes_in_flight.dec()
+        with stage_seconds.time("clip_cache_put"):
+            await run_io(get_clip_cache().put, key, data)
+        return data
+    
+    return await render_flight.do_async(key, render)
+
+async def prefetch_clip(metadata, params, key, seek_table, segmented, output):
+    """Render a predicted clip into the clip cache unless it is there already."""
+    if key in get_clip_cache() or render_flight.in_flight(key) or render_flight.streaming(key):
+        return
+    await render_cached_clip(metadata, params, key, seek_table, segmented, output=output)
+
+def schedule_prefetch(request, metadata, params, audio_format, seek_table, segmented, output):
+    """
+    Queue the clips predicted to follow a served clip for prefetching.
+    
+    Args:
+        request: Incoming request; its client identifies the session
+        metadata: Audio metadata of the served clip
+        params: Normalized playback parameters of the served clip
+        audio_format: Clip format suffix used in clip keys
+        seek_table: Seek table of the file, if any
+        segmented: Segment manifest and entry of the file, if any
+        output: OutputFormat of rendered clips
+    """
+    forwarded = request.headers.get("x-forwarded-for")
+    client = forwarded.split(",")[0].strip() if forwarded else (request.client.host if request.client else "")
+    session = (client, request.headers.get("user-agent", ""))
+    sentences = loaded_sentence_table(metadata, metadata["language"])
+    windows = upcoming_windows(
+        params, PREFETCH_CONFIG["clips_ahead"], PREFETCH_CONFIG["max_window_s"] * 1000, sentences
+    )
+    for window in windows:
+        key = clip_key(metadata["name"], metadata["generation"], window, audio_format)
+        prefetcher.schedule(session, key, metadata, window, key, seek_table, segmented, output)
+
+async def stream_clip_response(render, params, key, request, etag, last_modified, headers, output, retry=None):
+    """
+    Render a clip while it is being sent.
+    
+    Encoded audio is forwarded as the pipeline produces it, so the first
+    bytes go out after a few frames rather than after the whole render.
+    The render runs on a CPU pool worker, which pipes the encoded chunks
+    back (see stream_cpu), and is aborted when every client reading it has
+    gone away. A render whose cached input was evicted before it could be
+    opened is started again from ``retry``. Requests for the same clip that
+    arrive while it renders read the same render from its first chunk. The
+    output is teed into the clip cache, and for repeats each response
+    replays its copy of the clip after the first pass.
+    
+    Args:
+        render: (callable, *args) starting the render in a worker, e.g. ClipStream or make_playlist_stream
+        params: Normalized playback parameters
+        key: Clip cache key
+        request: Incoming request
+        etag: Strong ETag of the full body
+        last_modified: Last-Modified HTTP date
+        headers: Extra response headers
+        output: OutputFormat the stream is encoded in
+        retry: Async callable returning a new ``render`` after a FileNotFoundError
+        
+    Returns:
+        StreamingResponse: 200 response without a Content-Length
+    """
+    cache_limit = AUDIO_CONFIG["stream_cache_max_bytes"]
+    
+    chunk_size = AUDIO_CONFIG["stream_chunk_bytes"]
+    
+    async def open_stream():
+        started = time.perf_counter()
+        job = stream_cpu(*render)
+        transcodes_in_flight.inc()
+        first_chunk = True
+        
+        async def read():
+            nonlocal first_chunk, job
+            chunk = await run_in_threadpool(job.read, chunk_size)
+            if not chunk:
+                # Raise the render's error, if it failed
+                try:
+                    await job.result()
+                except FileNotFoundError as e:
+                    # Nothing has been sent yet, so the render can start over
+                    if not first_chunk or retry is None:
+                        raise
+                    logger.warning(f"Cached audio for clip {key} was evicted, looking it up again: {str(e)}")
+                    job.close()
+                    job = stream_cpu(*await retry())
+                    chunk = await run_in_threadpool(job.read, chunk_size)
+                    if not chunk:
+                        await job.result()
+            if first_chunk:
+                first_chunk = False
+                stage_seconds.observe(time.perf_counter() - started, "stream_first_chunk")
+            return chunk
+        
+        def close():
+            job.close()
+            transcodes_in_flight.dec()
+            stage_seconds.observe(time.perf_counter() - started, "stream_render")
+        
+        async def cache_clip(data):
+            with stage_seconds.time("clip_cache_put"):
+                await run_in_threadpool(get_clip_cache().put, key, data)
+        
+        return SharedStream(
+            read,
+            close,
+            replay_limit=cache_limit,
+            on_complete=cache_clip
+        )
+    
+    subscription = await render_flight.stream(key, open_stream)
+    repeating = params["repeat_count"] > 1
+    
+    async def body():
+        # Repeats need the whole clip to loop it
+        collected = [] if repeating else None
+        try:
+            async for chunk in subscription:
+                if collected is not None:
+                    collected.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; all we can do is end the body early
+            logger.error(f"Error streaming clip {key}: {str(e)}")
+            return
+        finally:
+            subscription.close()
+        
+        if collected is None:
+            return
+        data = b"".join(collected)
+        gap = b""
+        if params["gap_ms"]:
+            sample_rate, channels = stream_info(data, output.name) or (44100, 2)
+            gap = await run_in_threadpool(encoded_silence, params["gap_ms"], output, sample_rate, channels)
+        for chunk in iter_parts(repeat_parts(data, params["repeat_count"], gap)[1:]):
+            yield chunk
+    
+    response_headers = {"Accept-Ranges": "bytes", "ETag": etag}
+    if last_modified:
+        response_headers["Last-Modified"] = last_modified
+    response_headers.update(headers or {})
+    return StreamingResponse(body(), media_type=OUTPUT_FORMATS[output.name]["media_type"], headers=response_headers)
+
+def negotiate_output(accept, requested_format=None, quality=None, repeating=False):
+    """
+    Choose the format rendered clips are encoded in.
+    
+    An explicitly requested format wins; otherwise the format is
+    negotiated from the Accept header. Looped responses concatenate the
+    encoded clip, which Ogg and WebM streams do not allow, so repeats
+    fall back to the preferred format that can be concatenated.
+    
+    Args:
+        accept: Accept header of the request, or None
+        requested_format: Format from the query string, if any
+        quality: Quality preset from the query string, if any
+        repeating: Whether the clip is looped
+        
+    Returns:
+        OutputFormat: Encoder settings
+        
+    Raises:
+        ValueError: If the format or quality is unknown
+    """
+    config = AUDIO_CONFIG["output"]
+    names = [name for name in config["preference"] if OUTPUT_FORMATS[name]["concatenable"] or not repeating]
+    if requested_format is not None:
+        if requested_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {requested_format!r}, expected one of {', '.join(OUTPUT_FORMATS)}")
+        name = requested_format if requested_format in names else names[0]
+    else:
+        offers = [(name, OUTPUT_FORMATS[name]["accept"]) for name in names]
+        name = negotiate(accept, offers, config["default_format"])
+    return output_format(name, quality)
+
+def record_playback(path, started, response):
+    """
+    Observe how long a playback response took to build.
+    
+    Args:
+        path: How the audio was produced, e.g. "cache" or "stream"
+        started: time.perf_counter() value at the start of the request
+        response: The response, returned unchanged
+        
+    Returns:
+        Response: The response
+    """
+    playback_seconds.observe(time.perf_counter() - started, path)
+    return response
+
+async def process_audio_playback(file_id, start_time=0, end_time=None, speed=1.0, repeat=False, request=None, generation=None, repeat_count=None, gap=None, requested_format=None, quality=None):
     """
     Process audio file for playback with streaming response.
     
+    Range and If-Range request headers are honored for both rendered
+    clips and cached source files. GCS and cache I/O run on the I/O
+    thread pool and decoding/encoding on the CPU process pool, so the
+    event loop is never blocked. Conditional requests that still match
+    get a 304 before any download or transcode.
+    
+    Rendered clips are encoded in the requested format and quality, or in
+    the format negotiated from the Accept header. Without an explicit
+    format or quality, representations that need no encoding (the
+    original file, copied MP3 frames, stitched AAC segments) are served
+    whenever the client accepts their type.
+    
     Args:
         file_id: File ID (path in bucket)
         start_time: Start time in seconds
         end_time: End time in seconds
         speed: Playback speed (0.5 to 2.0)
         repeat: Whether to repeat the audio
+        request: Incoming request, used for its headers and to cancel
+            work when the client disconnects
+        generation: Blob generation the URL is pinned to, if any
+        repeat_count: Number of plays when repeating
+        gap: Silence between repetitions in seconds
+        requested_format: Output format ("mp3", "aac", "opus" or "webm"), if requested
+        quality: Quality preset (see AUDIO_CONFIG["output"]), if requested
         
     Returns:
-        StreamingResponse: Audio data stream
+        Response: Audio data stream (200, 206 or 416)
+        
+    Raises:
+        ValueError: If the format or quality is unknown
     """
     # Check if we're in debug mode
     debug_mode = os.environ.get("DEBUG", "False").lower() in ("true", "1", "t")
+    started = time.perf_counter()
+    request_headers = request.headers if request is not None else None
+    params = normalize_playback_params(start_time, end_time, speed, repeat, repeat_count, gap)
+    accept = request_headers.get("accept") if request_headers is not None else None
+    explicit = requested_format is not None or quality is not None
+    output = negotiate_output(accept, requested_format, quality, params["repeat_count"] > 1)
     
     try:
+        if not storage_ready.is_set():
+            await run_in_threadpool(ensure_storage)
+        
         # For debug mode with no storage client, return mock audio
-        if debug_mode and (storage_client is None):
+        if debug_mode and (storage_backend is None):
             logger.info(f"Debug mode: Generating mock audio for {file_id}")
-            
-            # Create a simple audio segment for testing
-            # Different sounds for different languages
-            if "/ja/" in file_id:
-                # Japanese - higher pitch tone
-                audio = AudioSegment.silent(duration=500)
-                for i in range(10):
-                    tone = AudioSegment.sine(440 + (i * 50), duration=500)
-                    audio += tone
-            elif "/fr/" in file_id:
-                # French - lower pitch tone
-                audio = AudioSegment.silent(duration=500)
-                for i in range(10):
-                    tone = AudioSegment.sine(330 + (i * 40), duration=500)
-                    audio += tone
-            else:
-                # Default/English - medium pitch tone
-                audio = AudioSegment.silent(duration=500)
-                for i in range(10):
-                    tone = AudioSegment.sine(380 + (i * 45), duration=500)
-                    audio += tone
-            
-            # Apply speed change if needed
-            if speed != 1.0:
-                # Ensure speed is within reasonable bounds
-                speed = max(0.5, min(2.0, speed))
-                audio = audio.speedup(playback_speed=speed)
-            
-            # Apply repeat if needed
-            if repeat:
-                audio = audio * 3
-            
-            # Export to buffer
-            buffer = io.BytesIO()
-            audio.export(buffer, format="mp3")
-            buffer.seek(0)
+            data = await run_cpu(render_mock_audio, file_id, speed, params["repeat_count"], request=request)
             
             # Return streaming response
-            return StreamingResponse(
-                buffer, 
-                media_type="audio/mpeg",
+            return record_playback("mock", started, range_response(
+                [data],
+                "audio/mpeg",
+                request_headers,
                 headers={"Content-Disposition": f"attachment; filename=mock-{os.path.basename(file_id)}"}
-            )
+            ))
         
         # For production: Get audio file from GCS
         # First get metadata
-        metadata = get_audio_file(file_id)
+        with stage_seconds.time("metadata"):
+            metadata = await lookup_audio_file(file_id, request=request)
         
-        # Then download the actual audio file
-        bucket = storage_client.bucket(GCS_CONFIG["bucket_name"])
-        blob = bucket.blob(metadata["name"])
+        last_modified = http_date(metadata.get("updated"))
+        headers = {"Content-Disposition": f"attachment; filename={os.path.basename(file_id)}"}
+        headers.update(audio_cache_headers(metadata, generation))
+        if not explicit:
+            # The representation depends on what the client accepts
+            headers["Vary"] = "Accept"
+        source_type = metadata.get("content_type") or "audio/mpeg"
         
-        # Download to temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        blob.download_to_filename(temp_file.name)
-        temp_file.close()
+        # Whole-file playback at normal speed needs no processing:
+        # serve the cached source file as-is
+        if (params["start_ms"] == 0 and params["end_ms"] is None
+                and params["speed"] == 1.0 and params["repeat_count"] == 1
+                and not explicit and accepts(accept, (source_type,))):
+            etag = make_etag(metadata["name"], metadata["generation"], metadata.get("md5_hash"))
+            if is_not_modified(request_headers, etag, last_modified):
+                return record_playback("not_modified", started, not_modified_response(etag, last_modified, headers))
+            with stage_seconds.time("source"):
+                source_path = await run_io(fetch_source_file, metadata, request=request)
+            return record_playback("original", started, range_response(
+                [file_part(source_path)],
+                source_type,
+                request_headers,
+                etag=etag,
+                last_modified=last_modified,
+                headers=headers
+            ))
         
-        try:
-            # Load audio with pydub
-            audio = AudioSegment.from_file(temp_file.name)
-            
-            # Apply start and end times
-            start_ms = int(start_time * 1000)
-            end_ms = int(end_time * 1000) if end_time is not None else len(audio)
-            
-            # Ensure start and end times are within bounds
-            start_ms = max(0, min(start_ms, len(audio)))
-            end_ms = max(start_ms, min(end_ms, len(audio)))
-            
-            # Extract segment
-            segment = audio[start_ms:end_ms]
-            
-            # Apply speed change
-            if speed != 1.0:
-                # Ensure speed is within reasonable bounds
-                speed = max(0.5, min(2.0, speed))
-                segment = segment.speedup(playback_speed=speed)
-            
-            # Apply repeat if needed
-            if repeat:
-                segment = segment * 3  # Repeat 3 times
-            
-            # Convert to bytes
-            output = io.BytesIO()
-            segment.export(output, format="mp3")
-            output.seek(0)
+        # At normal speed nothing needs re-encoding: MP3 files with an
+        # ingest-time seek table are served by copying whole frames, and
+        # files segmented at ingest by stitching pre-encoded AAC segments
+        seek_table = None
+        segmented = None
+        if params["speed"] == 1.0 and not explicit:
+            with stage_seconds.time("index_lookup"):
+                if accepts(accept, OUTPUT_FORMATS["mp3"]["accept"]):
+                    seek_table = await run_io(get_seek_table, metadata, request=request)
+                if seek_table is None and accepts(accept, OUTPUT_FORMATS["aac"]["accept"]):
+                    segmented = await run_io(get_segment_manifest, metadata, request=request)
+        # Copied frames and stitched segments keep the default preset
+        if seek_table is not None:
+            clip_output, key_format = output_format("mp3"), "mp3-copy"
+        elif segmented:
+            clip_output, key_format = output_format("aac"), "aac-segments"
+        else:
+            clip_output, key_format = output, output_key(output)
+        stem = os.path.splitext(os.path.basename(file_id))[0]
+        headers["Content-Disposition"] = f"attachment; filename={stem}.{OUTPUT_FORMATS[clip_output.name]['extension']}"
+        
+        # The clip key covers the generation, the normalized parameters and
+        # the codec, so it doubles as a strong validator; looped bodies get their own
+        key = clip_key(metadata["name"], metadata["generation"], params, key_format)
+        if PREFETCH_CONFIG["enabled"] and request is not None:
+            schedule_prefetch(request, metadata, params, key_format, seek_table, segmented, output)
+        etag = f'"{key[:32]}"'
+        if params["repeat_count"] > 1:
+            etag = make_etag(key, params["repeat_count"], params["gap_ms"])
+        if is_not_modified(request_headers, etag, last_modified):
+            return record_playback("not_modified", started, not_modified_response(etag, last_modified, headers))
+        
+        # Serve previously rendered clips straight from the clip cache
+        with stage_seconds.time("clip_cache_get"):
+            cached = await run_io(get_clip_cache().get, key, request=request)
+        if cached is not None:
+            response = await clip_response(cached, params, clip_output, request, etag, last_modified, headers)
+            return record_playback("cache", started, response)
+        
+        source = None
+        if seek_table is None and not segmented:
+            # Then get the decoded PCM from the PCM store, or else a local
+            # copy of the audio file from the source cache
+            with stage_seconds.time("source"):
+                source = await run_io(get_pcm_source, metadata, request=request)
             
-            # Return streaming response
-            return StreamingResponse(
-                output, 
-                media_type="audio/mpeg",
-                headers={"Content-Disposition": f"attachment; filename={os.path.basename(file_id)}"}
-            )
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
+            # Requests for the whole body (no Range, or the bytes=0- that
+            # media elements open with) get it as it is rendered; other
+            # ranges need the full clip to know its length, and a clip
+            # already being prefetched is awaited rather than rendered again
+            if whole_body_requested(request_headers) and not render_flight.in_flight(key):
+                source_path, pcm_path = source
+                
+                async def retry():
+                    source_path, pcm_path = await run_io(get_pcm_source, metadata, False, request=request)
+                    return (ClipStream, source_path, params, None, pcm_path, output)
                 
+                response = await stream_clip_response(
+                    (ClipStream, source_path, params, None, pcm_path, output),
+                    params, key, request, etag, last_modified, headers, output, retry
+                )
+                return record_playback("stream", started, response)
+        
+        data = await render_cached_clip(metadata, params, key, seek_table, segmented, source, request, output)
+        
+        # Return streaming response
+        response = await clip_response(data, params, clip_output, request, etag, last_modified, headers)
+        path = "copy" if seek_table is not None else "segments" if segmented else "render"
+        return record_playback(path, started, response)
+    
+    except (Overloaded, ClientDisconnected):
+        raise
     except Exception as e:
         logger.error(f"Error processing audio file {file_id}: {str(e)}")
         if debug_mode:
             logger.warning("Generating mock audio for error case")
-            audio = AudioSegment.silent(duration=3000)  # 3 seconds of silence
-            buffer = io.BytesIO()
-            audio.export(buffer, format="mp3")
-            buffer.seek(0)
-            return StreamingResponse(
-                buffer, 
-                media_type="audio/mpeg",
+            return range_response(
+                [render_silence(3000)],  # 3 seconds of silence
+                "audio/mpeg",
+                request_headers,
                 headers={"Content-Disposition": f"attachment; filename=error-audio.mp3"}
             )
         raise
+
+async def lookup_audio_files(file_ids, request=None):
+    """
+    Get the metadata of several audio files at once.
+    
+    Lookups run concurrently and each file is looked up once, however
+    often it is listed.
+    
+    Args:
+        file_ids: IDs of the audio files
+        request: Incoming request, used to cancel lookups on disconnect
+        
+    Returns:
+        dict: Metadata by file ID, or the exception raised for a file
+    """
+    unique_ids = list(dict.fromkeys(file_ids))
+    results = await asyncio.gather(
+        *(lookup_audio_file(file_id, request=request) for file_id in unique_ids),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, (Overloaded, ClientDisconnected)):
+            raise result
+    return dict(zip(unique_ids, results))
+
+def parse_playlist_item(value):
+    """
+    Parse a playlist item written as "<file_id>@<start>-<end>" (seconds).
+    
+    Returns:
+        tuple: (file_id, start_time, end_time)
+    """
+    file_id, separator, times = value.rpartition("@")
+    start, dash, end = times.partition("-")
+    if not separator or not file_id or not dash:
+        raise ValueError(f"Invalid playlist item {value!r}, expected <file_id>@<start>-<end>")
+    start_time, end_time = float(start), float(end)
+    if start_time < 0 or end_time <= start_time:
+        raise ValueError(f"Invalid time range in playlist item {value!r}")
+    return file_id, start_time, end_time
+
+def get_playlist_source(metadata):
+    """
+    Find the audio a playlist renders a file from.
+    
+    Decoded PCM from the PCM store is used when it is already in the
+    playlist output format; otherwise the source file is decoded.
+    
+    Args:
+        metadata: Audio metadata as returned by get_audio_file
+        
+    Returns:
+        tuple: (source_path, pcm_path); exactly one of them is set
+    """
+    source_path, pcm_path = get_pcm_source(metadata)
+    if pcm_path is not None:
+        try:
+            pcm = PcmFile(pcm_path)
+        except FileNotFoundError:
+            pcm = None
+        playlist = AUDIO_CONFIG["playlist"]
+        if pcm is not None and (pcm.sample_rate, pcm.channels) == (playlist["sample_rate"], playlist["channels"]):
+            return None, pcm_path
+        source_path = fetch_source_file(metadata)
+    return source_path, None
+
+async def process_playlist_playback(item_values, speed=1.0, gap=None, request=None):
+    """
+    Render a playlist of clips as one continuous audio stream.
+    
+    Every file is looked up and fetched once however many items use it,
+    and each source is decoded once per cluster of nearby items (see
+    PlaylistStream). Rendered playlists are cached and coalesced like
+    single clips.
+    
+    Args:
+        item_values: Items written as "<file_id>@<start>-<end>" (seconds)
+        speed: Playback speed for every item
+        gap: Silence between items in seconds
+        request: Incoming request
+        
+    Returns:
+        Response: Audio data stream (200, 206, 304 or 416)
+        
+    Raises:
+        ValueError: If the playlist is empty, malformed or too long
+    """
+    playlist_config = AUDIO_CONFIG["playlist"]
+    items = [parse_playlist_item(value) for value in item_values]
+    if not items:
+        raise ValueError("Playlist has no items")
+    if len(items) > playlist_config["max_items"]:
+        raise ValueError(f"Playlist has more than {playlist_config['max_items']} items")
+    if sum(end - start for _, start, end in items) > playlist_config["max_duration_s"]:
+        raise ValueError(f"Playlist is longer than {playlist_config['max_duration_s']} seconds")
+    
+    started = time.perf_counter()
+    request_headers = request.headers if request is not None else None
+    params = normalize_playback_params(speed=speed)
+    gap_ms = max(0, min(AUDIO_CONFIG["repeat"]["max_gap_ms"], int(round((gap or 0) * 1000))))
+    
+    if not storage_ready.is_set():
+        await run_in_threadpool(ensure_storage)
+    
+    with stage_seconds.time("metadata"):
+        found = await lookup_audio_files([file_id for file_id, _, _ in items], request=request)
+    for file_id, metadata in found.items():
+        if isinstance(metadata, Exception):
+            raise ValueError(f"Audio file {file_id} not found: {str(metadata)}")
+        if "generation" not in metadata:
+            # Mock metadata in debug mode has nothing to render
+            raise ValueError(f"Audio file {file_id} not found")
+    
+    windows = []
+    for file_id, start_time, end_time in items:
+        window = normalize_playback_params(start_time, end_time, speed)
+        windows.append((found[file_id]["name"], found[file_id]["generation"], window["start_ms"], window["end_ms"]))
+    
+    key = playlist_key(windows, params["speed"], gap_ms)
+    etag = f'"{key[:32]}"'
+    headers = {
+        "Content-Disposition": "attachment; filename=playlist.mp3",
+        "Cache-Control": cache_control(HTTP_CACHE_CONFIG["audio_max_age"])
+    }
+    if is_not_modified(request_headers, etag, None):
+        return record_playback("not_modified", started, not_modified_response(etag, None, headers))
+    
+    with stage_seconds.time("clip_cache_get"):
+        cached = await run_io(get_clip_cache().get, key, request=request)
+    if cached is not None:
+        response = await clip_response(cached, params, output_format("mp3"), request, etag, None, headers)
+        return record_playback("playlist_cache", started, response)
+    
+    # Fetch every distinct source once, concurrently
+    by_blob = {(metadata["name"], metadata["generation"]): metadata for metadata in found.values()}
+    blobs = list(by_blob)
+    
+    async def locate_sources():
+        located = await asyncio.gather(
+            *(run_io(get_playlist_source, by_blob[blob], request=request) for blob in blobs)
+        )
+        return {f"{name}#{generation}": source for (name, generation), source in zip(blobs, located)}
+    
+    with stage_seconds.time("source"):
+        sources = await locate_sources()
+    playlist = [(f"{name}#{generation}", start_ms, end_ms) for name, generation, start_ms, end_ms in windows]
+    
+    if whole_body_requested(request_headers):
+        async def retry():
+            return (make_playlist_stream, await locate_sources(), playlist, params["speed"], gap_ms)
+        
+        response = await stream_clip_response(
+            (make_playlist_stream, sources, playlist, params["speed"], gap_ms),
+            params, key, request, etag, None, headers, output_format("mp3"), retry
+        )
+        return record_playback("playlist_stream", started, response)
+    
+    async def render():
+        transcodes_in_flight.inc()
+        try:
+            with stage_seconds.time("render_playlist"):
+                try:
+                    data = await run_cpu(render_playlist, sources, playlist, params["speed"], gap_ms, request=request)
+                except FileNotFoundError as e:
+                    logger.warning(f"Cached audio of a playlist item was evicted, looking it up again: {str(e)}")
+                    data = await run_cpu(
+                        render_playlist, await locate_sources(), playlist, params["speed"], gap_ms, request=request
+                    )
+        finally:
+            transcodes_in_flight.dec()
+        with stage_seconds.time("clip_cache_put"):
+            await run_io(get_clip_cache().put, key, data)
+        return data
+    
+    data = await render_flight.do_async(key, render)
+    response = await clip_response(data, params, output_format("mp3"), request, etag, None, headers)
+    return record_playback("playlist_render", started, response)
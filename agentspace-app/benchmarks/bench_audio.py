@@ -0,0 +1,201 @@
+"""
+Microbenchmarks for the stages of the audio serving path.
+
+For synthetic MP3 fixtures of each length (5 seconds, 5 minutes and 60
+minutes by default) this measures:
+
+- decode:        whole file to a PCM store file (app.pcm_store.write_pcm_file)
+- decode_window: a clip window from the middle of the file (common.decode_window)
+- slice:         the same window sliced from the PCM file and copied out
+- time_stretch:  the whole file through the WSOLA stretcher at --speed, in pipeline blocks
+- encode:        the whole file from PCM with the pipeline's encoder settings for --format
+- render:        the clip window end to end (app.pipeline.render_clip) at --speed in --format
+
+Every measurement runs in a fresh process, so peak RSS (this process and
+the ffmpeg children) belongs to that stage alone. Latency is the fastest
+of --repeat runs; throughput is seconds of audio processed per second.
+
+Usage:
+    python benchmarks/bench_audio.py [--sources 5,300,3600] [--clip 5] [--speed 0.75]
+                                     [--format mp3] [--quality standard]
+                                     [--stages decode,slice,...] [--repeat 3]
+                                     [--output results.json]
+"""
+import sys
+import time
+import argparse
+import resource
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from common import FIXTURE_DIR, decode_window, make_fixture, parse_list, write_results
+
+STAGES = ("decode", "decode_window", "slice", "time_stretch", "encode", "render")
+
+
+def make_pcm_fixture(source_path):
+    """Decode a fixture into a PCM store file once and reuse it."""
+    from app.pcm_store import write_pcm_file
+
+    path = FIXTURE_DIR / (source_path.stem + ".pcm")
+    if not path.exists():
+        partial = path.with_suffix(".part")
+        write_pcm_file(source_path, partial)
+        partial.rename(path)
+    return path
+
+
+def run_stage(stage, source_path, pcm_path, start_ms, end_ms, speed, output_name, quality):
+    """
+    Run one stage; setup that is not part of the stage happens before timing.
+
+    Returns:
+        tuple: (seconds, seconds of audio processed)
+    """
+    from pydub import AudioSegment
+    from app.audio import pcm_to_float, output_format, encoder_args
+    from app.pcm_store import PcmFile, write_pcm_file
+    from app.pipeline import render_clip, BLOCK_FRAMES
+    from app.timestretch import WsolaStretcher
+
+    pcm = PcmFile(pcm_path)
+    output = output_format(output_name, quality)
+    clip_s = (end_ms - start_ms) / 1000
+    whole_s = pcm.duration_ms / 1000
+
+    if stage == "decode":
+        output = FIXTURE_DIR / f"{source_path.stem}.bench.pcm"
+        started = time.perf_counter()
+        write_pcm_file(source_path, output)
+        elapsed = time.perf_counter() - started
+        output.unlink()
+        return elapsed, whole_s
+
+    if stage == "decode_window":
+        started = time.perf_counter()
+        decode_window(str(source_path), start_ms, end_ms)
+        return time.perf_counter() - started, clip_s
+
+    if stage == "slice":
+        started = time.perf_counter()
+        pcm.slice(start_ms, end_ms).tobytes()
+        return time.perf_counter() - started, clip_s
+
+    if stage == "time_stretch":
+        # Block by block, as the streaming pipeline feeds the stretcher
+        stretcher = WsolaStretcher(pcm.sample_rate, pcm.channels, speed)
+        started = time.perf_counter()
+        for first in range(0, pcm.frames, BLOCK_FRAMES):
+            stretcher.process(pcm_to_float(pcm.samples[first:first + BLOCK_FRAMES].tobytes(), pcm.channels))
+        stretcher.flush()
+        return time.perf_counter() - started, whole_s
+
+    if stage == "encode":
+        command = [
+            AudioSegment.converter, "-nostdin", "-v", "error",
+            "-f", "s16le", "-ar", str(pcm.sample_rate), "-ac", str(pcm.channels), "-i", "pipe:0",
+        ] + encoder_args(output)
+        started = time.perf_counter()
+        encoder = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        for first in range(0, pcm.frames, BLOCK_FRAMES):
+            encoder.stdin.write(pcm.samples[first:first + BLOCK_FRAMES].tobytes())
+        encoder.stdin.close()
+        if encoder.wait() != 0:
+            raise RuntimeError(f"Encoding failed with code {encoder.returncode}")
+        return time.perf_counter() - started, whole_s
+
+    if stage == "render":
+        params = {"start_ms": start_ms, "end_ms": end_ms, "speed": speed, "repeat_count": 1, "gap_ms": 0}
+        started = time.perf_counter()
+        render_clip(str(source_path), params, output=output)
+        return time.perf_counter() - started, clip_s
+
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def _measure(stage, source_path, pcm_path, start_ms, end_ms, speed, output_name, quality, queue):
+    try:
+        elapsed, audio_s = run_stage(stage, source_path, pcm_path, start_ms, end_ms, speed, output_name, quality)
+    except Exception as e:
+        queue.put({"error": str(e)})
+        return
+    queue.put({
+        "latency_s": elapsed,
+        "audio_s": audio_s,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    })
+
+
+def measure(*args):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=args + (queue,))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the audio serving path")
+    parser.add_argument("--sources", default="5,300,3600", help="Fixture lengths in seconds")
+    parser.add_argument("--clip", type=float, default=5, help="Clip window length in seconds")
+    parser.add_argument("--speed", type=float, default=0.75, help="Speed for time_stretch and render")
+    parser.add_argument("--format", default="mp3", help="Output format for encode and render")
+    parser.add_argument("--quality", default="standard", help="Quality preset for encode and render")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Stages to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration")
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    stages = parse_list(args.stages, str)
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"Unknown stage {stage}; choose from {', '.join(STAGES)}")
+
+    results = []
+    for source_seconds in parse_list(args.sources, int):
+        source_path = make_fixture(source_seconds)
+        pcm_path = make_pcm_fixture(source_path)
+        # Take the clip from the middle of the file
+        clip_seconds = min(args.clip, source_seconds)
+        start_ms = int((source_seconds - clip_seconds) * 500)
+        end_ms = start_ms + int(clip_seconds * 1000)
+
+        for stage in stages:
+            runs = [
+                measure(stage, source_path, pcm_path, start_ms, end_ms, args.speed, args.format, args.quality)
+                for _ in range(args.repeat)
+            ]
+            errors = [r["error"] for r in runs if "error" in r]
+            if errors:
+                results.append({"stage": stage, "source_s": source_seconds, "error": errors[0]})
+                print(f"{stage:>13}  source={source_seconds:>5}s  failed: {errors[0]}")
+                continue
+            latency = min(r["latency_s"] for r in runs)
+            row = {
+                "stage": stage,
+                "source_s": source_seconds,
+                "audio_s": runs[0]["audio_s"],
+                "latency_s": latency,
+                "audio_s_per_s": runs[0]["audio_s"] / latency if latency > 0 else None,
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+                "peak_child_rss_mb": max(r["peak_child_rss_mb"] for r in runs),
+            }
+            results.append(row)
+            print(
+                f"{stage:>13}  source={source_seconds:>5}s  audio={row['audio_s']:7.1f}s  "
+                f"latency={latency * 1000:9.1f} ms  throughput={row['audio_s_per_s']:8.1f}x  "
+                f"rss={row['peak_rss_mb']:7.1f} MB  ffmpeg_rss={row['peak_child_rss_mb']:6.1f} MB"
+            )
+
+    write_results(args.output, "audio", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
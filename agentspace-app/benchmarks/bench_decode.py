@@ -0,0 +1,102 @@
+"""
+Benchmark full-file decode versus windowed decode for clip playback.
+
+Generates synthetic MP3 fixtures with ffmpeg, then for each source length
+and clip length measures wall-clock latency and peak RSS (this process
+plus the ffmpeg child) of:
+
+- full:     AudioSegment.from_file() on the whole file, then slice
+- windowed: common.decode_window() on the clip window only
+
+Each measurement runs in a fresh process so peak RSS is not polluted by
+earlier runs.
+
+Usage:
+    python benchmarks/bench_decode.py [--sources 60,600,3600] [--clips 2,5,30]
+                                      [--repeat 3] [--output results.json]
+"""
+import sys
+import json
+import time
+import argparse
+import resource
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pydub import AudioSegment
+
+from common import make_fixture, decode_window
+
+
+def _measure(mode, path, start_ms, end_ms, queue):
+    started = time.perf_counter()
+    if mode == "full":
+        audio = AudioSegment.from_file(str(path))
+        clip = audio[start_ms:end_ms]
+    else:
+        clip = decode_window(str(path), start_ms, end_ms)
+    elapsed = time.perf_counter() - started
+
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    queue.put({
+        "latency_s": elapsed,
+        "clip_ms": len(clip),
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": self_rss / 1024,
+        "peak_child_rss_mb": child_rss / 1024,
+    })
+
+
+def measure(mode, path, start_ms, end_ms):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(mode, path, start_ms, end_ms, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark windowed audio decode")
+    parser.add_argument("--sources", default="60,600,3600", help="Source lengths in seconds")
+    parser.add_argument("--clips", default="2,5,30", help="Clip lengths in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration")
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for source_seconds in [int(s) for s in args.sources.split(",")]:
+        path = make_fixture(source_seconds)
+        for clip_seconds in [float(c) for c in args.clips.split(",")]:
+            if clip_seconds > source_seconds:
+                continue
+            # Take the clip from the middle of the file
+            start_ms = int((source_seconds - clip_seconds) * 500)
+            end_ms = start_ms + int(clip_seconds * 1000)
+            for mode in ("full", "windowed"):
+                runs = [measure(mode, path, start_ms, end_ms) for _ in range(args.repeat)]
+                row = {
+                    "mode": mode,
+                    "source_s": source_seconds,
+                    "clip_s": clip_seconds,
+                    "latency_s": min(r["latency_s"] for r in runs),
+                    "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+                    "peak_child_rss_mb": max(r["peak_child_rss_mb"] for r in runs),
+                }
+                results.append(row)
+                print(
+                    f"{mode:>8}  source={source_seconds:>5}s  clip={clip_seconds:>5}s  "
+                    f"latency={row['latency_s'] * 1000:8.1f} ms  "
+                    f"rss={row['peak_rss_mb']:7.1f} MB  ffmpeg_rss={row['peak_child_rss_mb']:6.1f} MB"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
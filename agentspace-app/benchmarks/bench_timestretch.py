@@ -0,0 +1,111 @@
+"""
+Benchmark pydub's AudioSegment.speedup against the WSOLA time stretcher.
+
+Throughput is reported as seconds of input audio processed per CPU-second
+(higher is better). The output duration error shows whether each method
+actually reaches the requested speed; ``speedup`` cannot slow audio down,
+so for speeds below 1.0 it returns audio of the wrong length.
+
+The input is synthetic stereo 44.1 kHz audio (a sum of harmonics with a
+slowly varying pitch and amplitude envelope), so no fixture files are needed.
+
+Usage:
+    python benchmarks/bench_timestretch.py [--seconds 30] [--speeds 0.5,0.8,1.2,1.5,2.0]
+                                           [--repeat 3] [--output results.json]
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pydub import AudioSegment
+
+SAMPLE_RATE = 44100
+
+
+def make_signal(seconds):
+    """Build a speech-like stereo test signal as an AudioSegment."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 150 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+    left = 0.2 * signal * envelope
+    right = 0.2 * np.roll(signal, 100) * envelope
+    pcm = (np.stack([left, right], axis=1) * 32767).astype(np.int16)
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=SAMPLE_RATE, channels=2)
+
+
+def run_speedup(segment, speed):
+    return segment.speedup(playback_speed=speed)
+
+
+def run_wsola(segment, speed):
+    from app.audio import change_speed
+    return change_speed(segment, speed)
+
+
+METHODS = {
+    "pydub_speedup": run_speedup,
+    "wsola": run_wsola,
+}
+
+
+def measure(method, segment, speed, repeat):
+    cpu_times = []
+    output = None
+    for _ in range(repeat):
+        started = time.process_time()
+        output = METHODS[method](segment, speed)
+        cpu_times.append(time.process_time() - started)
+    cpu_s = min(cpu_times)
+    expected_ms = len(segment) / speed
+    return {
+        "method": method,
+        "speed": speed,
+        "input_s": len(segment) / 1000,
+        "cpu_s": cpu_s,
+        "audio_s_per_cpu_s": (len(segment) / 1000) / cpu_s if cpu_s > 0 else None,
+        "output_ms": len(output),
+        "expected_ms": expected_ms,
+        "duration_error_pct": 100 * (len(output) - expected_ms) / expected_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time-stretch throughput")
+    parser.add_argument("--seconds", type=float, default=30, help="Length of the input audio")
+    parser.add_argument("--speeds", default="0.5,0.8,1.2,1.5,2.0", help="Speeds to test")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration")
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    segment = make_signal(args.seconds)
+    results = []
+    for speed in [float(s) for s in args.speeds.split(",")]:
+        for method in METHODS:
+            try:
+                row = measure(method, segment, speed, args.repeat)
+            except Exception as e:
+                row = {"method": method, "speed": speed, "error": str(e)}
+                print(f"{method:>14}  speed={speed:4.2f}  failed: {str(e)}")
+                results.append(row)
+                continue
+            results.append(row)
+            print(
+                f"{method:>14}  speed={speed:4.2f}  "
+                f"throughput={row['audio_s_per_cpu_s']:8.1f} audio-s/cpu-s  "
+                f"duration_error={row['duration_error_pct']:+7.1f}%"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Shared helpers for the benchmark scripts: synthetic fixtures, the windowed
+decode baseline and run metadata.
+
+Results are written as JSON with a description of the machine and the
+checked-out commit, so runs from before and after a change can be compared.
+"""
+import os
+import sys
+import json
+import platform
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pydub import AudioSegment
+from pydub.audio_segment import fix_wav_headers
+from pydub.exceptions import CouldntDecodeError
+
+FIXTURE_DIR = Path(os.environ.get("BENCH_FIXTURE_DIR", "/tmp/hippoapp-bench"))
+
+# Size of a WAV header with no samples
+WAV_HEADER_BYTES = 44
+
+
+def make_fixture(seconds):
+    """Create (or reuse) a stereo 44.1 kHz MP3 of the given length."""
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    path = FIXTURE_DIR / f"tone-{seconds}s.mp3"
+    if not path.exists():
+        partial = path.with_suffix(".part.mp3")
+        subprocess.run([
+            AudioSegment.converter, "-v", "error", "-y",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-ac", "2", "-ar", "44100", "-b:a", "128k", str(partial)
+        ], check=True)
+        partial.rename(path)
+    return path
+
+
+def decode_window(source_path, start_ms=0, end_ms=None, preroll_ms=None):
+    """
+    Decode only a time window of an audio file into an AudioSegment.
+
+    The app renders from the PCM store or the streaming pipeline; this is
+    the per-request windowed decode they replaced, kept as a baseline.
+    ffmpeg is asked to seek in the input before decoding, so the cost of
+    the decode is proportional to the window rather than to the position
+    of the window in the file. Decoding starts ``preroll_ms`` before the
+    window so the decoder is primed (MP3 bit reservoir, MDCT overlap), and
+    the pre-roll is trimmed off afterwards.
+
+    Args:
+        source_path: Path to the local audio file
+        start_ms: Start of the window in milliseconds
+        end_ms: End of the window in milliseconds, or None for the end of the file
+        preroll_ms: Extra audio decoded before the window (defaults to config)
+
+    Returns:
+        AudioSegment: Decoded audio covering the window
+    """
+    from app.audio import decoder_command
+
+    command, seek_ms = decoder_command(source_path, start_ms, end_ms, preroll_ms)
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise CouldntDecodeError(
+            f"Decoding {source_path} failed with code {process.returncode}: "
+            f"{process.stderr.decode(errors='ignore')}"
+        )
+
+    data = bytearray(process.stdout)
+    if len(data) <= WAV_HEADER_BYTES:
+        # Window starts past the end of the file
+        return AudioSegment.silent(duration=0)
+    fix_wav_headers(data)
+
+    audio = AudioSegment(data=bytes(data))
+    return audio[start_ms - seek_ms:]
+
+
+def parse_list(value, type_=float):
+    """Parse a comma-separated command line list."""
+    return [type_(item) for item in value.split(",") if item]
+
+
+def percentile(values, fraction):
+    """Return a percentile of a list of numbers by linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def environment():
+    """Describe the machine and code a benchmark ran on."""
+    app_dir = Path(__file__).parent.parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=app_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        ffmpeg = subprocess.run(
+            [AudioSegment.converter, "-version"], capture_output=True, text=True
+        ).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ffmpeg = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg,
+    }
+
+
+def write_results(path, benchmark, config, results):
+    """
+    Write benchmark results as JSON.
+
+    Args:
+        path: Output file, or None to skip writing
+        benchmark: Name of the benchmark
+        config: Command line settings of the run
+        results: Measurements
+    """
+    if not path:
+        return
+    with open(path, "w") as f:
+        json.dump({
+            "benchmark": benchmark,
+            "environment": environment(),
+            "config": config,
+            "results": results,
+        }, f, indent=2)
@@ -0,0 +1,312 @@
+"""
+HTTP load test of the audio API against a locally running app.
+
+Starts the app with uvicorn on the local storage backend, serving
+synthetic MP3 fixtures from a directory laid out like the bucket, and
+drives each endpoint in turn with --concurrency clients for --duration
+seconds:
+
+- metadata:  GET /api/audio/{id}
+- play:      GET /api/audio/{id}/play for a fixed set of --windows clip
+             windows at the --speeds, so the run mixes renders and clip
+             cache hits the same way every time
+- languages: GET /api/languages
+
+Each client keeps one HTTP/1.1 connection open and reads every response
+body in full. For every endpoint the report has the request count,
+errors, status codes, throughput, p50/p95/p99 latency and the peak RSS of
+the server with all its child processes (worker pool and ffmpeg), sampled
+from /proc. Every run starts with empty caches; use --storage-latency-ms
+to add a storage round trip to each read.
+
+Usage:
+    python benchmarks/load_test.py [--sources 5,300] [--endpoints metadata,play,languages]
+                                   [--concurrency 8] [--duration 20] [--windows 20]
+                                   [--clip 5] [--speeds 0.75,1.0,1.25]
+                                   [--storage-latency-ms 0] [--port 8089]
+                                   [--output results.json]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import signal
+import argparse
+import threading
+import subprocess
+import http.client
+from collections import Counter
+from pathlib import Path
+
+from common import FIXTURE_DIR, make_fixture, parse_list, percentile, write_results
+
+APP_DIR = Path(__file__).parent.parent
+ENDPOINTS = ("metadata", "play", "languages")
+
+
+def prepare_storage(sources):
+    """
+    Lay the fixtures out like the bucket for the local storage backend.
+
+    Returns:
+        tuple: (storage root, {file_id: length in seconds})
+    """
+    root = FIXTURE_DIR / "store"
+    directory = root / "audio" / "en"
+    directory.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for seconds in sources:
+        fixture = make_fixture(seconds)
+        target = directory / f"bench-{seconds}s.mp3"
+        if not target.exists():
+            shutil.copyfile(fixture, target)
+        files[f"en/{target.name}"] = seconds
+    return root, files
+
+
+def request_paths(endpoint, files, windows, clip, speeds, seed):
+    """Build the list of request paths cycled through for an endpoint."""
+    if endpoint == "metadata":
+        return [f"/api/audio/{file_id}" for file_id in files]
+    if endpoint == "languages":
+        return ["/api/languages"]
+
+    rng = random.Random(seed)
+    paths = []
+    file_ids = sorted(files)
+    for i in range(windows):
+        file_id = file_ids[i % len(file_ids)]
+        length = min(clip, files[file_id])
+        start = round(rng.uniform(0, files[file_id] - length), 3)
+        speed = speeds[i % len(speeds)]
+        paths.append(f"/api/audio/{file_id}/play?start_time={start}&end_time={start + length:.3f}&speed={speed}")
+    return paths
+
+
+def process_tree_rss(pid):
+    """Return the summed RSS in bytes of a process and all its descendants."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class RssMonitor:
+    """
+    Thread tracking the peak RSS of a process tree.
+    """
+
+    def __init__(self, pid, interval_s=0.1):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self._stop.wait(self.interval_s)
+
+    def reset(self):
+        self.peak = process_tree_rss(self.pid)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def client(host, port, paths, offset, deadline, samples):
+    """Send requests on one connection until the deadline, recording each one."""
+    connection = http.client.HTTPConnection(host, port, timeout=120)
+    index = offset
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            size = len(response.read())
+            samples.append((time.perf_counter() - started, response.status, size))
+        except (OSError, http.client.HTTPException) as e:
+            samples.append((time.perf_counter() - started, type(e).__name__, 0))
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=120)
+    connection.close()
+
+
+def run_endpoint(host, port, paths, concurrency, duration):
+    """
+    Drive one endpoint with concurrent clients.
+
+    Returns:
+        tuple: (samples as (latency_s, status, bytes) tuples, elapsed seconds)
+    """
+    samples = []
+    started = time.monotonic()
+    deadline = started + duration
+    clients = [
+        threading.Thread(target=client, args=(host, port, paths, i, deadline, samples))
+        for i in range(concurrency)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return samples, time.monotonic() - started
+
+
+def summarize(samples, elapsed):
+    """Turn request samples into latency percentiles, throughput and status counts."""
+    ok = [latency for latency, status, _ in samples if isinstance(status, int) and status < 400]
+    statuses = Counter(str(status) for _, status, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "statuses": dict(sorted(statuses.items())),
+        "throughput_rps": len(samples) / elapsed if elapsed > 0 else None,
+        "bytes_per_s": sum(size for _, _, size in samples) / elapsed if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": _ms(percentile(ok, 0.50)),
+            "p95": _ms(percentile(ok, 0.95)),
+            "p99": _ms(percentile(ok, 0.99)),
+            "mean": _ms(sum(ok) / len(ok)) if ok else None,
+            "max": _ms(max(ok)) if ok else None,
+        },
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def start_app(port, storage_root, storage_latency_ms):
+    """Start the app on the local storage backend with empty caches."""
+    cache_dir = FIXTURE_DIR / "cache"
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    env = dict(
+        os.environ,
+        STORAGE_BACKEND="local",
+        STORAGE_LOCAL_ROOT=str(storage_root),
+        STORAGE_LATENCY_MS=str(storage_latency_ms),
+        AUDIO_CACHE_DIR=str(cache_dir),
+        DEBUG="False",
+    )
+    log = open(FIXTURE_DIR / "load_test_server.log", "w")
+    # A session of its own, so the worker pool is stopped along with the server
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True
+    )
+
+
+def wait_ready(host, port, server, timeout_s=60):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"App exited with code {server.returncode}; see {FIXTURE_DIR / 'load_test_server.log'}")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request("GET", "/api/ready")
+            if connection.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("App did not become ready")
+
+
+def stop_app(server):
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(server.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            server.wait(timeout=10)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the audio API")
+    parser.add_argument("--sources", default="5,300", help="Fixture lengths in seconds")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Endpoints to drive, in order")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per endpoint")
+    parser.add_argument("--windows", type=int, default=20, help="Distinct clip windows requested from play")
+    parser.add_argument("--clip", type=float, default=5, help="Clip length in seconds")
+    parser.add_argument("--speeds", default="0.75,1.0,1.25", help="Playback speeds of the clip windows")
+    parser.add_argument("--storage-latency-ms", type=float, default=0, help="Latency added to storage reads")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the clip windows")
+    parser.add_argument("--port", type=int, default=8089, help="Port of the app")
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    endpoints = parse_list(args.endpoints, str)
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"Unknown endpoint {endpoint}; choose from {', '.join(ENDPOINTS)}")
+
+    host = "127.0.0.1"
+    storage_root, files = prepare_storage(parse_list(args.sources, int))
+    server = start_app(args.port, storage_root, args.storage_latency_ms)
+    results = {}
+    try:
+        wait_ready(host, args.port, server)
+        monitor = RssMonitor(server.pid)
+        monitor.start()
+        overall_peak = 0
+        for endpoint in endpoints:
+            paths = request_paths(endpoint, files, args.windows, args.clip, parse_list(args.speeds), args.seed)
+            monitor.reset()
+            samples, elapsed = run_endpoint(host, args.port, paths, args.concurrency, args.duration)
+            row = summarize(samples, elapsed)
+            row["peak_rss_mb"] = round(monitor.peak / (1024 * 1024), 1)
+            overall_peak = max(overall_peak, monitor.peak)
+            results[endpoint] = row
+            latency = row["latency_ms"]
+            print(
+                f"{endpoint:>9}  requests={row['requests']:>6}  errors={row['errors']:>4}  "
+                f"rps={row['throughput_rps']:8.1f}  p50={latency['p50']} ms  p95={latency['p95']} ms  "
+                f"p99={latency['p99']} ms  peak_rss={row['peak_rss_mb']} MB"
+            )
+        monitor.stop()
+        results["peak_rss_mb"] = round(overall_peak / (1024 * 1024), 1)
+    finally:
+        stop_app(server)
+
+    write_results(args.output, "load", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
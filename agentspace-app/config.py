@@ -24,19 +24,176 @@ GCS_CONFIG = {
     "credentials_path": os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
 }
 
+# Storage backend for audio blobs: "gcs", or "local"/"memory" to run and
+# benchmark offline against files under local_root. Latency and bandwidth
+# limits make the stand-ins behave like a remote bucket (0 disables them).
+STORAGE_CONFIG = {
+    "backend": os.environ.get("STORAGE_BACKEND", "gcs"),
+    "local_root": os.environ.get("STORAGE_LOCAL_ROOT"),
+    "latency_ms": float(os.environ.get("STORAGE_LATENCY_MS", 0)),
+    "bandwidth_bytes": int(os.environ.get("STORAGE_BANDWIDTH_BYTES", 0)),
+    # Storage is set up in the background at startup; requests wait this
+    # many seconds for it before failing with a 503
+    "init_timeout": float(os.environ.get("STORAGE_INIT_TIMEOUT", 30)),
+}
+
+# Local caches. On Cloud Run /tmp is backed by instance memory, so the
+# source, clip and PCM caches all count against the container memory limit
+# (512 MiB by default on Cloud Run, 256 MB on an App Engine F1 instance).
+# AUDIO_CACHE_MAX_BYTES is their combined budget for the instance; keep it
+# to about a quarter of the memory limit. A cache's own variable overrides
+# its share.
+CACHE_MAX_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+# Server processes sharing the cache directory (as started by gunicorn).
+# Each keeps its own cache index, so the cache budgets below are split
+# between them.
+CACHE_PROCESSES = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+
 # Audio configuration
 AUDIO_CONFIG = {
     "formats": ["mp3", "wav", "ogg"],
     "cache_directory": os.environ.get("AUDIO_CACHE_DIR", "/tmp/hippoapp-cache"),
+    # Budget for downloaded source files (per server process)
+    "source_cache_max_bytes": int(os.environ.get("AUDIO_SOURCE_CACHE_MAX_BYTES", CACHE_MAX_BYTES // 2)) // CACHE_PROCESSES,
+    # Budgets for rendered playback clips (memory tier and disk tier)
+    "clip_cache_memory_bytes": int(os.environ.get("AUDIO_CLIP_CACHE_MEMORY_BYTES", CACHE_MAX_BYTES // 8)) // CACHE_PROCESSES,
+    "clip_cache_disk_bytes": int(os.environ.get("AUDIO_CLIP_CACHE_DISK_BYTES", CACHE_MAX_BYTES * 3 // 8)) // CACHE_PROCESSES,
+    # Decoded PCM of frequently played titles (about 10 MB per stereo
+    # minute). Off by default, since a useful store needs far more than
+    # AUDIO_CACHE_MAX_BYTES; it comes on top of it when enabled.
+    "pcm_store_max_bytes": int(os.environ.get("AUDIO_PCM_STORE_MAX_BYTES", 0)) // CACHE_PROCESSES,
+    "pcm_promote_after_plays": int(os.environ.get("AUDIO_PCM_PROMOTE_AFTER_PLAYS", 3)),
+    # Bucket catalog used for metadata lookups instead of per-request list_blobs
+    "catalog_prefix": "audio/",
+    "catalog_refresh_interval": int(os.environ.get("CATALOG_REFRESH_INTERVAL", 300)),  # Seconds
+    # Catalog changes reach /api/library after at most this many seconds
+    "library_rebuild_interval": float(os.environ.get("LIBRARY_REBUILD_INTERVAL", 30)),
     "max_duration": 3600,  # Maximum audio duration in seconds
+    "decode_preroll_ms": 100,  # Audio decoded before a window to prime the decoder
+    # Streamed renders: largest chunk handed to the client, and largest
+    # streamed clip that is also kept in the clip cache
+    "stream_chunk_bytes": 16 * 1024,
+    "stream_cache_max_bytes": 8 * 1024 * 1024,
     "default_speed": 1.0,
     "speed_range": {
         "min": 0.5,
         "max": 2.0,
         "step": 0.1
+    },
+    # Looping for repeat=true: the clip is encoded once and streamed
+    # count times, with an optional gap of silence between repetitions
+    "repeat": {
+        "count": 3,
+        "max_count": 10,
+        "gap_ms": 0,
+        "max_gap_ms": 5000
+    },
+    # Playlists of clips rendered as one stream (/api/playlist/play). Item
+    # ranges of a source closer than merge_gap_ms are decoded in one pass
+    "playlist": {
+        "max_items": 200,
+        "max_duration_s": 1800,
+        "merge_gap_ms": 5000,
+        "max_cluster_s": 120,
+        "sample_rate": 44100,
+        "channels": 2
+    },
+    # Output codecs of rendered clips (see OUTPUT_FORMATS in app/audio.py),
+    # chosen with ?format= or negotiated from the Accept header. Quality
+    # presets give each codec a bitrate, channel count and sample rate
+    # (None keeps the source's); "speech" and "low" are mono and tuned for
+    # intelligible speech on slow connections.
+    "output": {
+        "default_format": "mp3",
+        "default_quality": "standard",
+        # Preferred first among formats the client accepts equally
+        "preference": ["opus", "webm", "aac", "mp3"],
+        "qualities": {
+            "standard": {
+                "mp3": {"bitrate": "128k", "channels": None, "sample_rate": None},
+                "aac": {"bitrate": "128k", "channels": None, "sample_rate": None},
+                "opus": {"bitrate": "64k", "channels": None, "sample_rate": 48000}
+            },
+            "speech": {
+                "mp3": {"bitrate": "48k", "channels": 1, "sample_rate": 22050},
+                "aac": {"bitrate": "48k", "channels": 1, "sample_rate": 22050},
+                "opus": {"bitrate": "24k", "channels": 1, "sample_rate": 48000}
+            },
+            "low": {
+                "mp3": {"bitrate": "32k", "channels": 1, "sample_rate": 22050},
+                "aac": {"bitrate": "32k", "channels": 1, "sample_rate": 22050},
+                "opus": {"bitrate": "16k", "channels": 1, "sample_rate": 48000}
+            }
+        }
+    },
+    # WSOLA time stretching used for speeds other than 1.0
+    "time_stretch": {
+        "frame_ms": 40,  # Overlap-add frame length
+        "search_ms": 10  # Tolerance of the waveform similarity search
     }
 }
 
+# HTTP caching configuration (seconds)
+HTTP_CACHE_CONFIG = {
+    # URLs pinned to a blob generation never change
+    "immutable_max_age": 365 * 24 * 3600,
+    # Unpinned audio and metadata may change when a blob is replaced
+    "audio_max_age": int(os.environ.get("AUDIO_CACHE_MAX_AGE", 300)),
+    "metadata_max_age": int(os.environ.get("METADATA_CACHE_MAX_AGE", 60)),
+    "languages_max_age": 3600,
+}
+
+# Worker pool configuration for blocking GCS and audio work
+EXECUTOR_CONFIG = {
+    "io_workers": int(os.environ.get("IO_WORKERS", 16)),
+    "io_queue_limit": int(os.environ.get("IO_QUEUE_LIMIT", 64)),
+    "cpu_workers": int(os.environ.get("CPU_WORKERS", os.cpu_count() or 1)),
+    "cpu_queue_limit": int(os.environ.get("CPU_QUEUE_LIMIT", 8)),
+    "disconnect_poll_interval": 0.25,  # Seconds between client disconnect checks
+}
+
+# Background rendering of the sentence clips a listener is likely to play
+# next (see app/prefetch.py). Budgets are clips per minute; prefetching
+# only runs while the worker pools have idle capacity.
+PREFETCH_CONFIG = {
+    "enabled": os.environ.get("PREFETCH_ENABLED", "True").lower() in ("true", "1", "t"),
+    "clips_ahead": int(os.environ.get("PREFETCH_CLIPS_AHEAD", 2)),
+    "session_budget": int(os.environ.get("PREFETCH_SESSION_BUDGET", 20)),
+    "instance_budget": int(os.environ.get("PREFETCH_INSTANCE_BUDGET", 120)),
+    "max_window_s": 60,  # Longer clips are not sentences; nothing is prefetched
+    "max_concurrent": 1,  # Prefetch renders running at once
+    "max_queued": 32,  # Waiting jobs; more are dropped
+    "max_age_s": 30,  # Waiting jobs older than this are dropped as stale
+    "backoff_s": 0.5,  # Pause while the pools are busy
+}
+
+# Opt-in request profiling (see app/profiler.py). Requests are profiled
+# when they carry "X-Profile: <token>" or are picked at the sample rate;
+# with neither configured the profiler is not installed.
+PROFILE_CONFIG = {
+    "token": os.environ.get("PROFILE_TOKEN") or None,
+    "sample_rate": float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+    "directory": os.environ.get("PROFILE_DIR", "/tmp/hippoapp-profiles"),
+    "interval_ms": float(os.environ.get("PROFILE_INTERVAL_MS", 5)),
+    "max_duration_s": 120,  # Sampling stops after this long
+    "max_concurrent": 1,  # Profiles taken at once
+}
+
+# Shared GCS client (see app/gcs_client.py). The pool should cover the I/O
+# workers, which issue all storage calls.
+GCS_CLIENT_CONFIG = {
+    "pool_size": int(os.environ.get("GCS_POOL_SIZE", EXECUTOR_CONFIG["io_workers"])),
+    "keepalive_s": int(os.environ.get("GCS_KEEPALIVE_S", 60)),
+    "connect_timeout": float(os.environ.get("GCS_CONNECT_TIMEOUT", 10)),
+    "read_timeout": float(os.environ.get("GCS_READ_TIMEOUT", 60)),
+    "retry_initial": 0.5,  # Seconds before the first retry
+    "retry_maximum": 10.0,  # Longest wait between retries
+    "retry_multiplier": 2.0,
+    "retry_deadline": float(os.environ.get("GCS_RETRY_DEADLINE", 60)),
+    "refresh_timeout": 30,  # Seconds allowed for an access token refresh
+}
+
 # Language configuration
 LANGUAGE_CONFIG = {
     "default": "en",
@@ -86,13 +243,6 @@ LANGUAGE_CONFIG = {
     }
 }
 
-# Audio configuration
-AUDIO_CONFIG = {
-    "formats": ["mp3", "wav", "ogg"],
-    "max_duration": 3600,  # Maximum duration in seconds
-    "default_speed": 1.0,
-}
-
 # Language configuration
 LANGUAGE_CONFIG = {
     "default": "en",
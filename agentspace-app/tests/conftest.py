@@ -0,0 +1,17 @@
+"""
+Shared setup for the unit tests: puts the app package on the import path
+and points storage and caches at a temporary directory, so nothing reaches
+GCS and tests do not share state with a local server.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+TEST_ROOT = tempfile.mkdtemp(prefix="hippo-tests-")
+os.environ.setdefault("STORAGE_BACKEND", "local")
+os.environ.setdefault("STORAGE_LOCAL_ROOT", os.path.join(TEST_ROOT, "bucket"))
+os.environ.setdefault("AUDIO_CACHE_DIR", os.path.join(TEST_ROOT, "cache"))
+os.environ.setdefault("PREFETCH_ENABLED", "0")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
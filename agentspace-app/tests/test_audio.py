@@ -0,0 +1,29 @@
+"""
+Tests for encoding helpers in app/audio.py.
+"""
+from app.audio import encoded_silence, output_format, repeat_parts, stream_info
+
+
+def test_repeat_parts_references_the_clip():
+    data = b"clip"
+    parts = repeat_parts(data, 3, b"gap")
+    assert parts == [data, b"gap", data, b"gap", data]
+    assert all(part is data for part in parts[::2])
+    assert repeat_parts(data, 3) == [data, data, data]
+    assert repeat_parts(data, 1, b"gap") == [data]
+
+
+def test_encoded_silence_matches_the_output_preset():
+    standard = encoded_silence(1000, output_format("mp3", "standard"), 44100, 2)
+    speech = encoded_silence(1000, output_format("mp3", "speech"), 22050, 1)
+
+    assert stream_info(standard, "mp3") == (44100, 2)
+    assert stream_info(speech, "mp3") == (22050, 1)
+    # 48 kbit/s against 128 kbit/s for the same second of silence
+    assert len(speech) < len(standard) / 2
+    assert encoded_silence(0, output_format("mp3"), 44100, 2) == b""
+
+
+def test_encoded_silence_for_aac():
+    silence = encoded_silence(500, output_format("aac", "speech"), 22050, 1)
+    assert stream_info(silence, "aac") == (22050, 1)
@@ -0,0 +1,121 @@
+"""
+Tests for the source and clip caches in app/cache.py.
+"""
+import os
+import threading
+
+from app.cache import ClipCache, SourceCache, clip_key
+
+
+def writer(data):
+    def fetch(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return fetch
+
+
+def test_source_cache_evicts_least_recently_used(tmp_path):
+    cache = SourceCache(tmp_path, max_bytes=25)
+    cache.put("audio/en/a.mp3", 1, writer(b"a" * 10))
+    cache.put("audio/en/b.mp3", 1, writer(b"b" * 10))
+    # Touch a so b is the least recently used entry
+    assert cache.get("audio/en/a.mp3", 1) is not None
+    cache.put("audio/en/c.mp3", 1, writer(b"c" * 10))
+
+    assert cache.get("audio/en/a.mp3", 1) is not None
+    assert cache.get("audio/en/b.mp3", 1) is None
+    assert cache.get("audio/en/c.mp3", 1) is not None
+    assert cache.stats()["bytes"] == 20
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_source_cache_keeps_an_entry_larger_than_the_budget(tmp_path):
+    cache = SourceCache(tmp_path, max_bytes=5)
+    path = cache.put("audio/en/a.mp3", 1, writer(b"a" * 10))
+    assert open(path, "rb").read() == b"a" * 10
+
+
+def test_source_cache_new_generation_replaces_the_old_one(tmp_path):
+    cache = SourceCache(tmp_path, max_bytes=1000)
+    old_path = cache.put("audio/en/a.mp3", 1, writer(b"old"), ".mp3")
+    new_path = cache.put("audio/en/a.mp3", 2, writer(b"new"), ".mp3")
+
+    assert not os.path.exists(old_path)
+    assert cache.get("audio/en/a.mp3", 1, ".mp3") is None
+    assert cache.get("audio/en/a.mp3", 2, ".mp3") == new_path
+    assert cache.stats()["files"] == 1
+
+
+def test_source_cache_index_survives_a_restart(tmp_path):
+    SourceCache(tmp_path, max_bytes=1000).put("audio/en/a.mp3", 3, writer(b"data"), ".mp3")
+    # A leftover write from an interrupted download is not an entry
+    (tmp_path / "tmp1234.part").write_bytes(b"partial")
+
+    cache = SourceCache(tmp_path, max_bytes=1000)
+    assert cache.get("audio/en/a.mp3", 3, ".mp3") is not None
+    assert cache.stats()["files"] == 1
+
+
+def test_source_cache_counts_hits_and_misses_across_threads(tmp_path):
+    cache = SourceCache(tmp_path, max_bytes=1000)
+    cache.put("audio/en/a.mp3", 1, writer(b"data"))
+
+    def play():
+        for _ in range(500):
+            cache.get_or_fetch("audio/en/a.mp3", 1, writer(b"data"))
+
+    threads = [threading.Thread(target=play) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (4000, 0)
+
+
+def params(start_ms=0, end_ms=1000, speed=1.0):
+    return {"start_ms": start_ms, "end_ms": end_ms, "speed": speed}
+
+
+def test_clip_key_depends_on_the_source_generation():
+    assert clip_key("audio/en/a.mp3", 1, params()) != clip_key("audio/en/a.mp3", 2, params())
+    assert clip_key("audio/en/a.mp3", 1, params()) == clip_key("audio/en/a.mp3", 1, params())
+    assert clip_key("audio/en/a.mp3", 1, params()) != clip_key("audio/en/a.mp3", 1, params(), "opus")
+
+
+def test_clip_cache_memory_and_disk_hits(tmp_path):
+    cache = ClipCache(tmp_path, memory_max_bytes=100, disk_max_bytes=1000)
+    cache.put("a", b"a" * 10)
+    assert cache.get("a") == b"a" * 10
+
+    # A restarted cache finds the clip on disk and promotes it to memory
+    cache = ClipCache(tmp_path, memory_max_bytes=100, disk_max_bytes=1000)
+    assert cache.get("a") == b"a" * 10
+    assert cache.get("a") == b"a" * 10
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_clip_cache_evicts_rarely_played_clips_first(tmp_path):
+    cache = ClipCache(tmp_path, memory_max_bytes=25, disk_max_bytes=25)
+    cache.put("often", b"o" * 10)
+    cache.put("once", b"x" * 10)
+    for _ in range(3):
+        cache.get("often")
+    cache.put("new", b"n" * 10)
+
+    assert "often" in cache
+    assert "once" not in cache
+    assert "new" in cache
+    assert not (tmp_path / "once.clip").exists()
+    assert cache.stats()["disk_bytes"] == 20
+
+
+def test_clip_cache_keeps_large_clips_on_disk_only(tmp_path):
+    cache = ClipCache(tmp_path, memory_max_bytes=5, disk_max_bytes=1000)
+    cache.put("large", b"l" * 10)
+    assert cache.stats()["memory_entries"] == 0
+    assert cache.get("large") == b"l" * 10
+    assert cache.stats()["disk_hits"] == 1
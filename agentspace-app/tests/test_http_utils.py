@@ -0,0 +1,119 @@
+"""
+Tests for Range and If-Range handling in app/http_utils.py.
+"""
+import pytest
+
+from app.http_utils import (
+    FilePart, RangeNotSatisfiable, iter_parts, parse_range, if_range_matches, range_response,
+    whole_body_requested
+)
+
+ETAG = '"0123456789abcdef"'
+LAST_MODIFIED = "Sun, 18 Oct 2026 06:00:00 GMT"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=500-", (500, 1000)),
+    ("bytes=999-999", (999, 1000)),
+    ("bytes=900-5000", (900, 1000)),
+    ("bytes=-100", (900, 1000)),
+    ("bytes=-5000", (0, 1000)),
+    (" Bytes = 10-19", (10, 20)),
+])
+def test_parse_range_satisfiable(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-10",
+    "bytes=0-10,20-30",
+    "bytes=abc-",
+    "bytes=10",
+    "bytes=-",
+    "bytes=20-10",
+])
+def test_parse_range_ignored(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=1000-1999", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=0-", 0),
+    ("bytes=-10", 0),
+])
+def test_parse_range_not_satisfiable(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, size)
+
+
+@pytest.mark.parametrize("if_range, expected", [
+    (None, True),
+    ("", True),
+    (ETAG, True),
+    (f" {ETAG} ", True),
+    ('"something-else"', False),
+    (f"W/{ETAG}", False),
+    (LAST_MODIFIED, True),
+    ("Sat, 17 Oct 2026 06:00:00 GMT", False),
+])
+def test_if_range_matches(if_range, expected):
+    assert if_range_matches(if_range, ETAG, LAST_MODIFIED) is expected
+
+
+def test_if_range_without_validators():
+    assert not if_range_matches(ETAG, None, LAST_MODIFIED)
+    assert not if_range_matches(LAST_MODIFIED, ETAG, None)
+
+
+def test_range_response_416():
+    response = range_response([b"x" * 100], "audio/mpeg", {"range": "bytes=100-"}, etag=ETAG)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */100"
+    assert response.headers["etag"] == ETAG
+
+
+def test_range_response_partial():
+    response = range_response([b"x" * 100], "audio/mpeg", {"range": "bytes=10-19"}, etag=ETAG)
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/100"
+    assert response.headers["content-length"] == "10"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_range_response_stale_if_range_serves_full_body():
+    # A 416-worthy range is ignored too when If-Range no longer matches
+    headers = {"range": "bytes=500-", "if-range": '"old"'}
+    response = range_response([b"x" * 100], "audio/mpeg", headers, etag=ETAG)
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "100"
+    assert "content-range" not in response.headers
+
+
+def test_iter_parts_across_bytes_and_files(tmp_path):
+    path = tmp_path / "part.bin"
+    path.write_bytes(b"0123456789")
+    parts = [b"abc", FilePart(str(path), 2, 6), b"xyz"]
+    body = b"abc234567xyz"
+
+    for start in range(len(body) + 1):
+        for end in range(start, len(body) + 1):
+            assert b"".join(iter_parts(parts, start, end, chunk_size=2)) == body[start:end]
+
+
+@pytest.mark.parametrize("headers, expected", [
+    (None, True),
+    ({}, True),
+    ({"range": "bytes=0-"}, True),
+    ({"range": "Bytes = 0 -"}, True),
+    ({"range": "bytes=0-", "if-range": ETAG}, False),
+    ({"range": "bytes=0-99"}, False),
+    ({"range": "bytes=100-"}, False),
+    ({"range": "bytes=-100"}, False),
+])
+def test_whole_body_requested(headers, expected):
+    assert whole_body_requested(headers) is expected
@@ -0,0 +1,149 @@
+"""
+Tests for filtering and cursor pagination in app/library.py.
+"""
+import pytest
+
+from app import library
+from app.library import Library, LibraryIndex
+
+
+def make_entry(item_id, language, duration=None, content_type="story"):
+    return {
+        "name": f"audio/{language}/{item_id}.mp3",
+        "size": 1000,
+        "updated": "2026-10-18T06:00:00+00:00",
+        "generation": 1,
+        "metadata": {
+            "content_type": content_type,
+            "duration": None if duration is None else str(duration),
+        },
+    }
+
+
+def make_index(entries):
+    return LibraryIndex(entries, "audio/", {"mp3"}, lambda name: name.split("/")[1])
+
+
+def collect_pages(index, limit, **filters):
+    pages = []
+    cursor = None
+    while True:
+        result = index.query(cursor=cursor, limit=limit, **filters)
+        pages.append([item["id"] for item in result["items"]])
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture
+def index():
+    entries = [make_entry(f"item{number:02d}", "en" if number % 3 else "ja", duration=number * 10)
+               for number in range(10)]
+    entries.append({"name": "audio/en/notes.txt", "size": 1, "updated": "", "generation": 1})
+    return make_index(entries)
+
+
+def test_pages_cover_every_item_once(index):
+    pages = collect_pages(index, 3)
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sum(pages, []) == sorted(item["id"] for item in index.items)
+    assert len(index) == 10
+
+
+def test_last_full_page_has_no_cursor(index):
+    pages = collect_pages(index, 5)
+    assert [len(page) for page in pages] == [5, 5]
+
+
+def test_cursor_pages_filtered_items(index):
+    pages = collect_pages(index, 2, language="ja")
+    assert pages == [["ja/item00.mp3", "ja/item03.mp3"], ["ja/item06.mp3", "ja/item09.mp3"]]
+    assert index.query(language="ja", limit=2)["total"] == 4
+
+
+def test_cursor_after_removed_item(index):
+    # A cursor naming an item that is no longer in the catalog resumes after it
+    cursor = library.encode_cursor("en/item045.mp3")
+    result = index.query(language="en", cursor=cursor, limit=50)
+    assert [item["id"] for item in result["items"]] == ["en/item05.mp3", "en/item07.mp3", "en/item08.mp3"]
+    assert result["next_cursor"] is None
+
+
+def test_cursor_round_trip():
+    for item_id in ["en/a.mp3", "ja/日本語.mp3", "x"]:
+        assert library.decode_cursor(library.encode_cursor(item_id)) == item_id
+
+
+def test_empty_result(index):
+    result = index.query(language="fr")
+    assert result == {"items": [], "next_cursor": None, "total": 0,
+                      "facets": {"language": {"en": 6, "ja": 4}, "content_type": {}}}
+
+
+def test_facets_ignore_their_own_filter(index):
+    result = index.query(language="ja", search="item0")
+    assert result["facets"]["language"] == {"en": 6, "ja": 4}
+    assert result["facets"]["content_type"] == {"story": 4}
+
+
+def test_duration_bits_match_a_scan(monkeypatch):
+    # Small blocks exercise both whole-block and per-item paths
+    monkeypatch.setattr(library, "DURATION_BLOCK_SIZE", 4)
+    entries = [make_entry(f"item{number:02d}", "en", duration=(number * 7) % 23) for number in range(30)]
+    entries.append(make_entry("unknown", "en"))
+    index = make_index(entries)
+
+    for low in [None, 0, 3, 10, 22, 23]:
+        for high in [None, 0, 5, 11, 22, 40]:
+            expected = {item["id"] for item in index.items
+                        if item["duration"] is not None
+                        and (low is None or item["duration"] >= low)
+                        and (high is None or item["duration"] <= high)}
+            if low is None and high is None:
+                continue
+            result = index.query(min_duration=low, max_duration=high, limit=100)
+            assert {item["id"] for item in result["items"]} == expected
+
+
+@pytest.mark.parametrize("search", ["item0", "ITEM1", "em05", "x", ".mp3", ""])
+def test_search_matches_a_scan(index, search):
+    result = index.query(search=search, limit=100)
+    expected = [item["id"] for item in index.items if search.lower() in item["name"].lower()]
+    assert [item["id"] for item in result["items"]] == expected
+    assert result["total"] == len(expected)
+
+
+def test_bits_from_positions():
+    assert library.bits_from_positions([], 10) == 0
+    assert library.bits_from_positions([0, 3, 9, 3], 10) == 0b1000001001
+
+
+class FakeCatalog:
+    def __init__(self, entries):
+        self._entries = entries
+        self.version = 1
+
+    def entries(self):
+        return list(self._entries)
+
+    def upsert(self, entry):
+        self._entries.append(entry)
+        self.version += 1
+
+
+def test_library_rebuilds_at_most_once_per_interval(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(library.time, "monotonic", lambda: now[0])
+    catalog = FakeCatalog([make_entry("first", "en")])
+    shelf = Library(catalog, "audio/", {"mp3"}, lambda name: name.split("/")[1], min_rebuild_s=30)
+
+    assert shelf.query()["total"] == 1
+    catalog.upsert(make_entry("second", "en"))
+    now[0] += 10
+    assert shelf.query()["total"] == 1
+    now[0] += 25
+    assert shelf.query()["total"] == 2
+    # An unchanged catalog keeps its index however long ago it was built
+    first = shelf.index()
+    now[0] += 100
+    assert shelf.index() is first
@@ -0,0 +1,55 @@
+"""
+Tests for the Prometheus registry in app/metrics.py.
+"""
+from app.metrics import Gauge, Registry
+
+
+def parse(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_render_metrics_and_collectors():
+    registry = Registry()
+    plays = registry.counter("plays_total", "Plays", ("path",))
+    seconds = registry.histogram("play_seconds", "Play time", buckets=(0.1, 1.0))
+    plays.inc(2, "cache")
+    seconds.observe(0.05)
+    seconds.observe(0.5)
+
+    @registry.collector
+    def collect():
+        gauge = Gauge("cache_files", "Files in the cache")
+        gauge.inc(3)
+        return [gauge]
+
+    values = parse(registry.render())
+    assert values['plays_total{path="cache"}'] == "2"
+    assert values['play_seconds_bucket{le="0.1"}'] == "1"
+    assert values['play_seconds_bucket{le="+Inf"}'] == "2"
+    assert values["play_seconds_count"] == "2"
+    assert values["cache_files"] == "3"
+
+
+def test_failing_collector_is_left_out():
+    registry = Registry()
+    registry.counter("plays_total", "Plays").inc()
+
+    @registry.collector
+    def broken():
+        gauge = Gauge("half_built", "Collected before the failure")
+        gauge.inc()
+        yield gauge
+        raise RuntimeError("pool is gone")
+
+    @registry.collector
+    def working():
+        gauge = Gauge("pool_workers", "Workers")
+        gauge.inc(4)
+        return [gauge]
+
+    text = registry.render()
+    values = parse(text)
+    # No partial output from the failing collector, and later collectors still run
+    assert "half_built" not in text
+    assert values["plays_total"] == "1"
+    assert values["pool_workers"] == "4"
@@ -0,0 +1,69 @@
+"""
+Tests for frame lookups in app/mp3_seek.py.
+"""
+import struct
+
+import pytest
+
+from app.mp3_seek import HEADER, MAGIC, FORMAT_VERSION, SeekTable, extract_window
+
+FRAME_BYTES = 100
+
+
+def make_table(frame_count, sample_rate=48000, samples_per_frame=1152, priming=0):
+    # At 48 kHz a 1152-sample frame lasts exactly 24 ms
+    offsets = [frame * FRAME_BYTES for frame in range(frame_count + 1)]
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 2, sample_rate, samples_per_frame, 0,
+                         priming, frame_count, 1)
+    return SeekTable(header + struct.pack(f"<{len(offsets)}I", *offsets))
+
+
+@pytest.mark.parametrize("start_ms, end_ms, expected", [
+    (0, None, (0, 10)),
+    (0, 24, (0, 1)),
+    (0, 25, (0, 2)),
+    (24, 48, (0, 2)),
+    (48, 49, (1, 3)),
+    (100, 1000, (3, 10)),
+    (240, None, (9, 10)),
+    (1000, None, (10, 10)),
+    (1000, 2000, (10, 10)),
+])
+def test_frame_window(start_ms, end_ms, expected):
+    # The window starts one frame early for the bit reservoir
+    assert make_table(10).frame_window(start_ms, end_ms) == expected
+
+
+def test_frame_window_with_priming():
+    table = make_table(10, priming=576)
+    assert table.frame_window(0, 48) == (0, 3)
+    assert table.frame_window(48) == (1, 10)
+
+
+def test_byte_range():
+    table = make_table(10)
+    assert table.byte_range(48, 49) == (100, 300)
+    assert table.byte_range(0) == (0, 1000)
+    assert table.duration_ms == 240
+
+
+def test_extract_window():
+    table = make_table(10)
+    reads = []
+
+    def read_range(start, end):
+        reads.append((start, end))
+        return b"x" * (end - start)
+
+    assert extract_window(table, read_range, 1000) == b""
+    assert reads == []
+    assert extract_window(table, read_range, 48, 49) == b"x" * 200
+    assert reads == [(100, 300)]
+
+
+def test_rejects_bad_tables():
+    with pytest.raises(ValueError):
+        SeekTable(b"HSEK")
+    header = HEADER.pack(b"XXXX", FORMAT_VERSION, 2, 48000, 1152, 0, 0, 0, 1)
+    with pytest.raises(ValueError):
+        SeekTable(header + struct.pack("<I", 0))
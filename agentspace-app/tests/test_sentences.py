@@ -0,0 +1,79 @@
+"""
+Tests for time lookups in app/sentences.py.
+"""
+import json
+
+import pytest
+
+from app.sentences import SentenceTable
+
+
+def make_table(starts, ends, texts, version=1):
+    offsets = [0]
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+    return SentenceTable(json.dumps({
+        "version": version,
+        "language": "en",
+        "source_generation": 1,
+        "starts_ms": starts,
+        "ends_ms": ends,
+        "text": "".join(texts),
+        "text_offsets": offsets,
+    }))
+
+
+@pytest.fixture
+def table():
+    # Sentences at [0, 900), [1000, 2000) and [2500, 4000), with gaps between
+    return make_table([0, 1000, 2500], [900, 2000, 4000], ["One. ", "Two. ", "Three."])
+
+
+@pytest.mark.parametrize("start_ms, end_ms, expected", [
+    (0, None, [0, 1, 2]),
+    (-500, None, [0, 1, 2]),
+    (0, 1, [0]),
+    (-100, 0, []),
+    (899, 900, [0]),
+    (900, 1000, []),
+    (900, 1001, [1]),
+    (950, 2600, [1, 2]),
+    (1999, 2000, [1]),
+    (2000, 2500, []),
+    (3999, None, [2]),
+    (4000, None, []),
+    (5000, 6000, []),
+])
+def test_window(table, start_ms, end_ms, expected):
+    assert list(table.window(start_ms, end_ms)) == expected
+
+
+@pytest.mark.parametrize("time_ms, expected", [
+    (-1, None),
+    (0, 0),
+    (899, 0),
+    (900, None),
+    (1000, 1),
+    (2000, None),
+    (2500, 2),
+    (3999, 2),
+    (4000, None),
+])
+def test_index_at(table, time_ms, expected):
+    assert table.index_at(time_ms) == expected
+
+
+def test_sentence(table):
+    assert table.sentence(2) == {"index": 2, "start": 2.5, "end": 4.0, "text": "Three."}
+
+
+def test_empty_table():
+    table = make_table([], [], [])
+    assert len(table) == 0
+    assert list(table.window(0)) == []
+    assert table.index_at(0) is None
+
+
+def test_rejects_other_versions():
+    with pytest.raises(ValueError):
+        make_table([0], [1], ["a"], version=2)
@@ -0,0 +1,210 @@
+"""
+Tests for request coalescing in app/singleflight.py.
+"""
+import asyncio
+
+import pytest
+
+from app.executor import ClientDisconnected
+from app.singleflight import SingleFlight, SharedStream
+
+
+def make_reader(chunks, gate=None, error=None):
+    """Return a read coroutine yielding chunks, waiting on gate before each one."""
+    chunks = list(chunks)
+
+    async def read():
+        if gate is not None:
+            await gate.get()
+        if chunks:
+            return chunks.pop(0)
+        if error is not None:
+            raise error
+        return b""
+    return read
+
+
+async def drain(subscription):
+    return [chunk async for chunk in subscription]
+
+
+def test_late_subscriber_replays_from_start():
+    async def scenario():
+        gate = asyncio.Queue()
+        closed = []
+        completed = []
+
+        async def on_complete(body):
+            completed.append(body)
+
+        shared = SharedStream(make_reader([b"a", b"b", b"c"], gate), lambda: closed.append(True),
+                              replay_limit=100, on_complete=on_complete)
+        first = shared.subscribe()
+        first_chunks = asyncio.ensure_future(drain(first))
+        gate.put_nowait(None)
+        gate.put_nowait(None)
+        while shared.size < 2:
+            await asyncio.sleep(0)
+
+        assert shared.joinable
+        second = asyncio.ensure_future(drain(shared.subscribe()))
+        for _ in range(2):
+            gate.put_nowait(None)
+        assert await first_chunks == [b"a", b"b", b"c"]
+        assert await second == [b"a", b"b", b"c"]
+        await shared._task
+        assert closed == [True]
+        assert completed == [b"abc"]
+        assert not shared.joinable
+
+    asyncio.run(scenario())
+
+
+def test_stream_past_replay_limit_stops_accepting_subscribers():
+    async def scenario():
+        unjoinable = []
+        completed = []
+
+        async def on_complete(body):
+            completed.append(body)
+
+        shared = SharedStream(make_reader([b"12345", b"67890"]), lambda: None,
+                              replay_limit=6, on_complete=on_complete)
+        shared.on_unjoinable(lambda: unjoinable.append(True))
+        assert await drain(shared.subscribe()) == [b"12345", b"67890"]
+        await shared._task
+        assert unjoinable == [True]
+        # The body was not kept whole, so nothing is cached
+        assert completed == []
+        assert shared._chunks == []
+
+    asyncio.run(scenario())
+
+
+def test_producer_error_reaches_every_subscriber():
+    async def scenario():
+        closed = []
+        shared = SharedStream(make_reader([b"a"], error=ValueError("decode failed")),
+                              lambda: closed.append(True), replay_limit=100)
+        subscriptions = [shared.subscribe(), shared.subscribe()]
+        for subscription in subscriptions:
+            chunks = []
+            with pytest.raises(ValueError, match="decode failed"):
+                async for chunk in subscription:
+                    chunks.append(chunk)
+            assert chunks == [b"a"]
+        assert closed == [True]
+
+    asyncio.run(scenario())
+
+
+def test_last_subscriber_leaving_cancels_producer():
+    async def scenario():
+        gate = asyncio.Queue()
+        closed = []
+        shared = SharedStream(make_reader([b"a", b"b"], gate), lambda: closed.append(True), replay_limit=100)
+        subscription = shared.subscribe()
+        await asyncio.sleep(0)
+        subscription.close()
+        await asyncio.gather(shared._task, return_exceptions=True)
+        assert isinstance(shared.error, ClientDisconnected)
+        assert closed == [True]
+
+    asyncio.run(scenario())
+
+
+def test_stream_coalesces_and_reopens_after_leader_error():
+    async def scenario():
+        flight = SingleFlight("test")
+        opened = []
+        release = asyncio.Event()
+
+        async def failing_open():
+            opened.append("failing")
+            await release.wait()
+            raise ValueError("source missing")
+
+        async def working_open():
+            opened.append("working")
+            return SharedStream(make_reader([b"ok"]), lambda: None, replay_limit=100)
+
+        leader = asyncio.ensure_future(flight.stream("key", failing_open))
+        await asyncio.sleep(0)
+        # A caller arriving while the leader opens waits for it, then opens its own stream
+        follower = asyncio.ensure_future(flight.stream("key", working_open))
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(ValueError):
+            await leader
+        assert await drain(await follower) == [b"ok"]
+        assert opened == ["failing", "working"]
+
+        # A caller arriving while the stream is open joins it
+        gate = asyncio.Queue()
+
+        async def gated_open():
+            opened.append("gated")
+            return SharedStream(make_reader([b"ok"], gate), lambda: None, replay_limit=100)
+
+        subscription = await flight.stream("other", gated_open)
+        joined = await flight.stream("other", gated_open)
+        assert flight.streaming("other")
+        gate.put_nowait(None)
+        gate.put_nowait(None)
+        assert await drain(subscription) == [b"ok"]
+        assert await drain(joined) == [b"ok"]
+        assert opened == ["failing", "working", "gated"]
+        assert flight.stats()["collapsed"] == 1
+        assert not flight.streaming("other")
+
+    asyncio.run(scenario())
+
+
+def test_do_async_retries_after_leader_disconnects():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+        release = asyncio.Event()
+
+        async def leader_work():
+            calls.append("leader")
+            await release.wait()
+            raise ClientDisconnected("leader left")
+
+        async def follower_work():
+            calls.append("follower")
+            return "result"
+
+        leader = asyncio.ensure_future(flight.do_async("key", leader_work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("key", follower_work))
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(ClientDisconnected):
+            await leader
+        assert await follower == "result"
+        assert calls == ["leader", "follower"]
+
+    asyncio.run(scenario())
+
+
+def test_do_async_shares_work_errors():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+        release = asyncio.Event()
+
+        async def work():
+            calls.append(True)
+            await release.wait()
+            raise ValueError("download failed")
+
+        tasks = [asyncio.ensure_future(flight.do_async("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert calls == [True]
+        assert not flight.in_flight("key")
+
+    asyncio.run(scenario())
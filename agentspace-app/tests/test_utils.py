@@ -0,0 +1,168 @@
+"""
+Tests for the lookup and caching helpers in app/utils.py.
+"""
+import json
+import sys
+import threading
+
+import pytest
+
+from app import utils
+from app.catalog import Catalog
+
+
+@pytest.mark.parametrize("kwargs, expected", [
+    ({}, (0, None, 1.0, 1, 0)),
+    ({"start_time": 1.2344, "end_time": 2.5}, (1234, 2500, 1.0, 1, 0)),
+    ({"start_time": -1, "end_time": -2}, (0, 0, 1.0, 1, 0)),
+    ({"speed": 0.76}, (0, None, 0.8, 1, 0)),
+    ({"speed": 9}, (0, None, 2.0, 1, 0)),
+    ({"speed": 0.1}, (0, None, 0.5, 1, 0)),
+    ({"repeat": True}, (0, None, 1.0, 3, 0)),
+    ({"repeat": True, "repeat_count": 50, "gap": 9}, (0, None, 1.0, 10, 5000)),
+    ({"repeat": True, "repeat_count": 1, "gap": 1}, (0, None, 1.0, 1, 0)),
+    ({"repeat_count": 5, "gap": 1}, (0, None, 1.0, 1, 0)),
+])
+def test_normalize_playback_params(kwargs, expected):
+    params = utils.normalize_playback_params(**kwargs)
+    assert tuple(params[name] for name in ("start_ms", "end_ms", "speed", "repeat_count", "gap_ms")) == expected
+
+
+@pytest.mark.parametrize("accept, requested, repeating, expected", [
+    (None, None, False, "mp3"),
+    ("audio/ogg", None, False, "opus"),
+    ("audio/webm, audio/mpeg;q=0.5", None, False, "webm"),
+    ("audio/ogg", None, True, "mp3"),
+    ("audio/aac", None, True, "aac"),
+    ("audio/ogg", "aac", False, "aac"),
+    (None, "opus", True, "aac"),
+])
+def test_negotiate_output(accept, requested, repeating, expected):
+    assert utils.negotiate_output(accept, requested, repeating=repeating).name == expected
+
+
+def test_negotiate_output_rejects_unknown_formats():
+    with pytest.raises(ValueError):
+        utils.negotiate_output(None, "flac")
+    with pytest.raises(ValueError):
+        utils.negotiate_output(None, "mp3", "lossless")
+
+
+def test_load_ingest_index_under_concurrent_eviction(monkeypatch, tmp_path):
+    path = tmp_path / "index.bin"
+    path.write_bytes(b"index")
+    monkeypatch.setattr(utils, "fetch_source_file", lambda entry: str(path))
+    monkeypatch.setattr(utils, "INGEST_INDEX_CACHE_SIZE", 2)
+    monkeypatch.setattr(utils, "ingest_indexes", utils.OrderedDict())
+    errors = []
+
+    def load(worker):
+        try:
+            for round_number in range(2000):
+                # Few keys over a tiny cache, so hits race with evictions
+                entry = {"name": f"audio/en/{(worker + round_number) % 4}.seek", "generation": 1}
+                assert utils.load_ingest_index(entry, bytes) == b"index"
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=load, args=(worker,)) for worker in range(8)]
+    # Switch threads as often as possible to hit the window between lookup and reorder
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert len(utils.ingest_indexes) <= 2
+
+
+@pytest.mark.parametrize("source_generation, served", [(5, True), (4, False), (0, False)])
+def test_get_sentence_table_checks_generation(monkeypatch, tmp_path, source_generation, served):
+    path = tmp_path / "sentences.json"
+    path.write_text(json.dumps({
+        "version": 1, "language": "en", "source_generation": source_generation,
+        "starts_ms": [0], "ends_ms": [1000], "text": "One.", "text_offsets": [0, 4],
+    }))
+    entries = Catalog()
+    entries.upsert({"name": "audio/en/a.mp3.sentences.en.json", "generation": 7})
+    monkeypatch.setattr(utils, "get_catalog", lambda: entries)
+    monkeypatch.setattr(utils, "fetch_source_file", lambda entry: str(path))
+    monkeypatch.setattr(utils, "ingest_indexes", utils.OrderedDict())
+    metadata = {"name": "audio/en/a.mp3", "generation": "5"}
+
+    # An unstamped table is as stale as one from another generation
+    assert (utils.get_sentence_table(metadata, "en") is not None) == served
+    assert (utils.loaded_sentence_table(metadata, "en") is not None) == served
+
+
+@pytest.mark.parametrize("blobs, source_generation, served", [
+    (("manifest", "segments"), 5, True),
+    (("manifest", "segments"), 4, False),
+    (("manifest", "segments"), None, False),
+    (("manifest",), 5, False),
+    ((), 5, False),
+])
+def test_get_segment_manifest_falls_back_when_missing_or_stale(monkeypatch, tmp_path, blobs, source_generation, served):
+    path = tmp_path / "segments.json"
+    manifest = {"version": 1, "segments": []}
+    if source_generation is not None:
+        manifest["source_generation"] = source_generation
+    path.write_text(json.dumps(manifest))
+    entries = Catalog()
+    if "manifest" in blobs:
+        entries.upsert({"name": "audio/en/a.mp3.segments.json", "generation": 7})
+    if "segments" in blobs:
+        entries.upsert({"name": "audio/en/a.mp3.segments.aac", "generation": 7})
+    monkeypatch.setattr(utils, "get_catalog", lambda: entries)
+    monkeypatch.setattr(utils, "fetch_source_file", lambda entry: str(path))
+    monkeypatch.setattr(utils, "ingest_indexes", utils.OrderedDict())
+
+    found = utils.get_segment_manifest({"name": "audio/en/a.mp3", "generation": "5"})
+    assert (found is not None) == served
+    if served:
+        assert found[1]["name"] == "audio/en/a.mp3.segments.aac"
+
+
+class FakeBackend:
+    def __init__(self, entries):
+        self.entries = entries
+        self.listed = []
+
+    def list(self, prefix="", limit=None):
+        self.listed.append(prefix)
+        return [entry for entry in self.entries if entry["name"].startswith(prefix)][:limit]
+
+    def uri(self, name):
+        return f"memory://bucket/{name}"
+
+
+def blob(name, generation=1):
+    return {"name": name, "size": 10, "generation": generation, "updated": None,
+            "content_type": "audio/mpeg", "md5_hash": None, "metadata": None}
+
+
+def test_get_audio_file_falls_back_to_storage_on_a_catalog_miss(monkeypatch):
+    entries = Catalog()
+    entries.upsert(blob("audio/en/old.mp3"))
+    backend = FakeBackend([blob("audio/en/old.mp3"), blob("audio/en/new.mp3", 2)])
+    monkeypatch.setattr(utils, "get_catalog", lambda: entries)
+    monkeypatch.setattr(utils, "storage_backend", backend)
+    monkeypatch.setattr(utils, "ensure_storage", lambda: None)
+    monkeypatch.setenv("DEBUG", "false")
+
+    assert utils.get_audio_file("en/old.mp3")["name"] == "audio/en/old.mp3"
+    assert backend.listed == []
+
+    # A blob uploaded after the last refresh is listed once, then served from the catalog
+    metadata = utils.get_audio_file("en/new")
+    assert (metadata["name"], metadata["generation"]) == ("audio/en/new.mp3", 2)
+    assert entries.get("audio/en/new.mp3") is not None
+    utils.get_audio_file("en/new")
+    assert backend.listed == ["audio/en/new"]
+
+    with pytest.raises(ValueError):
+        utils.get_audio_file("en/missing")
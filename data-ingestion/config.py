@@ -1,6 +1,7 @@
 """
 Configuration for the data ingestion module.
 """
+import os
 
 # Google Cloud Storage configuration
 GCS_CONFIG = {
@@ -8,6 +9,29 @@ GCS_CONFIG = {
     "project_id": "hippoapp-gcp",
 }
 
+# Storage backend: "gcs", or "local"/"memory" to ingest into files under
+# local_root for offline runs (see agentspace-app/app/storage_backends.py).
+# Latency and bandwidth limits emulate a remote bucket (0 disables them).
+STORAGE_CONFIG = {
+    "backend": os.environ.get("STORAGE_BACKEND", "gcs"),
+    "local_root": os.environ.get("STORAGE_LOCAL_ROOT"),
+    "latency_ms": float(os.environ.get("STORAGE_LATENCY_MS", 0)),
+    "bandwidth_bytes": int(os.environ.get("STORAGE_BANDWIDTH_BYTES", 0)),
+}
+
+# Shared GCS client (see agentspace-app/app/gcs_client.py), one per process
+GCS_CLIENT_CONFIG = {
+    "pool_size": int(os.environ.get("GCS_POOL_SIZE", 8)),
+    "keepalive_s": int(os.environ.get("GCS_KEEPALIVE_S", 60)),
+    "connect_timeout": float(os.environ.get("GCS_CONNECT_TIMEOUT", 10)),
+    "read_timeout": float(os.environ.get("GCS_READ_TIMEOUT", 300)),  # Large uploads
+    "retry_initial": 1.0,
+    "retry_maximum": 30.0,
+    "retry_multiplier": 2.0,
+    "retry_deadline": float(os.environ.get("GCS_RETRY_DEADLINE", 600)),
+    "refresh_timeout": 30,
+}
+
 # Google Cloud Speech-to-Text configuration
 SPEECH_TO_TEXT_CONFIG = {
     "audio_encoding": "LINEAR16",
@@ -41,6 +65,14 @@ AUDIO_PROCESSING_CONFIG = {
     "temp_directory": "/tmp/hippoapp-audio",
 }
 
+# Pre-segmented playback audio produced at ingest
+SEGMENT_CONFIG = {
+    "segment_seconds": 2.0,
+    "bitrate": "96k",
+    "sample_rate": 44100,
+    "priming_samples": 1024,  # Encoder delay of ffmpeg's AAC encoder
+}
+
 # Metadata schema
 METADATA_SCHEMA = {
     "required_fields": [
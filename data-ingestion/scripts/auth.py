@@ -2,9 +2,10 @@
 Authentication utilities for Google Cloud Platform services.
 """
 import os
-from google.cloud import storage, speech, translate_v2, firestore
+from google.cloud import speech, translate_v2, firestore
 from google.oauth2 import service_account
 import logging
+from storage_backend import get_storage_client, pool_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -61,9 +62,9 @@ def test_gcp_services():
     
     # Test Storage
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         buckets = list(storage_client.list_buckets(max_results=1))
-        services_status["storage"] = "Connected"
+        services_status["storage"] = f"Connected (connection pool: {pool_stats()})"
     except Exception as e:
         services_status["storage"] = f"Failed: {str(e)}"
     
@@ -9,12 +9,12 @@ import sys
 import librosa
 import soundfile as sf
 from pydub import AudioSegment
-from google.cloud import storage
 import tempfile
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 from config import METADATA_SCHEMA, AUDIO_PROCESSING_CONFIG, GCS_CONFIG
+from storage_backend import get_backend, parse_gcs_uri
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -22,7 +22,7 @@ logger = logging.getLogger(__name__)
 
 def download_from_gcs(gcs_uri, local_path=None):
     """
-    Download a file from Google Cloud Storage.
+    Download a file from the configured storage backend.
     
     Args:
         gcs_uri (str): GCS URI of the file to download
@@ -37,13 +37,7 @@ def download_from_gcs(gcs_uri, local_path=None):
     
     try:
         # Parse bucket and blob names
-        bucket_name = gcs_uri.split("/")[2]
-        blob_name = "/".join(gcs_uri.split("/")[3:])
-        
-        # Create storage client
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
+        bucket_name, blob_name = parse_gcs_uri(gcs_uri)
         
         # Create temporary file if local path not provided
         if local_path is None:
@@ -52,7 +46,7 @@ def download_from_gcs(gcs_uri, local_path=None):
             local_path = os.path.join(temp_dir, file_name)
         
         # Download file
-        blob.download_to_filename(local_path)
+        get_backend(bucket_name).download(blob_name, local_path)
         logger.info(f"Downloaded {gcs_uri} to {local_path}")
         
         return local_path
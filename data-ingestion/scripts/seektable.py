@@ -0,0 +1,289 @@
+"""
+MP3 frame seek tables for stream-copy clip extraction.
+
+A seek table lists the byte offset of every audio frame of an MP3 file.
+Every Layer III frame of a file covers the same number of samples, so the
+frame index gives the timestamp and the playback side can turn a time
+range into a byte range, fetch it with a ranged read and return the frames
+as they are, without decoding or re-encoding. Offsets are recorded frame
+by frame, so VBR files need no bitrate assumptions; a Xing/Info or VBRI
+header frame is left out of the table and the encoder delay from its LAME
+tag is recorded so timestamps line up with decoded output.
+
+The table is stored next to the original as ``<blob>.seek``::
+
+    magic "HSEK" | version u16 | channels u16 | sample rate u32
+    | samples per frame u16 | reserved u16 | priming samples u32
+    | frame count u32 | source generation u64
+    | (frame count + 1) u32 byte offsets, the last one marking the end of audio
+"""
+import struct
+import logging
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import GCS_CONFIG
+from storage_backend import get_backend, get_blob_generation
+# The format constants are shared with the reader in agentspace-app, which
+# storage_backend puts on the path
+from app.mp3_seek import MAGIC, FORMAT_VERSION, HEADER, MPEG_SAMPLE_RATES as SAMPLE_RATES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Layer III bitrates in kbit/s by bitrate index
+MPEG1_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG2_BITRATES = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+# Delay of the MP3 decoder itself, added to the encoder delay from the LAME tag
+DECODER_DELAY = 529
+
+
+def parse_frame_header(data, offset):
+    """
+    Parse the MPEG audio Layer III frame header at an offset.
+
+    Args:
+        data (bytes): MP3 data
+        offset (int): Position of the candidate header
+
+    Returns:
+        dict: version, sample_rate, channels, samples_per_frame and length,
+            or None if there is no valid header at the offset
+    """
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[offset + 1] >> 3) & 0x03
+    layer = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    rate_index = (data[offset + 2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    padding = (data[offset + 2] >> 1) & 0x01
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    if version == 3:
+        bitrate = MPEG1_BITRATES[bitrate_index] * 1000
+        length = 144 * bitrate // sample_rate + padding
+        samples_per_frame = 1152
+    else:
+        bitrate = MPEG2_BITRATES[bitrate_index] * 1000
+        length = 72 * bitrate // sample_rate + padding
+        samples_per_frame = 576
+
+    return {
+        "version": version,
+        "sample_rate": sample_rate,
+        "channels": 1 if (data[offset + 3] >> 6) == 3 else 2,
+        "samples_per_frame": samples_per_frame,
+        "length": length,
+    }
+
+
+def skip_id3v2(data):
+    """Return the offset of the first byte after a leading ID3v2 tag."""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def parse_info_frame(data, offset, header):
+    """
+    Check whether a frame is a Xing/Info or VBRI header rather than audio.
+
+    Args:
+        data (bytes): MP3 data
+        offset (int): Position of the frame
+        header (dict): Parsed frame header
+
+    Returns:
+        tuple: (is_info_frame, encoder_delay or None)
+    """
+    if header["version"] == 3:
+        side_info = 17 if header["channels"] == 1 else 32
+    else:
+        side_info = 9 if header["channels"] == 1 else 17
+
+    if data[offset + 36:offset + 40] == b"VBRI":
+        return True, None
+
+    tag = offset + 4 + side_info
+    if data[tag:tag + 4] not in (b"Xing", b"Info"):
+        return False, None
+
+    flags = struct.unpack(">I", data[tag + 4:tag + 8])[0]
+    position = tag + 8
+    if flags & 0x01:
+        position += 4  # Frame count
+    if flags & 0x02:
+        position += 4  # Byte count
+    if flags & 0x04:
+        position += 100  # TOC
+    if flags & 0x08:
+        position += 4  # Quality
+
+    # LAME extension: 9-byte encoder string, then delay/padding at +21
+    lame = data[position:position + 24]
+    if len(lame) == 24 and lame[:4] in (b"LAME", b"Lavc", b"Lavf"):
+        return True, (lame[21] << 4) | (lame[22] >> 4)
+    return True, None
+
+
+def parse_mp3_frames(data):
+    """
+    Locate the audio frames of an MP3 file.
+
+    Junk between frames is skipped by resynchronising on the next pair of
+    consecutive valid headers; a trailing ID3v1 or APE tag ends the scan.
+
+    Args:
+        data (bytes): MP3 file contents
+
+    Returns:
+        tuple: (list of frame offsets plus the end offset, stream info dict)
+    """
+    offset = skip_id3v2(data)
+    offsets = []
+    end = offset
+    info = None
+    priming = 0
+
+    while offset + 4 <= len(data):
+        header = parse_frame_header(data, offset)
+        if header is None or (info is not None and (
+                header["sample_rate"] != info["sample_rate"]
+                or header["samples_per_frame"] != info["samples_per_frame"])):
+            if data[offset:offset + 3] == b"TAG" or data[offset:offset + 8] == b"APETAGEX":
+                break
+            offset += 1
+            continue
+
+        following = parse_frame_header(data, offset + header["length"])
+        if following is None and offset + header["length"] < len(data) - 128:
+            # A lone sync pattern inside junk, not a real frame
+            offset += 1
+            continue
+
+        if info is None:
+            info = header
+            is_info, encoder_delay = parse_info_frame(data, offset, header)
+            if encoder_delay is not None:
+                priming = encoder_delay + DECODER_DELAY
+            if is_info:
+                offset += header["length"]
+                continue
+
+        if offset + header["length"] > len(data):
+            break
+        offsets.append(offset)
+        offset += header["length"]
+        end = offset
+
+    if info is None:
+        raise ValueError("No MPEG audio Layer III frames found")
+    offsets.append(end)
+    info = dict(info, priming_samples=priming)
+    return offsets, info
+
+
+def build_seek_table(audio_file_path, source_generation=None):
+    """
+    Build the seek table of a local MP3 file.
+
+    Args:
+        audio_file_path (str): Path to the MP3 file
+        source_generation (int, optional): Generation of the source blob
+
+    Returns:
+        bytes: Encoded seek table
+    """
+    with open(audio_file_path, "rb") as f:
+        data = f.read()
+    offsets, info = parse_mp3_frames(data)
+
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        info["channels"],
+        info["sample_rate"],
+        info["samples_per_frame"],
+        0,
+        info["priming_samples"],
+        len(offsets) - 1,
+        source_generation or 0
+    )
+    table = header + struct.pack(f"<{len(offsets)}I", *offsets)
+
+    duration = (len(offsets) - 1) * info["samples_per_frame"] / info["sample_rate"]
+    logger.info(f"Indexed {len(offsets) - 1} frames ({duration:.1f}s) of {audio_file_path}")
+    return table
+
+
+def upload_seek_table(table, blob_name, bucket_name=None):
+    """
+    Upload a seek table next to the original blob.
+
+    The app only serves a table whose source generation matches the
+    original blob, so a table built without one is refused.
+
+    Args:
+        table (bytes): Encoded seek table
+        blob_name (str): Name of the original blob, e.g. "audio/en/lesson1.mp3"
+        bucket_name (str, optional): GCS bucket name. Defaults to config value.
+
+    Returns:
+        str: GCS URI of the seek table
+    """
+    if bucket_name is None:
+        bucket_name = GCS_CONFIG["bucket_name"]
+
+    if not HEADER.unpack_from(table)[-1]:
+        logger.error(f"Seek table for {blob_name} has no source generation, not uploading it")
+        return None
+
+    try:
+        backend = get_backend(bucket_name)
+        backend.put(f"{blob_name}.seek", table, content_type="application/octet-stream")
+
+        gcs_uri = backend.uri(f"{blob_name}.seek")
+        logger.info(f"Seek table for {blob_name} uploaded to {gcs_uri}")
+        return gcs_uri
+    except Exception as e:
+        logger.error(f"Error uploading seek table to GCS: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build MP3 frame seek tables for stream-copy playback")
+    parser.add_argument("audio_file", help="Path to the local MP3 file")
+    parser.add_argument("--blob", "-b", help="Name of the original blob in the bucket; uploads the table next to it")
+    parser.add_argument("--generation", "-g", type=int,
+                        help="Generation of the original blob; read from the bucket when --blob is given")
+    parser.add_argument("--output", "-o", help="Write the table to this file")
+
+    args = parser.parse_args()
+
+    generation = args.generation
+    if args.blob and not generation:
+        generation = get_blob_generation(args.blob)
+        if not generation:
+            logger.error(f"Could not read the generation of {args.blob}; upload the original first")
+            sys.exit(1)
+
+    table = build_seek_table(args.audio_file, source_generation=generation)
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(table)
+    if args.blob:
+        if upload_seek_table(table, args.blob) is None:
+            sys.exit(1)
+    elif not args.output:
+        print(f"Seek table: {len(table)} bytes (use --output or --blob to store it)")
@@ -0,0 +1,217 @@
+"""
+Pre-segmentation of audio files for stitched playback.
+
+Each source file is encoded once to AAC in an ADTS stream and split into
+fixed-duration segments of whole AAC frames. ADTS frames carry their own
+headers, so every segment is independently decodable and a time range can
+be served by concatenating the covering segments and trimming whole frames
+at the edges, without re-encoding.
+
+The segments are stored packed, in frame order, in one blob next to the
+original (``<blob>.segments.aac``). A JSON manifest (``<blob>.segments.json``)
+records the byte range and frame count of every segment, so the playback
+side can fetch just the covering segments with a ranged read.
+"""
+import os
+import json
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+import sys
+from pydub import AudioSegment
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import GCS_CONFIG, SEGMENT_CONFIG
+from storage_backend import get_backend, get_blob_generation
+# The ADTS parser is shared with the playback side in agentspace-app, which
+# storage_backend puts on the path
+from app.segments import adts_frame_offsets, adts_stream_info
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# AAC-LC frames always hold 1024 samples per channel
+SAMPLES_PER_FRAME = 1024
+
+def encode_adts(audio_file_path, output_path, bitrate=None, sample_rate=None):
+    """
+    Encode an audio file to an AAC ADTS stream with ffmpeg.
+
+    Args:
+        audio_file_path (str): Path to the source audio file
+        output_path (str): Path of the ADTS file to write
+        bitrate (str, optional): Target bitrate, e.g. "96k"
+        sample_rate (int, optional): Output sample rate
+
+    Returns:
+        str: Path to the ADTS file
+    """
+    command = [
+        AudioSegment.converter, "-nostdin", "-v", "error", "-y",
+        "-i", audio_file_path, "-vn",
+        "-c:a", "aac",
+        "-b:a", bitrate or SEGMENT_CONFIG["bitrate"],
+        "-ar", str(sample_rate or SEGMENT_CONFIG["sample_rate"]),
+        "-f", "adts", output_path
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return output_path
+
+
+def build_segment_manifest(adts_path, segment_seconds=None, source_generation=None):
+    """
+    Split an ADTS stream into fixed-duration segments of whole frames.
+
+    Args:
+        adts_path (str): Path to the ADTS file
+        segment_seconds (float, optional): Target segment duration
+        source_generation (int, optional): Generation of the source blob
+
+    Returns:
+        dict: Segment manifest
+    """
+    if segment_seconds is None:
+        segment_seconds = SEGMENT_CONFIG["segment_seconds"]
+
+    with open(adts_path, "rb") as f:
+        data = f.read()
+    offsets = adts_frame_offsets(data)
+    total_frames = len(offsets) - 1
+    if total_frames < 1:
+        raise ValueError(f"No ADTS frames in {adts_path}")
+    sample_rate, channels = adts_stream_info(data)
+
+    segment_frames = max(1, round(segment_seconds * sample_rate / SAMPLES_PER_FRAME))
+    segments = []
+    for first in range(0, total_frames, segment_frames):
+        offset = offsets[first]
+        end = offsets[min(first + segment_frames, total_frames)]
+        segments.append([offset, end - offset])
+
+    return {
+        "version": MANIFEST_VERSION,
+        "codec": "aac",
+        "container": "adts",
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "samples_per_frame": SAMPLES_PER_FRAME,
+        # ffmpeg's AAC encoder emits one frame of encoder delay
+        "priming_samples": SEGMENT_CONFIG["priming_samples"],
+        "segment_frames": segment_frames,
+        "segment_duration": segment_frames * SAMPLES_PER_FRAME / sample_rate,
+        "total_frames": total_frames,
+        "total_bytes": len(data),
+        "source_generation": source_generation,
+        "segments": segments,
+    }
+
+
+def segment_audio_file(audio_file_path, output_dir=None, segment_seconds=None, source_generation=None):
+    """
+    Encode and segment an audio file.
+
+    Args:
+        audio_file_path (str): Path to the source audio file
+        output_dir (str, optional): Directory for the outputs
+        segment_seconds (float, optional): Target segment duration
+        source_generation (int, optional): Generation of the source blob
+
+    Returns:
+        tuple: (path to the packed segments file, path to the manifest)
+    """
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp()
+    os.makedirs(output_dir, exist_ok=True)
+
+    base_name = os.path.basename(audio_file_path)
+    segments_path = os.path.join(output_dir, f"{base_name}.segments.aac")
+    manifest_path = os.path.join(output_dir, f"{base_name}.segments.json")
+
+    encode_adts(audio_file_path, segments_path)
+    manifest = build_segment_manifest(segments_path, segment_seconds, source_generation)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+
+    logger.info(
+        f"Segmented {audio_file_path} into {len(manifest['segments'])} segments "
+        f"of {manifest['segment_duration']:.3f}s"
+    )
+    return segments_path, manifest_path
+
+
+def upload_segments(segments_path, manifest_path, blob_name, bucket_name=None):
+    """
+    Upload segments and manifest next to the original blob.
+
+    The packed segments are uploaded first so a manifest is never visible
+    without its data. The app only serves segments whose manifest names the
+    generation of the original blob, so a manifest without one is refused.
+
+    Args:
+        segments_path (str): Path to the packed segments file
+        manifest_path (str): Path to the manifest
+        blob_name (str): Name of the original blob, e.g. "audio/en/lesson1.mp3"
+        bucket_name (str, optional): GCS bucket name. Defaults to config value.
+
+    Returns:
+        str: GCS URI of the manifest
+    """
+    if bucket_name is None:
+        bucket_name = GCS_CONFIG["bucket_name"]
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        if not json.load(f).get("source_generation"):
+            logger.error(f"Segment manifest for {blob_name} has no source generation, not uploading it")
+            return None
+
+    try:
+        backend = get_backend(bucket_name)
+        backend.put_file(f"{blob_name}.segments.aac", segments_path, content_type="audio/aac")
+        backend.put_file(f"{blob_name}.segments.json", manifest_path, content_type="application/json")
+
+        gcs_uri = backend.uri(f"{blob_name}.segments.json")
+        logger.info(f"Segments for {blob_name} uploaded to {gcs_uri}")
+        return gcs_uri
+    except Exception as e:
+        logger.error(f"Error uploading segments to GCS: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-segment audio files for stitched playback")
+    parser.add_argument("audio_file", help="Path to the local audio file")
+    parser.add_argument("--blob", "-b", help="Name of the original blob in the bucket; uploads the segments next to it")
+    parser.add_argument("--generation", "-g", type=int,
+                        help="Generation of the original blob; read from the bucket when --blob is given")
+    parser.add_argument("--output-dir", "-o", help="Directory for the segments and manifest")
+    parser.add_argument("--segment-seconds", "-s", type=float, help="Target segment duration in seconds")
+
+    args = parser.parse_args()
+
+    generation = args.generation
+    if args.blob and not generation:
+        generation = get_blob_generation(args.blob)
+        if not generation:
+            logger.error(f"Could not read the generation of {args.blob}; upload the original first")
+            sys.exit(1)
+
+    segments_path, manifest_path = segment_audio_file(
+        args.audio_file,
+        output_dir=args.output_dir,
+        segment_seconds=args.segment_seconds,
+        source_generation=generation
+    )
+
+    if args.blob:
+        if upload_segments(segments_path, manifest_path, args.blob) is None:
+            sys.exit(1)
+    else:
+        print(f"Segments: {segments_path}")
+        print(f"Manifest: {manifest_path}")
@@ -0,0 +1,210 @@
+"""
+Time-indexed sentence tables for the sentence API.
+
+Builds the per-language sentence table of an audio file from the word
+timings of a transcription (as written by transcribe.py) and stores it
+next to the original as ``<blob>.sentences.<lang>.json``::
+
+    {"version": 1, "language": "en", "source_generation": 1712345678901234,
+     "starts_ms": [...], "ends_ms": [...],
+     "text": "all sentences concatenated", "text_offsets": [...]}
+
+Offsets and text are kept as flat arrays and one string table so the app
+can load a long transcript into arrays and answer "sentence at time t"
+with a binary search (see agentspace-app/app/sentences.py).
+
+Words are grouped into sentences at sentence-final punctuation (the
+transcription uses automatic punctuation), at long pauses, and when a
+sentence grows too long to practise as one clip.
+"""
+import json
+import logging
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import GCS_CONFIG
+from storage_backend import get_backend, get_blob_generation
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Sentence-final punctuation, including full-width forms
+SENTENCE_END = (".", "?", "!", "。", "？", "！", "…")
+
+# A pause this long between words ends a sentence
+MAX_PAUSE_S = 1.5
+
+# Sentences are split once they are this long
+MAX_SENTENCE_S = 30.0
+
+# Languages written without spaces between words
+UNSPACED_LANGUAGES = ("ja", "zh")
+
+
+def short_language_code(language_code):
+    """Turn a transcription language code such as "en-US" into the app's "en"."""
+    return language_code.split("-")[0].lower()
+
+
+def collect_words(transcription):
+    """
+    Gather the timed words of a transcription in time order.
+
+    With speaker diarization the words are grouped by speaker, and the
+    recognizer may report a word in more than one result; duplicates are
+    dropped.
+
+    Args:
+        transcription (dict): Result of transcribe_audio_file
+
+    Returns:
+        list: (start_time, end_time, word) tuples
+    """
+    words = set()
+    for speaker_words in transcription.get("speakers", {}).values():
+        for word in speaker_words:
+            words.add((word["start_time"], word["end_time"], word["word"]))
+    return sorted(words)
+
+
+def split_sentences(words, language):
+    """
+    Group timed words into sentences.
+
+    Args:
+        words (list): (start_time, end_time, word) tuples in time order
+        language (str): Short language code
+
+    Returns:
+        list: (start_time, end_time, text) tuples
+    """
+    separator = "" if language in UNSPACED_LANGUAGES else " "
+    sentences = []
+    current = []
+
+    def flush():
+        if current:
+            text = separator.join(word for _, _, word in current).strip()
+            sentences.append((current[0][0], current[-1][1], text))
+            current.clear()
+
+    for start, end, word in words:
+        if current and (start - current[-1][1] > MAX_PAUSE_S or end - current[0][0] > MAX_SENTENCE_S):
+            flush()
+        current.append((start, end, word))
+        if word.endswith(SENTENCE_END):
+            flush()
+    flush()
+    return sentences
+
+
+def build_sentence_table(transcription, source_generation=None):
+    """
+    Build the sentence table of one transcription.
+
+    Args:
+        transcription (dict): Result of transcribe_audio_file
+        source_generation (int, optional): Generation of the source blob
+
+    Returns:
+        dict: Sentence table
+    """
+    language = short_language_code(transcription["metadata"]["language_code"])
+    sentences = split_sentences(collect_words(transcription), language)
+
+    starts, ends, offsets, texts = [], [], [0], []
+    for start, end, text in sentences:
+        # Sentences must not overlap so the app can binary search both arrays
+        start_ms = max(int(round(start * 1000)), ends[-1] if ends else 0)
+        starts.append(start_ms)
+        ends.append(max(start_ms, int(round(end * 1000))))
+        texts.append(text)
+        offsets.append(offsets[-1] + len(text))
+
+    logger.info(f"Built {len(starts)} {language} sentences from {transcription['metadata'].get('audio_uri')}")
+    return {
+        "version": FORMAT_VERSION,
+        "language": language,
+        "source_generation": source_generation or 0,
+        "starts_ms": starts,
+        "ends_ms": ends,
+        "text": "".join(texts),
+        "text_offsets": offsets,
+    }
+
+
+def upload_sentence_table(table, blob_name, bucket_name=None):
+    """
+    Upload a sentence table next to the original blob.
+
+    The app only serves a table whose source generation matches the
+    original blob, so a table built without one is refused.
+
+    Args:
+        table (dict): Sentence table
+        blob_name (str): Name of the original blob, e.g. "audio/en/lesson1.mp3"
+        bucket_name (str, optional): GCS bucket name. Defaults to config value.
+
+    Returns:
+        str: GCS URI of the sentence table
+    """
+    if bucket_name is None:
+        bucket_name = GCS_CONFIG["bucket_name"]
+
+    if not table.get("source_generation"):
+        logger.error(f"Sentence table for {blob_name} has no source generation, not uploading it")
+        return None
+
+    table_name = f"{blob_name}.sentences.{table['language']}.json"
+    try:
+        backend = get_backend(bucket_name)
+        data = json.dumps(table, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        backend.put(table_name, data, content_type="application/json")
+
+        gcs_uri = backend.uri(table_name)
+        logger.info(f"Sentence table for {blob_name} uploaded to {gcs_uri}")
+        return gcs_uri
+    except Exception as e:
+        logger.error(f"Error uploading sentence table to GCS: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build time-indexed sentence tables from transcriptions")
+    parser.add_argument("transcription", help="JSON output of transcribe.py (single or --multilingual)")
+    parser.add_argument("--blob", "-b", help="Name of the original blob in the bucket; uploads the tables next to it")
+    parser.add_argument("--generation", "-g", type=int,
+                        help="Generation of the original blob; read from the bucket when --blob is given")
+    parser.add_argument("--output", "-o", help="Write the tables to this directory")
+
+    args = parser.parse_args()
+
+    with open(args.transcription, encoding="utf-8") as f:
+        results = json.load(f)
+    # Multilingual output maps language codes to single transcriptions
+    transcriptions = [results] if "metadata" in results else list(results.values())
+
+    generation = args.generation
+    if args.blob and not generation:
+        generation = get_blob_generation(args.blob)
+        if not generation:
+            logger.error(f"Could not read the generation of {args.blob}; upload the original first")
+            sys.exit(1)
+
+    for transcription in transcriptions:
+        table = build_sentence_table(transcription, source_generation=generation)
+        if args.output:
+            path = Path(args.output) / f"sentences.{table['language']}.json"
+            path.write_text(json.dumps(table, ensure_ascii=False), encoding="utf-8")
+        if args.blob:
+            if upload_sentence_table(table, args.blob) is None:
+                sys.exit(1)
+        elif not args.output:
+            print(f"{table['language']}: {len(table['starts_ms'])} sentences (use --output or --blob to store them)")
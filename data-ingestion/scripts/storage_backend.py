@@ -0,0 +1,111 @@
+"""
+Storage backend selection for the ingestion scripts.
+
+The backends and the pooled GCS client live in agentspace-app/app
+(storage_backends.py, gcs_client.py) so ingestion writes blobs exactly
+where and how the app reads them, and every script in a process shares
+one client and its connections. With STORAGE_BACKEND=local the scripts
+write into STORAGE_LOCAL_ROOT, which the app can then serve offline with
+the same setting.
+"""
+import logging
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import GCS_CONFIG, GCS_CLIENT_CONFIG, STORAGE_CONFIG
+
+# The app package holds the shared backend implementations
+sys.path.append(str(Path(__file__).parent.parent.parent / "agentspace-app"))
+from app.storage_backends import create_backend, NotFound
+from app.gcs_client import get_client, make_retry, pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Backends by bucket name, so an in-memory backend lives as long as the process
+backends = {}
+
+
+def get_storage_client():
+    """Return the process-wide pooled GCS client."""
+    return get_client(
+        pool_size=GCS_CLIENT_CONFIG["pool_size"],
+        keepalive_s=GCS_CLIENT_CONFIG["keepalive_s"],
+        refresh_timeout=GCS_CLIENT_CONFIG["refresh_timeout"]
+    )
+
+
+def get_backend(bucket_name=None, create_bucket=False):
+    """
+    Return the configured storage backend for a bucket.
+
+    Args:
+        bucket_name (str, optional): GCS bucket name. Defaults to config value.
+            The local stand-ins ignore it and use STORAGE_LOCAL_ROOT.
+        create_bucket (bool): Create the GCS bucket if it does not exist
+
+    Returns:
+        StorageBackend: The backend
+    """
+    if bucket_name is None:
+        bucket_name = GCS_CONFIG["bucket_name"]
+
+    backend = backends.get(bucket_name)
+    if backend is not None:
+        return backend
+
+    client = None
+    if STORAGE_CONFIG["backend"] == "gcs":
+        client = get_storage_client()
+        if create_bucket and client.lookup_bucket(bucket_name) is None:
+            logger.info(f"Bucket {bucket_name} not found, creating it...")
+            client.create_bucket(bucket_name)
+
+    backend = create_backend(
+        STORAGE_CONFIG["backend"],
+        bucket_name=bucket_name,
+        client=client,
+        local_root=STORAGE_CONFIG["local_root"],
+        latency_ms=STORAGE_CONFIG["latency_ms"],
+        bandwidth=STORAGE_CONFIG["bandwidth_bytes"],
+        timeout=(GCS_CLIENT_CONFIG["connect_timeout"], GCS_CLIENT_CONFIG["read_timeout"]),
+        retry=make_retry(
+            GCS_CLIENT_CONFIG["retry_initial"],
+            GCS_CLIENT_CONFIG["retry_maximum"],
+            GCS_CLIENT_CONFIG["retry_multiplier"],
+            GCS_CLIENT_CONFIG["retry_deadline"]
+        )
+    )
+    backends[bucket_name] = backend
+    return backend
+
+
+def parse_gcs_uri(gcs_uri):
+    """
+    Split a gs:// URI into bucket and blob names.
+
+    Returns:
+        tuple: (bucket_name, blob_name)
+    """
+    if not gcs_uri.startswith("gs://"):
+        raise ValueError(f"Invalid GCS URI: {gcs_uri}")
+    bucket_name, _, blob_name = gcs_uri[len("gs://"):].partition("/")
+    return bucket_name, blob_name
+
+
+def get_blob_generation(blob_name, bucket_name=None):
+    """
+    Look up the current generation of a blob.
+
+    Args:
+        blob_name (str): Name of the blob
+        bucket_name (str, optional): GCS bucket name. Defaults to config value.
+
+    Returns:
+        int: Generation of the blob, or None if it does not exist
+    """
+    entry = get_backend(bucket_name).stat(blob_name)
+    if entry is None or not entry.get("generation"):
+        return None
+    return int(entry["generation"])
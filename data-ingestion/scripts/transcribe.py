@@ -4,7 +4,6 @@ Audio transcription utilities using Google Cloud Speech-to-Text.
 import os
 import json
 from google.cloud import speech
-from google.cloud import storage
 import logging
 from pathlib import Path
 import sys
@@ -12,6 +11,7 @@ import sys
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 from config import SPEECH_TO_TEXT_CONFIG, GCS_CONFIG
+from storage_backend import get_backend
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -19,7 +19,7 @@ logger = logging.getLogger(__name__)
 
 def upload_audio_to_gcs(local_file_path, bucket_name=None):
     """
-    Upload an audio file to Google Cloud Storage.
+    Upload an audio file to the configured storage backend.
     
     Args:
         local_file_path (str): Path to the local audio file
@@ -32,20 +32,12 @@ def upload_audio_to_gcs(local_file_path, bucket_name=None):
         bucket_name = GCS_CONFIG["bucket_name"]
     
     try:
-        # Create storage client
-        storage_client = storage.Client()
-        
         # Get or create bucket
-        try:
-            bucket = storage_client.get_bucket(bucket_name)
-        except Exception:
-            logger.info(f"Bucket {bucket_name} not found, creating it...")
-            bucket = storage_client.create_bucket(bucket_name)
+        backend = get_backend(bucket_name, create_bucket=True)
         
         # Upload file
         file_name = os.path.basename(local_file_path)
-        blob = bucket.blob(f"audio/{file_name}")
-        blob.upload_from_filename(local_file_path)
+        backend.put_file(f"audio/{file_name}", local_file_path)
         
         gcs_uri = f"gs://{bucket_name}/audio/{file_name}"
         logger.info(f"File {local_file_path} uploaded to {gcs_uri}")